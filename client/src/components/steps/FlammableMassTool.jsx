@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { calculateVolumeExtents } from '../../utils/geospatial';
 import { getApiUrl } from '../../utils/mapUtils';
+import { fetchFlammableMass } from '../../utils/flammableMass';
 import StoichiometricRatioTool from '../ui/StoichiometricRatioTool';
 
 const apiUrl = getApiUrl();
@@ -94,29 +95,16 @@ const FlammableMassTool = ({
         const zMax = dims['zMax'];
 
         try {
-          const response = await fetch(`${apiUrl}/api/vce_get_flammable_mass`, {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-              xMin,
-              xMax,
-              yMin,
-              yMax,
-              zMin,
-              zMax,
-              flammable_envelope_list_of_dicts: flammableExtentData.flammable_envelope_list_of_dicts,
-              flash_data: flammableExtentData.flash_data,
-              stoich_mol_o2_to_mol_fuel: useStoichiometricOxygen ? parseFloat(molesOfOxygen) : null
-            })
-          });
-
-          if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-          }
-
-          const data = await response.json();
+          // the envelope is sent by id, and again as points if the server no longer holds it
+          const data = await fetchFlammableMass(apiUrl, {
+            xMin,
+            xMax,
+            yMin,
+            yMax,
+            zMin,
+            zMax,
+            stoich_mol_o2_to_mol_fuel: useStoichiometricOxygen ? parseFloat(molesOfOxygen) : null
+          }, flammableExtentData);
 
           // Update volume with flammable mass
           const updatedVolume = {
@@ -0,0 +1,33 @@
+// Post a flammable mass request for one volume.
+// The server keeps the envelope under envelope_id, so the points are only uploaded when no id was
+// issued.  A stored envelope expires (TTL, eviction, server restart) and the server then answers 404;
+// the request is sent again with the points, which the client still holds.
+export const fetchFlammableMass = async (apiUrl, request, flammableExtentData) => {
+  const post = (body) => fetch(`${apiUrl}/api/vce_get_flammable_mass`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify(body)
+  });
+
+  const envelopeId = flammableExtentData.envelope_id;
+  const points = flammableExtentData.flammable_envelope_list_of_dicts;
+  const body = {
+    ...request,
+    envelope_id: envelopeId,
+    flammable_envelope_list_of_dicts: envelopeId ? undefined : points,
+    flash_data: flammableExtentData.flash_data
+  };
+
+  let response = await post(body);
+  if (response.status === 404 && envelopeId && points) {
+    response = await post({ ...body, envelope_id: undefined, flammable_envelope_list_of_dicts: points });
+  }
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+
+  return response.json();
+};
@@ -0,0 +1,58 @@
+import { fetchFlammableMass } from './flammableMass';
+
+const points = [{ x: 0, y: 0, z: 0, conc_g_m3: 0.1 }];
+const request = { xMin: 0, xMax: 10, yMin: -5, yMax: 5, zMin: 0, zMax: 2, stoich_mol_o2_to_mol_fuel: null };
+
+const jsonResponse = (status, body) => ({
+  ok: status >= 200 && status < 300,
+  status,
+  json: async () => body
+});
+
+const sentBodies = () => global.fetch.mock.calls.map(([, init]) => JSON.parse(init.body));
+
+afterEach(() => {
+  delete global.fetch;
+});
+
+test('sends only the envelope id while the server holds the envelope', async () => {
+  global.fetch = jest.fn().mockResolvedValueOnce(jsonResponse(200, { flammable_mass_g: 12.5 }));
+
+  const data = await fetchFlammableMass('http://server', request, { envelope_id: 'abc', flammable_envelope_list_of_dicts: points });
+
+  expect(data.flammable_mass_g).toBe(12.5);
+  expect(sentBodies()).toHaveLength(1);
+  expect(sentBodies()[0].envelope_id).toBe('abc');
+  expect(sentBodies()[0].flammable_envelope_list_of_dicts).toBeUndefined();
+});
+
+test('resends the points when the envelope id has expired', async () => {
+  global.fetch = jest.fn()
+    .mockResolvedValueOnce(jsonResponse(404, { error: 'Flammable envelope expired.' }))
+    .mockResolvedValueOnce(jsonResponse(200, { flammable_mass_g: 12.5 }));
+
+  const data = await fetchFlammableMass('http://server', request, { envelope_id: 'abc', flammable_envelope_list_of_dicts: points });
+
+  expect(data.flammable_mass_g).toBe(12.5);
+  const [first, retry] = sentBodies();
+  expect(first.envelope_id).toBe('abc');
+  expect(retry.envelope_id).toBeUndefined();
+  expect(retry.flammable_envelope_list_of_dicts).toEqual(points);
+  expect(retry.xMin).toBe(request.xMin);
+});
+
+test('sends the points when no envelope id was issued', async () => {
+  global.fetch = jest.fn().mockResolvedValueOnce(jsonResponse(200, { flammable_mass_g: 3 }));
+
+  await fetchFlammableMass('http://server', request, { flammable_envelope_list_of_dicts: points });
+
+  expect(sentBodies()[0].flammable_envelope_list_of_dicts).toEqual(points);
+});
+
+test('other errors are not retried', async () => {
+  global.fetch = jest.fn().mockResolvedValueOnce(jsonResponse(500, { error: 'Internal Server Error' }));
+
+  await expect(fetchFlammableMass('http://server', request, { envelope_id: 'abc', flammable_envelope_list_of_dicts: points }))
+    .rejects.toThrow('HTTP error! status: 500');
+  expect(global.fetch).toHaveBeenCalledTimes(1);
+});
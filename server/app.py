@@ -1,12 +1,31 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, g
 from flask_cors import CORS
 
-from controllers.rad_analysis_controller import radiation_analysis
-from controllers.blast_analysis_controller import flammable_envelope, flammable_mass, vce_overpressure_results, vce_overpressure_distances_results, pv_burst_results
+from controllers.rad_analysis_controller import radiation_analysis, radiation_batch, radiation_sweep, radiation_field, radiation_field_query
+from controllers.blast_analysis_controller import flammable_envelope, flammable_mass, flammable_masses, vce_overpressure_results, vce_overpressure_distances_results, pv_burst_results
+from controllers.jobs_controller import submit_job, job_status, job_result
+from controllers.metrics_controller import metrics_results
+
+from utils.table_registry import use_table_registry_in_py_lopa
+from utils.single_flight import get_single_flight_stats
+from utils.result_cache import flammable_envelope_cache
+from utils.cache_handling import get_cache_stats
+from utils.jet_fire_cache import jet_fire_cache
+from utils.radiation_field_store import radiation_field_store
+from utils.flammable_mass_index_store import flammable_mass_index_store
+from utils.pws_limiter import pws_limiter
+from utils.pws_tape import pws_tape
+from utils.request_timing import instrument_pws_calculations, start_request_timings, end_request_timings, get_request_timings, observe_request
+from utils.log_config import configure_logging
 
 import logging
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+# queued, rotating, per module levels (see utils/log_config.py)
+configure_logging()
+logger = logging.getLogger(__name__)
+
+use_table_registry_in_py_lopa()
+instrument_pws_calculations()
 
 # cors
 app = Flask(__name__)
@@ -18,11 +37,52 @@ CORS(app, resources={
     }
 })
 
+# per-stage timings for each request, returned in the Server-Timing header and added to /api/metrics
+@app.before_request
+def start_timing():
+    g.timing_token = start_request_timings()
+
+@app.after_request
+def add_server_timing(response):
+    timings = get_request_timings()
+    if timings is not None:
+        total_sec = timings.elapsed_sec()
+        response.headers['Server-Timing'] = timings.server_timing_header(total_sec)
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        observe_request(route=route, method=request.method, status=response.status_code, sec=total_sec)
+    return response
+
+@app.teardown_request
+def end_timing(exc):
+    token = g.pop('timing_token', None)
+    if token is not None:
+        end_request_timings(token)
+
 # endpoint - need radiation analysis
 @app.route('/api/radiation_analysis', methods=['POST'])
 async def rad_route():
     return await radiation_analysis()
 
+# many transects (or a plan view grid of them) against one flare.  the jet fire is run once.
+@app.route('/api/radiation_analysis_batch', methods=['POST'])
+async def rad_batch_route():
+    return await radiation_batch()
+
+# one transect at several wind speeds, with the maximum radiation over them at each position
+@app.route('/api/radiation_analysis_sweep', methods=['POST'])
+async def rad_sweep_route():
+    return await radiation_sweep()
+
+# radiation field mode:  the field around a flame is sampled once (returns a field_id), then transect
+# and point queries against it are interpolated locally, without PWS calls
+@app.route('/api/radiation_field', methods=['POST'])
+async def rad_field_route():
+    return await radiation_field()
+
+@app.route('/api/radiation_field_query', methods=['POST'])
+def rad_field_query_route():
+    return radiation_field_query()
+
 @app.route('/api/vce_get_flammable_envelope', methods=['POST'])
 async def vce_flammable_envelope_route():
     return await flammable_envelope()
@@ -31,6 +91,11 @@ async def vce_flammable_envelope_route():
 def vce_flammable_mass_route():
     return flammable_mass()
 
+# many congested volumes against one envelope in a single request
+@app.route('/api/vce_get_flammable_masses', methods=['POST'])
+def vce_flammable_masses_route():
+    return flammable_masses()
+
 @app.route('/api/vce_get_overpressure_results', methods=['POST'])
 def vce_overpressure_route():
     return vce_overpressure_results()
@@ -41,8 +106,41 @@ def vce_overpressure_distances_route():
 
 @app.route('/api/get_pv_burst_results', methods=['POST'])
 async def pv_burst_overpressure_route():
-    logging.debug("pv burst")
-    return pv_burst_results()
+    logger.debug("pv burst")
+    return await pv_burst_results()
+
+# cache hit rates and model runs saved by coalescing identical in-flight requests
+@app.route('/api/stats', methods=['GET'])
+def stats_route():
+    return jsonify({
+        'single_flight': get_single_flight_stats(),
+        'flammable_envelope_cache': flammable_envelope_cache.stats(),
+        'vlc_cache': get_cache_stats(),
+        'jet_fire_cache': jet_fire_cache.stats(),
+        'radiation_fields': radiation_field_store.stats(),
+        'flammable_mass_indexes': flammable_mass_index_store.stats(),
+        'pws_limiter': pws_limiter.stats(),
+        'pws_tape': pws_tape.stats(),
+    }), 200
+
+# prometheus scrape endpoint:  route latency and stage histograms, PWS call counts, cache hit rates
+@app.route('/api/metrics', methods=['GET'])
+def metrics_route():
+    return metrics_results()
+
+# background jobs for the long model runs.  kind is the name of the synchronous route
+# (radiation_analysis, radiation_analysis_batch, radiation_analysis_sweep, radiation_field, vce_get_flammable_envelope, get_pv_burst_results).
+@app.route('/api/jobs/<kind>', methods=['POST'])
+def submit_job_route(kind):
+    return submit_job(kind)
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status_route(job_id):
+    return job_status(job_id)
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result_route(job_id):
+    return job_result(job_id)
 
 '''
 const response = await fetch(`${apiUrl}/api/vce_get_distances_to_overpressures`, {
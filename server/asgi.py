@@ -0,0 +1,110 @@
+import json
+import asyncio
+import logging
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import jsonify
+
+from app import app
+from controllers.rad_analysis_controller import run_radiation_analysis, radiation_response, run_radiation_batch, radiation_batch_response, run_radiation_sweep, radiation_sweep_response
+from controllers.blast_analysis_controller import run_flammable_envelope, flammable_envelope_response, run_pv_burst, pv_burst_response
+from utils.table_registry import table_registry
+from utils.request_timing import start_request_timings, end_request_timings
+
+logger = logging.getLogger(__name__)
+
+# asgi entry point (served by uvicorn, see run.py).  the model endpoints are handled here on the event
+# loop, and the PWS calls they make are capped by utils.pws_limiter.  every other route, and the job
+# api, is passed through to the flask app.
+
+# py_lopa model runs are blocking, so they run on a worker thread.  no PWS slot is taken here:  the
+# run takes one inside its single flight (pws_limiter.call(m_io.run)), so a request joining an
+# identical run in progress waits without holding one.
+async def flammable_envelope_model(data):
+    return await asyncio.to_thread(run_flammable_envelope, data)
+
+async def pv_burst_model(data):
+    return await asyncio.to_thread(run_pv_burst, data)
+
+# path: (coroutine run with the posted json, flask response builder for its result)
+MODEL_ROUTES = {
+    '/api/radiation_analysis': (run_radiation_analysis, radiation_response),
+    '/api/radiation_analysis_batch': (run_radiation_batch, radiation_batch_response),
+    '/api/radiation_analysis_sweep': (run_radiation_sweep, radiation_sweep_response),
+    '/api/vce_get_flammable_envelope': (flammable_envelope_model, flammable_envelope_response),
+    '/api/get_pv_burst_results': (pv_burst_model, pv_burst_response),
+}
+
+wsgi_application = WsgiToAsgi(app)
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await handle_lifespan(receive, send)
+        return
+    if scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] in MODEL_ROUTES:
+        await handle_model_request(scope, receive, send)
+        return
+    await wsgi_application(scope, receive, send)
+
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await asyncio.to_thread(table_registry.warm_up)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+async def handle_model_request(scope, receive, send):
+    path = scope['path']
+    run_model, build_response = MODEL_ROUTES[path]
+    # the flask after_request hook reads these when the response is processed below
+    timing_token = start_request_timings()
+    try:
+        await handle_timed_model_request(scope, receive, send, path, run_model, build_response)
+    finally:
+        end_request_timings(timing_token)
+
+async def handle_timed_model_request(scope, receive, send, path, run_model, build_response):
+    body = await read_body(receive)
+
+    result = None
+    failed = False
+    try:
+        result = await run_model(json.loads(body))
+    except Exception as e:
+        logger.debug(f'exception caused from {path} endpoint.  error info: {e}')
+        failed = True
+
+    # responses are built by the same flask code as the wsgi routes (content negotiation, cors headers)
+    headers = [(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']]
+    with app.test_request_context(path=path, method='POST', headers=headers, query_string=scope.get('query_string', b''), data=body):
+        try:
+            if failed:
+                rv = jsonify({'error': 'Internal Server Error'}), 500
+            else:
+                rv = build_response(result)
+        except Exception as e:
+            logger.debug(f'exception building response for {path}.  error info: {e}')
+            rv = jsonify({'error': 'Internal Server Error'}), 500
+        response = app.process_response(app.make_response(rv))
+
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': response.get_data(),
+    })
@@ -0,0 +1,166 @@
+from pypws.enums import ResultCode
+
+from calcs import chunked_footprints
+
+# adaptive version of the VCE footprint batch.  py_lopa always asks PWS for every target concentration
+# at every integer elevation from 0 to 50 m, most of which come back empty for a low or small cloud.
+#   1. the lfl footprint is run at coarse elevations (plus the release elevation) and then at the
+#      integer elevations around the highest and lowest hits, which gives the cloud's vertical extent.
+#   2. every concentration level is run at the coarse elevations inside the cloud.  levels above the
+#      highest one found are dropped, except the next one up, which is kept as a sentinel.  footprints
+#      nest (a higher concentration lies inside a lower one), so nothing is lost while the sentinel
+#      stays empty.  if it gets a footprint, the next level is added.
+#   3. the elevation step inside the cloud is halved, requesting only the new elevations, until the
+#      integrated flammable mass changes by less than rel_tol between passes, or the step is 1 m.
+# at a 1 m step the envelope is the same as py_lopa's.  earlier passes are never repeated.
+
+COARSE_ELEVATION_STEP_M = 4
+MAX_ELEVATION_M = 50
+FLAMMABLE_MASS_REL_TOL = 0.02
+
+def get_elevations_between(bottom_m, top_m, step_m):
+    return sorted(set(range(bottom_m, top_m + 1, step_m)) | {top_m})
+
+class Adaptive_Envelope:
+
+    def __init__(self, vce, elevations_per_chunk = chunked_footprints.ELEVATIONS_PER_CHUNK, rel_tol = FLAMMABLE_MASS_REL_TOL, coarse_step_m = COARSE_ELEVATION_STEP_M, max_elevation_m = MAX_ELEVATION_M, release_elevation_m = None):
+        self.vce = vce
+        self.phast_dispersion = vce.phast_dispersion
+        self.elevations_per_chunk = elevations_per_chunk
+        self.rel_tol = rel_tol
+        self.coarse_step_m = coarse_step_m
+        self.max_elevation_m = max_elevation_m
+        self.release_elevation_m = release_elevation_m
+        # vce.targ_concs repeats two levels.  each level is requested once and repeated when assembled.
+        self.concs = sorted(set(vce.targ_concs))
+        self.points = {}
+        self.passes = 0
+        self.configs_requested = 0
+        self.cloud_bottom_m = None
+        self.cloud_top_m = None
+        self.elevation_step_m = None
+        self.kept_concs = []
+        self.flammable_mass_g = None
+
+    def run_pairs(self, elev_conc_pairs):
+        pairs = [pair for pair in dict.fromkeys(elev_conc_pairs) if pair not in self.points]
+        if len(pairs) == 0:
+            return ResultCode.SUCCESS
+        calc = chunked_footprints.run_footprint_configs(self.phast_dispersion, sorted(pairs), elevations_per_chunk=self.elevations_per_chunk)
+        self.passes += 1
+        self.configs_requested += len(pairs)
+        if calc.result_code != ResultCode.SUCCESS:
+            self.phast_dispersion.distancesAndFootprintsCalc = calc
+            return calc.result_code
+        for cfg, pts in zip(calc.dispersion_output_configs, chunked_footprints.get_contour_points_by_config(calc)):
+            self.points[(cfg.elevation, cfg.concentration)] = pts
+        return ResultCode.SUCCESS
+
+    def has_footprint(self, elev, conc):
+        return len(self.points.get((elev, conc), [])) > 0
+
+    def find_vertical_extent(self):
+        lfl = self.concs[0]
+        coarse = get_elevations_between(0, self.max_elevation_m, self.coarse_step_m)
+        if self.release_elevation_m is not None:
+            coarse = sorted(set(coarse) | {min(max(int(round(self.release_elevation_m)), 0), self.max_elevation_m)})
+        res = self.run_pairs([(elev, lfl) for elev in coarse])
+        if res != ResultCode.SUCCESS:
+            return res
+
+        hits = [elev for elev in coarse if self.has_footprint(elev, lfl)]
+        if len(hits) == 0:
+            # a thin cloud can sit between the coarse elevations near the ground
+            hits = [0]
+        above = [elev for elev in coarse if elev > max(hits)]
+        below = [elev for elev in coarse if elev < min(hits)]
+        edges = list(range(max(hits) + 1, above[0] if len(above) > 0 else max(hits) + 1))
+        edges += list(range(below[-1] + 1 if len(below) > 0 else min(hits), min(hits)))
+        res = self.run_pairs([(elev, lfl) for elev in edges])
+        if res != ResultCode.SUCCESS:
+            return res
+
+        hits = [elev for elev in sorted(set(coarse) | set(edges)) if self.has_footprint(elev, lfl)]
+        if len(hits) > 0:
+            self.cloud_bottom_m = min(hits)
+            self.cloud_top_m = max(hits)
+        return ResultCode.SUCCESS
+
+    def get_kept_concs(self, elevations):
+        # levels up to the highest one with a footprint, plus the sentinel above it
+        present = [idx for idx, conc in enumerate(self.concs) if any(self.has_footprint(elev, conc) for elev in elevations)]
+        top_idx = max(present) if len(present) > 0 else 0
+        return self.concs[:top_idx + 2]
+
+    def assemble(self, elevations, kept_concs):
+        # same config order as py_lopa:  elevation, then vce.targ_concs order
+        kept = set(kept_concs)
+        pairs = [(elev, conc) for elev in elevations for conc in self.vce.targ_concs if conc in kept]
+        calc = chunked_footprints.get_footprint_calc(self.phast_dispersion, [chunked_footprints.get_footprint_output_config(elev, conc) for elev, conc in pairs])
+        calc.n_contour_points = [len(self.points[pair]) for pair in pairs]
+        calc.contour_points = [pt for pair in pairs for pt in self.points[pair]]
+        calc.result_code = ResultCode.SUCCESS
+        self.phast_dispersion.distancesAndFootprintsCalc = calc
+        return calc
+
+    def get_flammable_mass_g(self, elevations, kept_concs):
+        self.assemble(elevations, kept_concs)
+        self.vce.parse_flam_env_contour_points()
+        return self.vce.get_flammable_mass()['flammable_mass_g']
+
+    def run(self):
+        # leaves the assembled calc on phast_dispersion.distancesAndFootprintsCalc, as py_lopa does
+        res = self.find_vertical_extent()
+        if res != ResultCode.SUCCESS:
+            return res
+        if self.cloud_top_m is None:
+            self.kept_concs = self.concs[:1]
+            self.assemble([0], self.kept_concs)
+            return ResultCode.SUCCESS
+
+        step = self.coarse_step_m
+        kept = self.concs
+        prev_mass_g = None
+        prev_elevations = None
+        while True:
+            elevations = get_elevations_between(self.cloud_bottom_m, self.cloud_top_m, step)
+            if elevations == prev_elevations:
+                # a cloud thinner than the step.  halving only counts once it adds elevations.
+                if step == 1:
+                    self.elevation_step_m = step
+                    break
+                step = max(1, step // 2)
+                continue
+            while True:
+                res = self.run_pairs([(elev, conc) for elev in elevations for conc in kept])
+                if res != ResultCode.SUCCESS:
+                    return res
+                new_kept = self.get_kept_concs(elevations)
+                if new_kept == kept:
+                    break
+                kept = new_kept
+
+            mass_g = self.get_flammable_mass_g(elevations, kept)
+            self.elevation_step_m = step
+            self.kept_concs = kept
+            self.flammable_mass_g = mass_g
+            if step == 1:
+                break
+            if prev_mass_g is not None and abs(mass_g - prev_mass_g) <= self.rel_tol * abs(prev_mass_g):
+                break
+            prev_mass_g = mass_g
+            prev_elevations = elevations
+            step = max(1, step // 2)
+
+        return ResultCode.SUCCESS
+
+    def stats(self):
+        return {
+            'passes': self.passes,
+            'configs_requested': self.configs_requested,
+            'cloud_bottom_m': self.cloud_bottom_m,
+            'cloud_top_m': self.cloud_top_m,
+            'elevation_step_m': self.elevation_step_m,
+            'concentration_levels': len(self.kept_concs),
+            'flammable_mass_g': self.flammable_mass_g,
+        }
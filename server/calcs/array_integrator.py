@@ -0,0 +1,160 @@
+import numpy as np
+from typing import Dict, List, Tuple
+
+from py_lopa.calcs.integrator import Integrator
+
+
+class Array_Integrator(Integrator):
+    """
+    Array-backed variant of the py_lopa Integrator.
+
+    Binning, per-voxel averaging and z-thickness lookup are done as bulk NumPy
+    operations instead of DataFrame.iterrows() and string voxel keys.  Voxels are
+    accumulated in the same order the base class visits them, so total_mass_g,
+    effective_voxel_count and z_level_masses_g match the base class results.
+
+    self.voxels holds a dict of equal-length arrays (one entry per voxel, in order
+    of first appearance) rather than a dict of dicts.
+    """
+
+    def _get_points(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Columns of the points that are binned into voxels, in data order.
+
+        Returns:
+            x, y, z and conc_g_m3 arrays
+        """
+        return (
+            self.data['x'].to_numpy(dtype=float),
+            self.data['y'].to_numpy(dtype=float),
+            self.data['z'].to_numpy(dtype=float),
+            self.data['conc_g_m3'].to_numpy(dtype=float),
+        )
+
+    def _create_voxels(self, bounds: Dict) -> None:
+        """
+        Create voxels and assign data points to them.
+
+        Args:
+            bounds: Dictionary with integration bounds
+        """
+        x_step = bounds['x']['range'] / self.x_bins
+        y_step = bounds['y']['range'] / self.y_bins
+
+        x, y, z, conc_g_m3 = self._get_points()
+
+        # Filter data within custom bounds if needed
+        mask = (
+            (x >= bounds['x']['min']) &
+            (x <= bounds['x']['max']) &
+            (y >= bounds['y']['min']) &
+            (y <= bounds['y']['max']) &
+            (z >= bounds['z']['min']) &
+            (z <= bounds['z']['max'])
+        )
+        x = x[mask]
+        y = y[mask]
+        z = z[mask]
+        conc_g_m3 = conc_g_m3[mask]
+
+        if len(x) > 0 and (x_step == 0 or y_step == 0):
+            raise ValueError("Integration bounds have zero width in x or y")
+
+        # Assign points to voxels
+        x_idx = np.minimum(((x - bounds['x']['min']) / x_step).astype(np.int64), self.x_bins - 1)
+        y_idx = np.minimum(((y - bounds['y']['min']) / y_step).astype(np.int64), self.y_bins - 1)
+        z_idx = np.searchsorted(self.z_levels_m, z)
+
+        n_z = len(self.z_levels_m)
+        voxel_keys = (x_idx * self.y_bins + y_idx) * n_z + z_idx
+        _, first_idx, inverse, counts = np.unique(voxel_keys, return_index=True, return_inverse=True, return_counts=True)
+
+        # renumber voxels in order of first appearance to keep the base class summation order
+        order = np.argsort(first_idx, kind='stable')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        voxel_ids = rank[inverse]
+        first_idx = first_idx[order]
+
+        total_conc_g_m3 = np.bincount(voxel_ids, weights=conc_g_m3, minlength=len(order))
+
+        self.voxels = {
+            'x_idx': x_idx[first_idx],
+            'y_idx': y_idx[first_idx],
+            'z': z[first_idx],
+            'z_idx': z_idx[first_idx],
+            'total_conc_g_m3': total_conc_g_m3,
+            'count': counts[order],
+            'average_conc_g_m3': total_conc_g_m3 / counts[order],
+        }
+
+    def _z_thickness_by_voxel(self) -> np.ndarray:
+        z_spacing_m = np.array([self.z_spacing_m[z] for z in self.z_levels_m])
+        return z_spacing_m[self.voxels['z_idx']]
+
+    def _sequential_sum(self, values: np.ndarray):
+        # cumulative sum keeps the left-to-right summation order of the base class loop
+        if len(values) == 0:
+            return 0
+        return np.cumsum(values)[-1]
+
+    def _calculate_mass_and_volume(self, bounds: Dict) -> None:
+        """
+        Calculate the total mass and volume based on the voxels.
+
+        Args:
+            bounds: Dictionary with integration bounds
+        """
+        x_step = bounds['x']['range'] / self.x_bins
+        y_step = bounds['y']['range'] / self.y_bins
+
+        keep = self.voxels['count'] >= self.min_points_per_voxel
+        z_thickness_m = self._z_thickness_by_voxel()[keep]
+        volume_m3 = x_step * y_step * z_thickness_m
+        voxel_mass_g = self.voxels['average_conc_g_m3'][keep] * volume_m3
+
+        total_mass_g = self._sequential_sum(voxel_mass_g)
+        total_volume_m3 = self._sequential_sum(volume_m3)
+
+        # Calculate theoretical volume
+        theoretical_volume_m3 = bounds['x']['range'] * bounds['y']['range'] * bounds['z']['range']
+
+        # Store results
+        self.total_mass_g = total_mass_g
+        self.total_volume_m3 = total_volume_m3
+        self.theoretical_volume_m3 = theoretical_volume_m3
+        self.average_density_g_m3 = total_mass_g / total_volume_m3 if total_volume_m3 > 0 else 0
+        self.effective_voxel_count = int(keep.sum())
+
+    def calculate_z_level_masses(self) -> List[Dict]:
+        """
+        Calculate mass distribution by z-level.
+
+        Returns:
+            List of dictionaries with z-level, mass, and thickness information
+        """
+        if self.voxels is None:
+            raise ValueError("Run integrate() first to generate voxel data")
+
+        # the base class sizes z-level voxels from the data bounds, not the integration bounds
+        x_step = self.bounds['x']['range'] / self.x_bins
+        y_step = self.bounds['y']['range'] / self.y_bins
+
+        keep = self.voxels['count'] >= self.min_points_per_voxel
+        z_thickness_m = self._z_thickness_by_voxel()[keep]
+        volume_m3 = x_step * y_step * z_thickness_m
+        avg_concentration_g_m3 = self.voxels['total_conc_g_m3'][keep] / self.voxels['count'][keep]
+        voxel_mass_g = avg_concentration_g_m3 * volume_m3
+
+        z_level_masses_g = np.bincount(self.voxels['z_idx'][keep], weights=voxel_mass_g, minlength=len(self.z_levels_m))
+
+        self.z_level_masses_g = [
+            {
+                'z_level_m': z,
+                'mass_g': mass,
+                'thickness_m': self.z_spacing_m.get(z, 1.0)
+            }
+            for z, mass in zip(self.z_levels_m, z_level_masses_g.tolist())
+        ]
+
+        return self.z_level_masses_g
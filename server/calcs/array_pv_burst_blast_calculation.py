@@ -0,0 +1,126 @@
+import threading
+
+import numpy as np
+
+from pypws.calculations import VesselLeakCalculation
+
+from py_lopa.data.tables import Tables
+from py_lopa.calcs.pv_burst_blast_calculation import Pv_Burst_Blast_Calc
+from py_lopa.model_work import model_controller
+
+from utils.table_registry import table_registry
+
+
+class Pv_Burst_Curve_Index:
+
+    # the pv burst blast curves, sorted once into one (scaled_r, scaled_press) array pair per p1_p0 family.
+    # get_overpressure_psi brackets and interpolates any number of scaled radii in one call, following
+    # the same rules as Pv_Burst_Blast_Calc.get_overpressure_psi_at_bldg.
+
+    def __init__(self, pv_burst_curves_df) -> None:
+        self.pv_burst_curves_df = pv_burst_curves_df
+        df = pv_burst_curves_df.sort_values(['p1_p0', 'scaled_r', 'scaled_press'])
+        self.p_ratios = np.sort(df['p1_p0'].unique()).astype(float)
+        self.families = {}
+        for p_ratio, family_df in df.groupby('p1_p0', sort=True):
+            self.families[float(p_ratio)] = (family_df['scaled_r'].to_numpy(dtype=float), family_df['scaled_press'].to_numpy(dtype=float))
+
+    def get_overpressure_psi(self, p_ratio, scaled_r):
+        scaled_r = np.atleast_1d(np.asarray(scaled_r, dtype=float))
+        p_ratio = float(p_ratio)
+
+        if p_ratio in self.families:
+            rs, presses = self.families[p_ratio]
+            scaled_p = self.interpolate_family(rs, presses, scaled_r)
+            overpress_psi = 2 * scaled_p * 14.6959
+
+            # exact hits on a tabulated point use the tabulated pressure directly (as in py_lopa)
+            idx = np.minimum(np.searchsorted(rs, scaled_r), len(rs) - 1)
+            exact = rs[idx] == scaled_r
+            overpress_psia = 2 * np.abs(14.6959 * (1 + presses[idx]))
+            return np.where(exact, overpress_psia, overpress_psi)
+
+        p_ratio_1 = self.p_ratios[self.p_ratios < p_ratio].max()
+        p_ratio_2 = self.p_ratios[self.p_ratios > p_ratio].min()
+        scaled_p_1 = self.interpolate_family(*self.families[p_ratio_1], scaled_r)
+        scaled_p_2 = self.interpolate_family(*self.families[p_ratio_2], scaled_r)
+        scaled_p = log_linear_interpolation(x=p_ratio, x1=p_ratio_1, x2=p_ratio_2, y1=scaled_p_1, y2=scaled_p_2)
+
+        return 2 * scaled_p * 14.6959
+
+    def interpolate_family(self, rs, presses, scaled_r):
+        # nearest tabulated points strictly below and above each scaled radius.  past the end of the
+        # curve the last two points are extrapolated.  with only one neighbour its pressure is used.
+        n = len(rs)
+        lo = np.searchsorted(rs, scaled_r, side='left') - 1
+        hi = np.searchsorted(rs, scaled_r, side='right')
+        beyond = scaled_r > rs[-1]
+        lo = np.where(beyond, n - 2, lo)
+        hi = np.where(beyond, n - 1, hi)
+        lo = np.where(lo < 0, hi, lo)
+        hi = np.where(hi >= n, lo, hi)
+
+        return log_linear_interpolation(x=scaled_r, x1=rs[lo], x2=rs[hi], y1=presses[lo], y2=presses[hi])
+
+
+def handle_zeros(val):
+    return np.where(val == 0, 1e-10, val)
+
+def log_linear_interpolation(x, x1, x2, y1, y2):
+    X = np.log10(handle_zeros(np.asarray(x, dtype=float)))
+    X1 = np.log10(handle_zeros(np.asarray(x1, dtype=float)))
+    X2 = np.log10(handle_zeros(np.asarray(x2, dtype=float)))
+    Y1 = np.log10(handle_zeros(np.asarray(y1, dtype=float)))
+    Y2 = np.log10(handle_zeros(np.asarray(y2, dtype=float)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        M = (Y2 - Y1) / (X2 - X1)
+        B = Y2 - M * X2
+        Y = np.where(X1 != X2, M*X + B, np.maximum(Y1, Y2))
+    return 10**Y
+
+
+_curve_index = None
+_curve_index_lock = threading.Lock()
+
+def get_pv_burst_curve_index():
+    # built on first use and shared by every request in the process
+    global _curve_index
+    if _curve_index is None:
+        with _curve_index_lock:
+            if _curve_index is None:
+                _curve_index = Pv_Burst_Curve_Index(table_registry.get_dataframe(Tables().PV_BURST_BLAST_CURVE_DATA))
+    return _curve_index
+
+
+class Array_Pv_Burst_Blast_Calc(Pv_Burst_Blast_Calc):
+
+    # evaluates every building in one batched call against the shared curve index.
+
+    def __init__(self, phast_discharge) -> None:
+        self.curve_index = get_pv_burst_curve_index()
+        self.pv_burst_curves_df = self.curve_index.pv_burst_curves_df
+        self.phast_discharge = phast_discharge
+        self.mi = phast_discharge.mi
+        self.vlc:VesselLeakCalculation = phast_discharge.vesselLeakCalculation
+        self.press_pa = self.mi.PRESS_PA
+        self.flash_at_init = self.phast_discharge.flashresult
+        self.expansion_energy_j = self.vlc.discharge_result.expansion_energy * self.vlc.discharge_result.release_mass
+        self.bldgs = self.mi.bldgs
+        self.p_ratio = self.get_p_ratio()
+
+    def run(self):
+        if len(self.bldgs) == 0:
+            return
+        dists_m = np.array([bldg.dist_m for bldg in self.bldgs], dtype=float)
+        scaled_r = self.get_scaled_r(dist_m=dists_m)
+        overpressures_psi = self.curve_index.get_overpressure_psi(p_ratio=self.p_ratio, scaled_r=scaled_r)
+        for bldg, overpressure_psi in zip(self.bldgs, overpressures_psi.tolist()):
+            bldg.pv_burst_overpressure_psi = overpressure_psi
+
+    def get_overpressure_psi_at_bldg(self, scaled_r):
+        return self.curve_index.get_overpressure_psi(p_ratio=self.p_ratio, scaled_r=scaled_r)[0]
+
+
+def use_array_pv_burst_in_py_lopa():
+    # pv burst runs are built inside py_lopa's model controller.  point it at the batched version.
+    model_controller.Pv_Burst_Blast_Calc = Array_Pv_Burst_Blast_Calc
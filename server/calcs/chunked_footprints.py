@@ -0,0 +1,123 @@
+import datetime
+import contextvars
+from datetime import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from pypws.calculations import DistancesAndFootprintsToConcentrationLevelsCalculation
+from pypws.entities import DispersionOutputConfig
+from pypws.enums import ContourType, ResultCode, Resolution, SpecialConcentration
+
+# chunked version of py_lopa.phast_io.phast_dispersion.Phast_Dispersion.run_footprint_models_for_vce.
+# the same elevation x concentration footprint configs are built, but they are sent to PWS as several
+# smaller requests, one per band of elevations, run side by side.  the chunk results are joined back
+# in config order, so the merged calc is parsed exactly like the single request.
+
+VCE_ELEVATIONS_M = list(range(51))
+ELEVATIONS_PER_CHUNK = 6
+FOOTPRINT_CHUNK_WORKERS = 4
+
+# shared by every request, so it also caps the number of chunk requests in flight across the process.
+# chunks run inside a model run that already holds a pws_limiter slot and do not take slots of their own.
+_chunk_pool = ThreadPoolExecutor(max_workers=FOOTPRINT_CHUNK_WORKERS, thread_name_prefix='footprint_chunk')
+
+MERGED_ATTRIBUTES = ['concs_used', 'n_contour_points', 'areas_contour', 'distances_concentration', 'contour_points']
+
+def get_footprint_output_config(elev, targ_conc):
+    dispOutputCfg = DispersionOutputConfig()
+    dispOutputCfg.resolution = Resolution.LOW
+    dispOutputCfg.downwind_distance = np.inf
+    dispOutputCfg.special_concentration = SpecialConcentration.NOT_DEFINED
+    dispOutputCfg.concentration = targ_conc
+    dispOutputCfg.elevation = elev
+    dispOutputCfg.contour_type = ContourType.FOOTPRINT
+    return dispOutputCfg
+
+def get_footprint_calc(phast_dispersion, dispersion_output_configs):
+    return DistancesAndFootprintsToConcentrationLevelsCalculation(
+        scalar_udm_outputs = phast_dispersion.dispersionCalculation.scalar_udm_outputs,
+        weather = phast_dispersion.weather,
+        dispersion_records = phast_dispersion.dispersionCalculation.dispersion_records,
+        dispersion_record_count = len(phast_dispersion.dispersionCalculation.dispersion_records),
+        substrate = phast_dispersion.substrate,
+        dispersion_output_configs = dispersion_output_configs,
+        dispersion_output_config_count = len(dispersion_output_configs),
+        dispersion_parameters = phast_dispersion.dispersionCalculation.dispersion_parameters,
+        material = phast_dispersion.phast_discharge.vesselLeakCalculation.exit_material
+    )
+
+def get_elevation_bands(elevations, elevations_per_chunk):
+    return [elevations[i:i+elevations_per_chunk] for i in range(0, len(elevations), elevations_per_chunk)]
+
+def get_chunk_pairs(elev_conc_pairs, elevations_per_chunk):
+    # (elevation, concentration) pairs grouped by band of elevations.  None keeps them in one chunk.
+    if elevations_per_chunk is None:
+        return [list(elev_conc_pairs)]
+    elevations = list(dict.fromkeys(elev for elev, _ in elev_conc_pairs))
+    chunks = []
+    for band in get_elevation_bands(elevations, elevations_per_chunk):
+        band = set(band)
+        chunks.append([(elev, conc) for elev, conc in elev_conc_pairs if elev in band])
+    return chunks
+
+def _run_chunk(calc):
+    calc.run()
+    return calc
+
+def merge_footprint_chunks(calc, chunk_calcs):
+    # chunk results are appended in chunk order, which is config order
+    for chunk_calc in chunk_calcs:
+        calc.messages.extend(chunk_calc.messages)
+    failed = [chunk_calc for chunk_calc in chunk_calcs if chunk_calc.result_code != ResultCode.SUCCESS]
+    if len(failed) > 0:
+        calc.result_code = failed[0].result_code
+        return calc.result_code
+    for attr in MERGED_ATTRIBUTES:
+        merged = []
+        for chunk_calc in chunk_calcs:
+            vals = getattr(chunk_calc, attr)
+            if vals is not None:
+                merged.extend(vals)
+        setattr(calc, attr, merged)
+    calc.calculation_elapsed_time = max(chunk_calc.calculation_elapsed_time for chunk_calc in chunk_calcs)
+    calc.result_code = ResultCode.SUCCESS
+    return calc.result_code
+
+def run_footprint_configs(phast_dispersion, elev_conc_pairs, elevations_per_chunk = ELEVATIONS_PER_CHUNK):
+    # runs a footprint config for each (elevation, concentration) pair and returns the merged calc.
+    # its configs are in elevation band order, which is the order given when pairs are sorted by elevation.
+    chunk_configs = [[get_footprint_output_config(elev, conc) for elev, conc in pairs] for pairs in get_chunk_pairs(elev_conc_pairs, elevations_per_chunk)]
+    calc = get_footprint_calc(phast_dispersion, [cfg for cfgs in chunk_configs for cfg in cfgs])
+    chunk_calcs = [get_footprint_calc(phast_dispersion, cfgs) for cfgs in chunk_configs]
+    # each chunk carries the caller's context, so its PWS time is added to the request's timings
+    futures = [_chunk_pool.submit(contextvars.copy_context().run, _run_chunk, chunk_calc) for chunk_calc in chunk_calcs]
+    chunk_calcs = [future.result() for future in futures]
+    merge_footprint_chunks(calc, chunk_calcs)
+    return calc
+
+def get_contour_points_by_config(calc):
+    points = []
+    idx = 0
+    for n in calc.n_contour_points:
+        points.append(calc.contour_points[idx:idx+n])
+        idx += n
+    return points
+
+def run_footprint_models_for_vce_chunked(phast_dispersion, vce_targ_concs, elevations = VCE_ELEVATIONS_M, elevations_per_chunk = ELEVATIONS_PER_CHUNK):
+    # leaves the merged calc on phast_dispersion.distancesAndFootprintsCalc, where py_lopa's version leaves its calc
+    elev_conc_pairs = [(elev, targ_conc) for elev in elevations for targ_conc in vce_targ_concs]
+
+    phast_dispersion.mi.LOG_HANDLER(f'\n***\n\nInitiating Model:  VCE Flammable Envelope ({len(get_chunk_pairs(elev_conc_pairs, elevations_per_chunk))} elevation bands)')
+    t0 = dt.now(datetime.UTC)
+    calc = run_footprint_configs(phast_dispersion, elev_conc_pairs, elevations_per_chunk=elevations_per_chunk)
+    phast_dispersion.distancesAndFootprintsCalc = calc
+    res = calc.result_code
+
+    log_msg = f'Model run successful.  run time: {dt.now(datetime.UTC) - t0} sec'
+    if res != ResultCode.SUCCESS:
+        log_msg = f'\n\nIssue with flammable envelope calc.  error messages:  {calc.messages}'
+
+    phast_dispersion.mi.LOG_HANDLER(log_msg)
+
+    return res
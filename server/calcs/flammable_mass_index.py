@@ -0,0 +1,134 @@
+import numpy as np
+
+from calcs.array_integrator import Array_Integrator
+
+# flammable mass in many axis-aligned boxes against one flammable envelope, each equal to
+# Array_Integrator.integrate over the same box.  the envelope is loaded once (the planar padding, z
+# levels and z spacing integrate() uses), and two lookups are built over its points:
+#   - a summed-area table of point counts, cumulative over the z levels and over the cells of a grid
+#     spanning the envelope.  8 lookups give the points in the cells a box touches.  a box touching no
+#     point has no mass and goes no further.
+#   - the points sorted by x.  the points in a box's x range are picked from the sort with two binary
+#     searches and handed, in data order, to the integrator's own voxel binning and summation.
+# so a box costs a pass over the points in its x range rather than over the whole envelope, and no
+# result depends on an approximation.
+
+X_BINS = 100
+Y_BINS = 100
+
+# grid cells x z levels in the count table
+MAX_COUNT_TABLE_VALUES = 1000000
+MAX_CELLS_PER_AXIS = 1024
+
+class Point_Count_Table:
+    # point counts cumulative over z levels and over the cells of an nx by ny grid over the bounds.
+    # counts[z level, x cell, y cell], with a leading zero row on every axis.
+
+    def __init__(self, z_idx, n_z, x, y, x_min, x_range, y_min, y_range, max_values = MAX_COUNT_TABLE_VALUES) -> None:
+        # cells about square, as many as the budget allows
+        cells_per_level = max_values / (n_z + 1)
+        self.nx = int(np.clip(np.sqrt(cells_per_level * x_range / y_range), 1, MAX_CELLS_PER_AXIS))
+        self.ny = int(np.clip(cells_per_level / self.nx, 1, MAX_CELLS_PER_AXIS))
+        self.x_min = x_min
+        self.y_min = y_min
+        self.cell_x_m = x_range / self.nx
+        self.cell_y_m = y_range / self.ny
+
+        cell = (z_idx * self.nx + self._get_cells(x, self.x_min, self.cell_x_m, self.nx)) * self.ny + self._get_cells(y, self.y_min, self.cell_y_m, self.ny)
+        counts = np.zeros((n_z + 1, self.nx + 1, self.ny + 1), dtype=np.int64)
+        counts[1:, 1:, 1:] = np.bincount(cell, minlength=n_z * self.nx * self.ny).reshape(n_z, self.nx, self.ny)
+        for axis in [0, 1, 2]:
+            np.cumsum(counts, axis=axis, out=counts)
+        self.counts = counts
+
+    def _get_cells(self, v, v_min, cell_m, n_cells):
+        # the same floor for points and box edges, so a point inside a box is in a cell the box touches
+        return np.clip(np.floor((v - v_min) / cell_m), 0, n_cells - 1).astype(np.int64)
+
+    def box_counts(self, kz0, kz1, x_min, x_max, y_min, y_max):
+        # points in z levels kz0 to kz1 - 1 and in the cells the x, y box touches.  at least the points
+        # in the box.
+        i0 = self._get_cells(x_min, self.x_min, self.cell_x_m, self.nx)
+        i1 = self._get_cells(x_max, self.x_min, self.cell_x_m, self.nx) + 1
+        j0 = self._get_cells(y_min, self.y_min, self.cell_y_m, self.ny)
+        j1 = self._get_cells(y_max, self.y_min, self.cell_y_m, self.ny) + 1
+        c = self.counts
+        return (c[kz1, i1, j1] - c[kz1, i0, j1] - c[kz1, i1, j0] + c[kz1, i0, j0]
+                - c[kz0, i1, j1] + c[kz0, i0, j1] + c[kz0, i1, j0] - c[kz0, i0, j0])
+
+class Box_Integrator(Array_Integrator):
+    # integrate() over one index's envelope, without loading it again.  voxels are built from the
+    # candidate points only (every point of the box, in data order), so the result is integrate()'s.
+
+    def __init__(self, index) -> None:
+        super().__init__(x_bins=index.x_bins, y_bins=index.y_bins, min_points_per_voxel=index.min_points_per_voxel)
+        self.bounds = index.bounds
+        self.z_levels_m = index.z_levels_m
+        self.z_spacing_m = index.z_spacing_m
+        self.points = index.points
+        self.candidates = None
+
+    def _get_points(self):
+        return tuple(v[self.candidates] for v in self.points)
+
+    def get_mass_g(self, candidates, x_min, x_max, y_min, y_max, z_min, z_max):
+        # the steps of integrate() that give total_mass_g
+        self.candidates = candidates
+        bounds = self._prepare_integration_bounds(x_min, x_max, y_min, y_max, z_min, z_max)
+        self._create_voxels(bounds)
+        self._calculate_mass_and_volume(bounds)
+        return self.total_mass_g
+
+class Flammable_Mass_Index:
+
+    def __init__(self, flammable_envelope_df, x_bins = X_BINS, y_bins = Y_BINS, min_points_per_voxel = 1) -> None:
+        integrator = Array_Integrator(x_bins=x_bins, y_bins=y_bins, min_points_per_voxel=min_points_per_voxel)
+        integrator.load_data(flammable_envelope_df)
+        self.x_bins = x_bins
+        self.y_bins = y_bins
+        self.min_points_per_voxel = min_points_per_voxel
+        self.bounds = integrator.bounds
+        self.z_levels_m = integrator.z_levels_m
+        self.z_spacing_m = integrator.z_spacing_m
+        # shared by every Box_Integrator.  read only.
+        self.points = integrator._get_points()
+        x, y, z, _ = self.points
+        self.n_points = len(x)
+
+        self.x_order = np.argsort(x, kind='stable')
+        self.sorted_x = x[self.x_order]
+
+        bounds = self.bounds
+        z_idx = np.searchsorted(self.z_levels_m, z)
+        self.count_table = Point_Count_Table(z_idx, len(self.z_levels_m), x, y, bounds['x']['min'], bounds['x']['range'], bounds['y']['min'], bounds['y']['range'])
+        self.n_bytes = sum(v.nbytes for v in self.points) + self.x_order.nbytes + self.sorted_x.nbytes + self.count_table.counts.nbytes
+
+    def get_masses_g(self, x_min, x_max, y_min, y_max, z_min, z_max):
+        # flammable mass (g) in each box.  arguments are arrays (or scalars) of box bounds (m).
+        bounds = [np.atleast_1d(np.asarray(v, dtype=float)) for v in [x_min, x_max, y_min, y_max, z_min, z_max]]
+        x_min, x_max, y_min, y_max, z_min, z_max = np.broadcast_arrays(*bounds)
+        if not all(np.all(np.isfinite(v)) for v in bounds):
+            raise ValueError('Volume bounds must be finite numbers.')
+        if np.any(x_max <= x_min) or np.any(y_max <= y_min) or np.any(z_max < z_min):
+            raise ValueError('Volumes must have xMax > xMin, yMax > yMin and zMax >= zMin.')
+
+        kz0 = np.searchsorted(self.z_levels_m, z_min, side='left')
+        kz1 = np.searchsorted(self.z_levels_m, z_max, side='right')
+        occupied = self.count_table.box_counts(kz0, kz1, x_min, x_max, y_min, y_max) > 0
+        lo = np.searchsorted(self.sorted_x, x_min, side='left')
+        hi = np.searchsorted(self.sorted_x, x_max, side='right')
+
+        masses_g = np.zeros(len(x_min))
+        integrator = Box_Integrator(self)
+        for i in np.flatnonzero(occupied):
+            candidates = np.sort(self.x_order[lo[i]:hi[i]])
+            masses_g[i] = integrator.get_mass_g(candidates, x_min[i], x_max[i], y_min[i], y_max[i], z_min[i], z_max[i])
+        return masses_g
+
+    def stats(self):
+        return {
+            'points': self.n_points,
+            'z_levels': len(self.z_levels_m),
+            'count_grid': {'nx': self.count_table.nx, 'ny': self.count_table.ny},
+            'bytes': self.n_bytes,
+        }
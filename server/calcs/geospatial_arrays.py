@@ -0,0 +1,45 @@
+from functools import lru_cache
+
+import numpy as np
+
+# array version of py_lopa.calcs.geospatial.distance_in_meters_between_lat1_long1_and_lat2_long_2.
+# same haversine formula and earth radius, evaluated for every pair of points in one call.
+
+EARTH_RADIUS_M = 6378137.0
+LAYOUT_CACHE_SIZE = 64
+
+def distance_matrix_m(lats_1, lngs_1, lats_2, lngs_2):
+    # returns an N x M array of distances from each point in set 1 to each point in set 2
+    lat1 = np.radians(np.asarray(lats_1, dtype=float))[:, np.newaxis]
+    lng1 = np.radians(np.asarray(lngs_1, dtype=float))[:, np.newaxis]
+    lat2 = np.radians(np.asarray(lats_2, dtype=float))[np.newaxis, :]
+    lng2 = np.radians(np.asarray(lngs_2, dtype=float))[np.newaxis, :]
+
+    # Haversine formula
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
+    return EARTH_RADIUS_M * c
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def _cached_distance_matrix_m(lat_lngs_1, lat_lngs_2):
+    lats_1, lngs_1 = zip(*lat_lngs_1)
+    lats_2, lngs_2 = zip(*lat_lngs_2)
+    dists_m = distance_matrix_m(lats_1, lngs_1, lats_2, lngs_2)
+    # shared between requests, so it must not be modified in place
+    dists_m.flags.writeable = False
+    return dists_m
+
+def distance_matrix_m_for_layout(positions_1, positions_2):
+    # positions are dicts with 'lat' and 'lng' keys (as sent by the client).  the matrix is cached per
+    # layout, so requests that only change flash data or congestion reuse it.
+    if len(positions_1) == 0 or len(positions_2) == 0:
+        return np.zeros((len(positions_1), len(positions_2)))
+    lat_lngs_1 = tuple((float(p['lat']), float(p['lng'])) for p in positions_1)
+    lat_lngs_2 = tuple((float(p['lat']), float(p['lng'])) for p in positions_2)
+    return _cached_distance_matrix_m(lat_lngs_1, lat_lngs_2)
+
+def layout_cache_info():
+    return _cached_distance_matrix_m.cache_info()
@@ -0,0 +1,208 @@
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+
+# local model of the radiation field around one flame, for interactive transect and point queries.
+# the field is sampled once with PWS radiation transects laid along x, one per (y, z) line of a tensor
+# grid.  each transect is resampled onto common x nodes, so the samples form a regular (non uniform in
+# y and z) 3-D grid, and queries are answered by trilinear interpolation of log10(radiation).
+#
+# refinement:  starting from a coarse grid, every y (and z) interval is checked by sampling the lines
+# at its midpoint and comparing them with the interpolation between the interval's end lines.
+# intervals that miss the tolerance are split again on the next pass, so lines concentrate where the
+# field is steep (near the flame).  the x nodes are doubled until resampling the transects onto them
+# is within the tolerance.
+#
+# errors are relative to max(radiation, floor_w_m2), so levels far below any radiation criterion do
+# not drive refinement.  the declared error bound is an estimate, not a guarantee:  the largest error
+# measured for an interval that was accepted (each accepted interval was then halved, so the final
+# grid is finer than the one tested), for an interval that reached the minimum line spacing, or for
+# the x resampling, times ERROR_BOUND_SAFETY_FACTOR.  the midpoint checks only see the cell faces, and
+# the factor covers the cell interiors (about 1.5x the face error for a point source).  if the
+# transect budget runs out first, the field is flagged as not converged and the bound also includes
+# the largest error still open.  sharp peaks (a flame close to the sampled box) need many more
+# transects than smooth far fields, as refinement only pays off once the line spacing is below the
+# width of the peak.
+
+RADIATION_FIELD_REL_TOL = 0.1
+RADIATION_ERROR_FLOOR_W_M2 = 100
+# added before taking the log, so zero radiation stays finite
+RADIATION_LOG_OFFSET_W_M2 = 1
+
+COARSE_LEVELS = 5
+MAX_FIELD_TRANSECTS = 400
+MIN_LEVEL_SPACING_M = 0.25
+X_NODES = 101
+MAX_X_NODES = 1601
+ERROR_BOUND_SAFETY_FACTOR = 2
+
+def to_log(q):
+    return np.log10(np.maximum(np.asarray(q, dtype=float), 0) + RADIATION_LOG_OFFSET_W_M2)
+
+def from_log(v):
+    return np.maximum(10**np.asarray(v, dtype=float) - RADIATION_LOG_OFFSET_W_M2, 0)
+
+def get_rel_error(q_est, q_true, floor_w_m2 = RADIATION_ERROR_FLOOR_W_M2):
+    q_true = np.asarray(q_true, dtype=float)
+    return np.abs(np.asarray(q_est, dtype=float) - q_true) / np.maximum(np.abs(q_true), floor_w_m2)
+
+class Radiation_Field:
+
+    def __init__(self, xs, ys, zs, values_log, error_bound, converged, rel_tol, floor_w_m2, transects) -> None:
+        # values_log[ix, iy, iz]
+        self.xs = np.asarray(xs, dtype=float)
+        self.ys = np.asarray(ys, dtype=float)
+        self.zs = np.asarray(zs, dtype=float)
+        self.error_bound = float(error_bound)
+        self.converged = converged
+        self.rel_tol = rel_tol
+        self.floor_w_m2 = floor_w_m2
+        self.transects = transects
+        self.interpolator = RegularGridInterpolator((self.xs, self.ys, self.zs), values_log, method='linear', bounds_error=False, fill_value=np.nan)
+
+    def query(self, points):
+        # points:  (n, 3) array of x, y, z (m).  points outside the sampled box give nan.
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        return from_log(self.interpolator(points))
+
+    def query_line(self, start, final, n_points):
+        ts = np.linspace(0, 1, n_points)[:, None]
+        points = np.asarray(start, dtype=float) + ts * (np.asarray(final, dtype=float) - np.asarray(start, dtype=float))
+        return points, self.query(points)
+
+    def bounds(self):
+        return {
+            'xMin': self.xs[0], 'xMax': self.xs[-1],
+            'yMin': self.ys[0], 'yMax': self.ys[-1],
+            'zMin': self.zs[0], 'zMax': self.zs[-1],
+        }
+
+    def stats(self):
+        return {
+            'error_bound': self.error_bound,
+            'converged': self.converged,
+            'rel_tol': self.rel_tol,
+            'floor_w_m2': self.floor_w_m2,
+            'transects': self.transects,
+            'grid': {'nx': len(self.xs), 'ny': len(self.ys), 'nz': len(self.zs)},
+            'bounds_m': {k: float(v) for k, v in self.bounds().items()},
+        }
+
+class Radiation_Field_Builder:
+
+    def __init__(self, sample_lines, x_min, x_max, y_min, y_max, z_min, z_max, rel_tol = RADIATION_FIELD_REL_TOL, floor_w_m2 = RADIATION_ERROR_FLOOR_W_M2, coarse_levels = COARSE_LEVELS, max_transects = MAX_FIELD_TRANSECTS, min_spacing_m = MIN_LEVEL_SPACING_M) -> None:
+        # sample_lines:  async fn([(y, z), ...]) -> [(record xs, record radiation w/m2), ...], one transect
+        # from x_min to x_max per line
+        if not (x_max > x_min and y_max > y_min and z_max > z_min):
+            raise ValueError('Radiation field bounds must have max > min in x, y and z.')
+        self.sample_lines = sample_lines
+        self.x_min = x_min
+        self.x_max = x_max
+        self.rel_tol = rel_tol
+        self.floor_w_m2 = floor_w_m2
+        self.max_transects = max_transects
+        self.min_spacing_m = min_spacing_m
+        self.ys = list(np.linspace(y_min, y_max, coarse_levels))
+        self.zs = list(np.linspace(z_min, z_max, coarse_levels))
+        self.lines = {}
+        self.x_nodes = np.linspace(x_min, x_max, X_NODES)
+        # axis: intervals whose midpoint check passed
+        self.accepted = {'y': set(), 'z': set()}
+        self.accepted_error = 0.0
+        self.open_error = 0.0
+        self.unresolved_error = 0.0
+        self.converged = False
+
+    async def sample(self, pairs):
+        new_pairs = [p for p in dict.fromkeys(pairs) if p not in self.lines]
+        if len(new_pairs) == 0:
+            return
+        results = await self.sample_lines(new_pairs)
+        for pair, (rec_xs, rec_qs) in zip(new_pairs, results):
+            order = np.argsort(rec_xs)
+            self.lines[pair] = (np.asarray(rec_xs, dtype=float)[order], to_log(np.asarray(rec_qs, dtype=float)[order]))
+
+    def line_on_nodes(self, pair, x_nodes = None):
+        rec_xs, rec_vs = self.lines[pair]
+        return np.interp(self.x_nodes if x_nodes is None else x_nodes, rec_xs, rec_vs)
+
+    def get_candidates(self, axis):
+        levels = self.ys if axis == 'y' else self.zs
+        return [(a, b) for a, b in zip(levels[:-1], levels[1:]) if (a, b) not in self.accepted[axis] and b - a >= 2 * self.min_spacing_m]
+
+    def check_intervals(self, axis, intervals):
+        # compares the midpoint lines with the interpolation between the interval's end lines
+        others = self.zs if axis == 'y' else self.ys
+        open_error = 0.0
+        for a, b in intervals:
+            m = (a + b) / 2
+            err = 0.0
+            for o in others:
+                pa, pm, pb = [(lvl, o) if axis == 'y' else (o, lvl) for lvl in (a, m, b)]
+                est = (self.line_on_nodes(pa) + self.line_on_nodes(pb)) / 2
+                err = max(err, float(np.max(get_rel_error(from_log(est), from_log(self.line_on_nodes(pm)), self.floor_w_m2))))
+            if err <= self.rel_tol:
+                self.accepted[axis].update([(a, m), (m, b)])
+                self.accepted_error = max(self.accepted_error, err)
+            elif m - a < 2 * self.min_spacing_m:
+                # the halves are too narrow to split again
+                self.unresolved_error = max(self.unresolved_error, err)
+            else:
+                open_error = max(open_error, err)
+        return open_error
+
+    async def refine_axis(self, axis):
+        intervals = self.get_candidates(axis)
+        if len(intervals) == 0:
+            return True, 0.0
+        mids = [(a + b) / 2 for a, b in intervals]
+        others = self.zs if axis == 'y' else self.ys
+        n_new = len(mids) * len(others)
+        if len(self.lines) + n_new > self.max_transects:
+            return False, None
+        await self.sample([(m, o) if axis == 'y' else (o, m) for m in mids for o in others])
+        open_error = self.check_intervals(axis, intervals)
+        levels = self.ys if axis == 'y' else self.zs
+        levels.extend(mids)
+        levels.sort()
+        return False, open_error
+
+    def refine_x_nodes(self):
+        # doubles the x nodes until every transect, resampled onto them, reproduces its own records
+        x_error = 0.0
+        while True:
+            x_error = 0.0
+            for pair, (rec_xs, rec_vs) in self.lines.items():
+                on_nodes = self.line_on_nodes(pair)
+                back = np.interp(rec_xs, self.x_nodes, on_nodes)
+                x_error = max(x_error, float(np.max(get_rel_error(from_log(back), from_log(rec_vs), self.floor_w_m2))))
+            if x_error <= self.rel_tol or len(self.x_nodes) >= MAX_X_NODES:
+                return x_error
+            self.x_nodes = np.linspace(self.x_min, self.x_max, 2 * (len(self.x_nodes) - 1) + 1)
+
+    async def build(self):
+        await self.sample([(y, z) for y in self.ys for z in self.zs])
+        while True:
+            y_done, y_open = await self.refine_axis('y')
+            if y_open is None:
+                break
+            z_done, z_open = await self.refine_axis('z')
+            if z_open is None:
+                self.open_error = max(self.open_error, y_open)
+                break
+            # errors of the intervals just split.  their halves are checked on the next pass.
+            self.open_error = max(y_open, z_open)
+            if y_done and z_done:
+                self.converged = True
+                break
+
+        x_error = self.refine_x_nodes()
+        error_bound = max(self.accepted_error, self.unresolved_error, x_error)
+        if not self.converged:
+            # transect budget spent.  the largest error still open is part of the bound.
+            error_bound = max(error_bound, self.open_error)
+        error_bound *= ERROR_BOUND_SAFETY_FACTOR
+        values = np.empty((len(self.x_nodes), len(self.ys), len(self.zs)))
+        for iy, y in enumerate(self.ys):
+            for iz, z in enumerate(self.zs):
+                values[:, iy, iz] = self.line_on_nodes((y, z))
+        return Radiation_Field(self.x_nodes, self.ys, self.zs, values, error_bound=error_bound, converged=self.converged, rel_tol=self.rel_tol, floor_w_m2=self.floor_w_m2, transects=len(self.lines))
@@ -0,0 +1,209 @@
+# array version of py_lopa.calcs.tno_multienergy_blast_correlations.
+# the breakpoints and regressed constants below are the ones used by
+# get_psc_given_blast_strength_class_and_scaled_radius (TNO Yellow Book, figure 5.8A).
+# they are laid out once as (class x segment) tables so any mix of blast strength classes
+# and scaled radii can be evaluated in one call.
+
+# each class is split into the same five segments, in order of increasing r':
+#   0 - flat
+#   1 - concave downward curvature (polynomial in r')
+#   2 - linear pre quadratic (log-log)
+#   3 - quadratic (log-parabola)
+#   4 - linear post quadratic or convex downward (log-log)
+# segments a class does not have are given zero width (upper bound equal to the previous one).
+
+import numpy as np
+
+N_CLASSES = 10
+N_SEGMENTS = 5
+MAX_SCALED_RADIUS = 100
+MIN_PSC = 0.001
+
+SEGMENT_FLAT = 0
+SEGMENT_CONCAVE_DOWNWARD_CURVATURE = 1
+SEGMENT_LINEAR_PRE_QUADRATIC = 2
+SEGMENT_QUADRATIC = 3
+SEGMENT_LINEAR_POST_QUADRATIC = 4
+
+_max_flat = {
+    1: 0.50842741,
+    2: 0.573902853,
+    3: 0.438458551,
+    4: 0.50842741,
+    5: 0.501629957,
+    6: 0.373063398,
+    7: 0.404441389,
+    8: 0.39105862,
+    9: 0.288880545,
+    10: 0.24579463,
+}
+
+_max_concave_downward_curvature = {
+    1: 0.692907514,
+    2: 0.731235452,
+    3: 0.782140363,
+    4: 0.931699997,
+    5: 0.683643642,
+    6: 0.665485804,
+    7: 0.551190734,
+}
+
+_max_downward_linear_range_pre_quadratic = {
+    6: 2.565020906,
+    7: 0.98843814,
+    8: 0.546227722,
+    9: 0.380897464,
+}
+
+_max_downward_concave_quadratic = 2.565020906
+
+_flat_psc = {
+    1: 0.01,
+    2: 0.02,
+    3: 0.05,
+    4: 0.1,
+    5: 0.2,
+    6: 0.5,
+    7: 1,
+    8: 2,
+    9: 5,
+    10: 16,
+}
+
+_concave_downward_curvature_consts = {
+    1: [-0.02043077,0.020573344,0.00482127],
+    2: [-0.055052319,0.061253279, 0.002978847],
+    3: [-0.049898759, 0.033111935, 0.045074621],
+    4: [0, -0.066768111, 0.133946738],
+    5: [-0.800964121, 0.756470834, 0.022080264],
+    6: [-0.614039961, 0.433796864, 0.423626077],
+    7: [-5.220146019, 4.191926709, 0.158485434],
+}
+
+_linear_pre_quadratic_consts = {
+    6: [0, -1.031773028, -0.538661887],
+    7: [0, -1.092329503, -0.336574836],
+    8: [0, -0.640175046, 0.04859677],
+    9: [0, -0.743204218, 0.324973569],
+}
+
+_quadratic_consts = [1.028326423, -1.914345937, -0.348096795]
+
+_linear_post_quadratic_consts = {
+    1: [0, -0.995763903, -2.191689252],
+    2: [0, -1.009002098, -1.873941275],
+    3: [0, -0.999171136, -1.499734547],
+    4: [0, -1.013651877, -1.175388699],
+    5: [0, -0.997214279, -0.94751253],
+    6: [0, -1.129629468, -0.498629707],
+    7: [0, -1.129629468, -0.498629707],
+    8: [0, -1.129629468, -0.498629707],
+    9: [0, -1.129629468, -0.498629707],
+    10: [0, -1.129629468, -0.498629707],
+}
+
+def _build_tables():
+    # row 0 is unused so the tables can be indexed by class number directly
+    upper = np.full((N_CLASSES + 1, N_SEGMENTS - 1), np.nan)
+    consts = np.zeros((N_CLASSES + 1, N_SEGMENTS, 3))
+    is_log = np.array([False, False, True, True, True])
+
+    for c in range(1, N_CLASSES + 1):
+        flat_ub = _max_flat[c]
+        concave_ub = _max_concave_downward_curvature.get(c, flat_ub)
+        if c < 6:
+            pre_quad_ub = concave_ub
+            quad_ub = concave_ub
+        else:
+            pre_quad_ub = _max_downward_linear_range_pre_quadratic.get(c, concave_ub)
+            quad_ub = _max_downward_concave_quadratic
+        upper[c] = [flat_ub, concave_ub, pre_quad_ub, quad_ub]
+
+        consts[c, SEGMENT_FLAT] = [0, 0, _flat_psc[c]]
+        consts[c, SEGMENT_CONCAVE_DOWNWARD_CURVATURE] = _concave_downward_curvature_consts.get(c, [0, 0, 0])
+        consts[c, SEGMENT_LINEAR_PRE_QUADRATIC] = _linear_pre_quadratic_consts.get(c, [0, 0, 0])
+        consts[c, SEGMENT_QUADRATIC] = _quadratic_consts
+        consts[c, SEGMENT_LINEAR_POST_QUADRATIC] = _linear_post_quadratic_consts[c]
+
+    return upper, consts, is_log
+
+SEGMENT_UPPER_BOUNDS, SEGMENT_CONSTS, SEGMENT_IS_LOG = _build_tables()
+
+def get_segment(tno_class, scaled_radius):
+    tno_class = np.asarray(tno_class, dtype=np.int64)
+    r = np.minimum(np.asarray(scaled_radius, dtype=float), MAX_SCALED_RADIUS)
+    upper = SEGMENT_UPPER_BOUNDS[tno_class]
+    return (r[..., np.newaxis] > upper).sum(axis=-1)
+
+def get_psc_given_blast_strength_class_and_scaled_radius(tno_class, scaled_radius):
+    # tno_class and scaled_radius are broadcast against each other.  returns scaled side-on pressure.
+    tno_class, r = np.broadcast_arrays(np.asarray(tno_class, dtype=np.int64), np.asarray(scaled_radius, dtype=float))
+    if np.any((tno_class < 1) | (tno_class > N_CLASSES)):
+        raise ValueError(f'blast strength class must be between 1 and {N_CLASSES}')
+    r = np.minimum(r, MAX_SCALED_RADIUS)
+    segment = get_segment(tno_class, r)
+    consts = SEGMENT_CONSTS[tno_class, segment]
+    is_log = SEGMENT_IS_LOG[segment]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = np.where(is_log, np.log10(r), r)
+        y = consts[..., 0]*x**2 + consts[..., 1]*x + consts[..., 2]
+        psc = np.where(is_log, 10**y, y)
+
+    return np.maximum(psc, MIN_PSC)
+
+def _segment_value(tno_class, segment, r):
+    consts = SEGMENT_CONSTS[tno_class, segment]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if SEGMENT_IS_LOG[segment]:
+            x = np.log10(r)
+            return 10**(consts[..., 0]*x**2 + consts[..., 1]*x + consts[..., 2])
+        return consts[..., 0]*r**2 + consts[..., 1]*r + consts[..., 2]
+
+def _segment_root(tno_class, segment, psc, x_lo, x_hi):
+    # solves a*x**2 + b*x + c = y for the root inside [x_lo, x_hi].  x and y are log10 values on log segments.
+    a, b, c = (SEGMENT_CONSTS[tno_class, segment][..., i] for i in range(3))
+    y = np.log10(psc) if SEGMENT_IS_LOG[segment] else psc
+    with np.errstate(divide='ignore', invalid='ignore'):
+        linear_root = (y - c) / b
+        disc = np.sqrt(np.maximum(b**2 - 4*a*(c - y), 0))
+        root_1 = (-b + disc) / (2*a)
+        root_2 = (-b - disc) / (2*a)
+    miss_1 = np.maximum(x_lo - root_1, root_1 - x_hi)
+    miss_2 = np.maximum(x_lo - root_2, root_2 - x_hi)
+    quadratic_root = np.where(np.nan_to_num(miss_1, nan=np.inf) <= np.nan_to_num(miss_2, nan=np.inf), root_1, root_2)
+    x = np.clip(np.where(a == 0, linear_root, quadratic_root), x_lo, x_hi)
+    return 10**x if SEGMENT_IS_LOG[segment] else x
+
+def get_scaled_radius_given_blast_strength_class_and_psc(tno_class, psc):
+    # inverse of get_psc_given_blast_strength_class_and_scaled_radius.  returns the largest scaled radius
+    # (up to MAX_SCALED_RADIUS) at which the scaled side-on pressure is at least psc, or 0 where psc is
+    # above the flat top of the curve.  each segment is decreasing over its own range, so its largest
+    # qualifying radius is either its upper bound or the analytic root of its regression.
+    tno_class, psc = np.broadcast_arrays(np.asarray(tno_class, dtype=np.int64), np.asarray(psc, dtype=float))
+    if np.any((tno_class < 1) | (tno_class > N_CLASSES)):
+        raise ValueError(f'blast strength class must be between 1 and {N_CLASSES}')
+
+    scaled_r = np.zeros(psc.shape)
+    r_lo = np.zeros(psc.shape)
+    for segment in range(N_SEGMENTS):
+        if segment < N_SEGMENTS - 1:
+            r_hi = SEGMENT_UPPER_BOUNDS[tno_class, segment]
+        else:
+            r_hi = np.full(psc.shape, float(MAX_SCALED_RADIUS))
+        has_width = r_hi > r_lo
+        if segment == SEGMENT_FLAT:
+            candidate = np.where(_segment_value(tno_class, segment, r_hi) >= psc, r_hi, 0)
+        else:
+            at_hi = _segment_value(tno_class, segment, r_hi)
+            at_lo = _segment_value(tno_class, segment, r_lo)
+            if SEGMENT_IS_LOG[segment]:
+                root = _segment_root(tno_class, segment, psc, np.log10(r_lo), np.log10(r_hi))
+            else:
+                root = _segment_root(tno_class, segment, psc, r_lo, r_hi)
+            candidate = np.where(at_hi >= psc, r_hi, np.where(at_lo >= psc, root, 0))
+        scaled_r = np.where(has_width, np.maximum(scaled_r, candidate), scaled_r)
+        r_lo = np.where(has_width, r_hi, r_lo)
+
+    # below the 0.001 floor the whole curve qualifies
+    return np.where(psc <= MIN_PSC, float(MAX_SCALED_RADIUS), scaled_r)
@@ -0,0 +1,304 @@
+import copy
+import numpy as np
+import pandas as pd
+
+from pypws.calculations import DistancesAndFootprintsToConcentrationLevelsCalculation
+from pypws.enums import ResultCode
+
+from py_lopa.classes.vce import VCE
+from py_lopa.classes.building import Building
+from py_lopa.model_work import model_controller
+
+from calcs.array_integrator import Array_Integrator
+from calcs import tno_curves
+from calcs import chunked_footprints
+from calcs.adaptive_envelope import Adaptive_Envelope, FLAMMABLE_MASS_REL_TOL
+from calcs.geospatial_arrays import distance_matrix_m_for_layout
+from utils.table_registry import table_registry
+from utils.request_timing import timed
+
+
+class Array_VCE(VCE):
+
+    # py_lopa VCE with the flammable envelope held as columns and the flammable mass integration
+    # done by the array-backed integrator.  the list of dicts view of the envelope is only built
+    # when a caller reads flammable_envelope_list_of_dicts.
+
+    ENVELOPE_COLUMNS = ['x', 'y', 'z', 'conc_ppm', 'conc_g_m3']
+
+    # footprint configs are sent to PWS in bands of this many elevations, run side by side (see
+    # calcs.chunked_footprints).  None sends them as one request, as py_lopa does.
+    footprint_elevations_per_chunk = chunked_footprints.ELEVATIONS_PER_CHUNK
+
+    # model input that, set False, sends a run's footprint configs as one request, as py_lopa does
+    FOOTPRINT_CHUNKING_INPUT = 'vce_footprint_chunking'
+
+    # model inputs that switch on the adaptive envelope (see calcs.adaptive_envelope) for a run
+    ADAPTIVE_ENVELOPE_INPUT = 'vce_adaptive_envelope'
+    ADAPTIVE_ENVELOPE_REL_TOL_INPUT = 'vce_adaptive_envelope_rel_tol'
+
+    # passes and request counts from the last adaptive run
+    envelope_refinement = None
+
+    @property
+    def flammable_envelope_list_of_dicts(self):
+        if self._flammable_envelope_list_of_dicts is None:
+            self._flammable_envelope_list_of_dicts = self.get_flammable_envelope_records()
+        return self._flammable_envelope_list_of_dicts
+
+    @flammable_envelope_list_of_dicts.setter
+    def flammable_envelope_list_of_dicts(self, recs):
+        self._flammable_envelope_list_of_dicts = recs
+
+    def get_flammable_envelope_records(self):
+        return envelope_df_to_records(self.flammable_envelope_df)
+
+    def get_overall_flammable_envelope_and_maximum_downwind_extent(self):
+        self.get_conc_targets_between_lfl_and_pure_conc()
+        resp = self.run_dispersion_model_inside_flammable_envelope()
+
+        if resp != ResultCode.SUCCESS:
+            self.phast_dispersion.mi.LOG_HANDLER('VCE flammable envelope model did not complete successfully')
+            return
+        self.phast_dispersion.mi.LOG_HANDLER('VCE flammable envelope model completed OK')
+
+        with timed('footprint_parse'):
+            self.parse_flam_env_contour_points()
+
+        # records are left out.  read vce.flammable_envelope_list_of_dicts if they are needed.
+        return {
+            'flammable_envelope_df': self.flammable_envelope_df,
+            'maximum_downwind_extent': self.max_dw_extent,
+            'flash_data': self.flash_data,
+            'envelope_refinement': self.envelope_refinement,
+        }
+
+    def get_model_inputs(self):
+        inputs = getattr(self.mi, 'inputs', None)
+        return inputs if inputs is not None else {}
+
+    def get_footprint_elevations_per_chunk(self):
+        if not self.get_model_inputs().get(self.FOOTPRINT_CHUNKING_INPUT, True):
+            return None
+        return self.footprint_elevations_per_chunk
+
+    def run_dispersion_model_inside_flammable_envelope(self):
+        if self.get_model_inputs().get(self.ADAPTIVE_ENVELOPE_INPUT, False):
+            return self.run_adaptive_dispersion_model_inside_flammable_envelope()
+        elevations_per_chunk = self.get_footprint_elevations_per_chunk()
+        if elevations_per_chunk is None:
+            return super().run_dispersion_model_inside_flammable_envelope()
+        return chunked_footprints.run_footprint_models_for_vce_chunked(self.phast_dispersion, self.targ_concs, elevations_per_chunk=elevations_per_chunk)
+
+    def run_adaptive_dispersion_model_inside_flammable_envelope(self):
+        inputs = self.get_model_inputs()
+        adaptive_envelope = Adaptive_Envelope(
+            vce = self,
+            elevations_per_chunk = self.get_footprint_elevations_per_chunk(),
+            rel_tol = inputs.get(self.ADAPTIVE_ENVELOPE_REL_TOL_INPUT, FLAMMABLE_MASS_REL_TOL),
+            release_elevation_m = inputs.get('release_elevation_m'),
+        )
+        self.phast_dispersion.mi.LOG_HANDLER('\n***\n\nInitiating Model:  VCE Flammable Envelope (adaptive)')
+        res = adaptive_envelope.run()
+        self.envelope_refinement = adaptive_envelope.stats()
+        self.phast_dispersion.mi.LOG_HANDLER(f'adaptive flammable envelope:  {self.envelope_refinement}')
+        return res
+
+    def parse_flam_env_contour_points(self):
+        dists_and_concs:DistancesAndFootprintsToConcentrationLevelsCalculation = self.phast_dispersion.distancesAndFootprintsCalc
+        n_contour_points = np.asarray(dists_and_concs.n_contour_points, dtype=np.int64)
+        cps = dists_and_concs.contour_points
+        n_points = int(n_contour_points.sum())
+
+        # slice the contour points for every output config straight into arrays
+        concs = np.array([cfg.concentration if cfg.concentration is not None else 0 for cfg in dists_and_concs.dispersion_output_configs[:len(n_contour_points)]], dtype=float)
+        conc_ppm = np.repeat(concs * 1e6, n_contour_points)
+        x = np.fromiter((cp.x for cp in cps[:n_points]), dtype=float, count=n_points)
+        y = np.fromiter((cp.y for cp in cps[:n_points]), dtype=float, count=n_points)
+        z = np.fromiter((cp.z for cp in cps[:n_points]), dtype=float, count=n_points)
+
+        if n_points == 0:
+            x, y, z, conc_ppm = np.zeros(1), np.zeros(1), np.zeros(1), np.zeros(1)
+
+        keep = (x > -10000) & (x < 10000)
+        x, y, z, conc_ppm = x[keep], y[keep], z[keep], conc_ppm[keep]
+
+        # concGm3 = concPpm * mWt / 24450
+        ys = np.array(self.flash_data['ys'])
+        if ys.sum() == 0:
+            ys = np.array(self.flash_data['k_times_zi'])
+            if ys.sum() > 0:
+                ys /= ys.sum()
+        mws = np.array(self.flash_data['mws'])
+        ave_mw_vap = ys.dot(mws.T)
+        conc_g_m3 = conc_ppm * ave_mw_vap / 24450
+
+        self.flammable_envelope_df = pd.DataFrame({'x': x, 'y': y, 'z': z, 'conc_ppm': conc_ppm, 'conc_g_m3': conc_g_m3})
+        self.flammable_envelope_list_of_dicts = None
+        self.max_dw_extent = max(abs(x.min()), abs(x.max())) if len(x) > 0 else 0
+
+    def get_flammable_mass(self, x_min = None, x_max = None, y_min = None, y_max = None, z_min = None, z_max = None, flammable_envelope_list_of_dicts = None, cv = None, stoich_moles_o2_to_fuel = None, flash_data = None, flammable_envelope_df = None):
+
+        # stoich method does not use the envelope.  defer to py_lopa.
+        if stoich_moles_o2_to_fuel is not None and (flash_data is not None or self.flash_data is not None):
+            return super().get_flammable_mass(x_min=x_min, x_max=x_max, y_min=y_min, y_max=y_max, z_min=z_min, z_max=z_max, flammable_envelope_list_of_dicts=flammable_envelope_list_of_dicts, cv=cv, stoich_moles_o2_to_fuel=stoich_moles_o2_to_fuel, flash_data=flash_data)
+
+        # an envelope already held as a dataframe (e.g. from the envelope store) skips the list of dicts parse.
+        if flammable_envelope_df is None:
+            if flammable_envelope_list_of_dicts is None:
+                flammable_envelope_df = self.flammable_envelope_df
+            else:
+                flammable_envelope_df = pd.DataFrame(flammable_envelope_list_of_dicts)
+
+        if len(flammable_envelope_df) == 0:
+            raise ValueError("Flammable Envelope Not Provided")
+
+        integrator = Array_Integrator()
+        with timed('integration'):
+            integrator.load_data(flammable_envelope_df)
+        if cv is not None and 'dims' in cv:
+            dims = cv['dims']
+            x_min = dims['xMin'] if x_min is None else x_min
+            x_max = dims['xMax'] if x_max is None else x_max
+            y_min = dims['yMin'] if y_min is None else y_min
+            y_max = dims['yMax'] if y_max is None else y_max
+            z_min = dims['zMin'] if z_min is None else z_min
+            z_max = dims['zMax'] if z_max is None else z_max
+
+        with timed('integration'):
+            results = integrator.integrate(x_min=x_min, x_max=x_max, y_min=y_min, y_max=y_max, z_min=z_min, z_max=z_max)
+        self.flammable_mass_g = results['total_mass_g']
+        self.flammable_mass_results = results
+        return {
+            'flammable_mass_g': self.flammable_mass_g,
+            'flammable_mass_results': self.flammable_mass_results,
+            'error': None,
+        }
+
+    def get_mixture_reactivity_0_low_1_med_2_high(self, flash_data = None):
+        if flash_data is None:
+            flash_data = self.flash_data
+        if flash_data is None:
+            return -1
+        chem_mix = flash_data['chem_mix']
+        ys = flash_data['ys']
+        burn_veloc_denom = 0
+        mixture_burning_velocity_m_s = 0
+        for i in range(len(chem_mix)):
+            burning_veloc_m_s = table_registry.get_burning_velocity_m_s(chem_mix[i])
+            if burning_veloc_m_s is None or burning_veloc_m_s == 0:
+                continue
+            burn_veloc_denom += ys[i]/burning_veloc_m_s
+        if burn_veloc_denom > 0:
+            mixture_burning_velocity_m_s = 1 / burn_veloc_denom
+        reactivity = 1
+        if mixture_burning_velocity_m_s >= 0.75:
+            reactivity = 2
+        if mixture_burning_velocity_m_s < 0.45:
+            reactivity = 0
+        return reactivity
+
+    def get_heat_of_combustion_J(self, flash_data, flammable_mass_g):
+        ys = np.array(flash_data['ys'])
+        # if subcooled, utilize the thermo relation between k (psat / p) * liquid conc to get ys, then normalize.
+        if ys.sum() == 0:
+            ys = np.array(flash_data['k_times_zi'])
+            if ys.sum() > 0:
+                ys /= ys.sum()
+        mws = np.array(flash_data['mws'])
+        chem_mix = flash_data['chem_mix']
+        ave_mw_vap = ys.dot(mws.T)
+        h_comb_j_kmol_total = 0
+        for i in range(len(chem_mix)):
+            h_comb_j_kmol_total += table_registry.get_hcom_j_kmol(chem_mix[i]) * ys[i]
+        h_comb_j_kg_total = h_comb_j_kmol_total / ave_mw_vap
+        h_comb_j = abs(h_comb_j_kg_total * flammable_mass_g / 1000)
+        return h_comb_j
+
+    def get_blast_overpressure_matrix_psi(self, bldg_positions, congested_volumes, flash_data):
+        # returns (volumes kept, overpressure matrix [volume x building]) for every congested volume
+        # with flammable mass.  heat of combustion and blast class are worked out once per volume and
+        # the tno curve is evaluated for the whole matrix in one call.
+        reactivity = self.get_mixture_reactivity_0_low_1_med_2_high(flash_data=flash_data)
+        cvs = [cv for cv in congested_volumes if cv['flammableMassG'] != 0]
+        if len(cvs) == 0 or len(bldg_positions) == 0:
+            return cvs, np.zeros((len(cvs), len(bldg_positions)))
+
+        energy_scale_m = []
+        blast_strength_classes = []
+        for cv in cvs:
+            h_comb_j = self.get_heat_of_combustion_J(flash_data, cv['flammableMassG'])
+            energy_scale_m.append((h_comb_j / 101325) ** (1/3)) # eqn 5.2 in TNO Yellow Book - p. 507
+            blast_strength_classes.append(self.get_blast_strength_for_congested_volume(congested_volume=cv, reactivity=reactivity))
+        energy_scale_m = np.array(energy_scale_m)
+        blast_strength_classes = np.array(blast_strength_classes)
+
+        dists_m = distance_matrix_m_for_layout([cv['position'] for cv in cvs], bldg_positions)
+
+        with np.errstate(divide='raise'):
+            scaled_r = dists_m / energy_scale_m[:, np.newaxis]
+        with timed('tno'):
+            scaled_p = tno_curves.get_psc_given_blast_strength_class_and_scaled_radius(tno_class=blast_strength_classes[:, np.newaxis], scaled_radius=scaled_r)
+        p_Pa_side_on = scaled_p * 101325 # yellow book eqn 5.3
+        p_Pa_side_on_and_reflected = p_Pa_side_on * 2
+        overpressure_psi = p_Pa_side_on_and_reflected * 14.6959 / 101325
+        return cvs, overpressure_psi
+
+    def get_distances_m_to_target_overpressures(self, target_pressures_psi, flammable_mass_g, flash_data, congestion_level, is_indoors):
+        # distance from the volume out to which each target (reflected) overpressure is met, for any
+        # number of targets.  heat of combustion and blast class are worked out once and the tno curve
+        # is inverted analytically for all targets in one call.  targets above the peak of the curve give
+        # 0.  targets at or below the curve's 0.001 psc floor give the end of the curve (r' = 100).
+        target_pressures_psi = np.atleast_1d(np.asarray(target_pressures_psi, dtype=float))
+        if flammable_mass_g == 0:
+            return np.zeros(target_pressures_psi.shape)
+        reactivity = self.get_mixture_reactivity_0_low_1_med_2_high(flash_data=flash_data)
+        blast_strength_class = self.get_blast_strength_for_congested_volume(congested_volume={'isIndoors': is_indoors, 'congestionLevel': congestion_level}, reactivity=reactivity)
+        h_comb_j = self.get_heat_of_combustion_J(flash_data, flammable_mass_g)
+        energy_scale_m = (h_comb_j / 101325) ** (1/3) # eqn 5.2 in TNO Yellow Book - p. 507
+
+        # same conversion as get_blast_overpressure_matrix_psi, run backwards
+        p_Pa_side_on_and_reflected = target_pressures_psi * 101325 / 14.6959
+        scaled_p = p_Pa_side_on_and_reflected / 2 / 101325
+        with timed('tno'):
+            scaled_r = tno_curves.get_scaled_radius_given_blast_strength_class_and_psc(tno_class=blast_strength_class, psc=scaled_p)
+        return scaled_r * energy_scale_m
+
+    def get_distance_m_to_target_overpressure(self, target_pressure_psi, flammable_mass_g, flash_data, congestion_level, is_indoors):
+        return self.get_distances_m_to_target_overpressures(target_pressures_psi=[target_pressure_psi], flammable_mass_g=flammable_mass_g, flash_data=flash_data, congestion_level=congestion_level, is_indoors=is_indoors)[0]
+
+    def get_blast_overpressures_at_buildings_from_congested_volumes_store_highest_pressure_at_each_building_return_updated_buildings(self, buildings, congested_volumes, flash_data = None, bldg_location_for_testing = None):
+        if flash_data is None:
+            flash_data = self.flash_data
+        if flash_data is None:
+            return buildings
+        updated_bldgs = copy.deepcopy(buildings)
+        bldg_dicts = [vars(bldg) if isinstance(bldg, Building) else bldg for bldg in updated_bldgs]
+
+        cvs_with_mass = [cv for cv in congested_volumes if cv['flammableMassG'] != 0]
+        if len(cvs_with_mass) == 0:
+            return updated_bldgs
+
+        # same default as py_lopa:  buildings without a location are placed at the first volume evaluated
+        for bldg in bldg_dicts:
+            if 'location' not in bldg:
+                bldg['location'] = bldg_location_for_testing if bldg_location_for_testing is not None else cvs_with_mass[0]['position']
+
+        _, overpressure_psi = self.get_blast_overpressure_matrix_psi(bldg_positions=[bldg['location'] for bldg in bldg_dicts], congested_volumes=cvs_with_mass, flash_data=flash_data)
+        max_overpressure_psi = overpressure_psi.max(axis=0)
+
+        for bldg, op_psi in zip(bldg_dicts, max_overpressure_psi.tolist()):
+            bldg['max_overpressure_psi'] = max(bldg.get('max_overpressure_psi', op_psi), op_psi)
+
+        return updated_bldgs
+
+def envelope_df_to_records(df):
+    if len(df) == 0:
+        return []
+    cols = list(df.columns)
+    return [dict(zip(cols, row)) for row in zip(*(df[col].tolist() for col in cols))]
+
+def use_array_vce_in_py_lopa():
+    # model runs build their VCE inside py_lopa's model controller.  point it at Array_VCE so
+    # the flammable envelope is parsed into columns.
+    model_controller.VCE = Array_VCE
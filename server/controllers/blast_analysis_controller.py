@@ -4,6 +4,7 @@ import math
 import json
 import pickle
 import asyncio
+import numpy as np
 import pandas as pd
 from functools import reduce
 from flask import request, jsonify
@@ -14,6 +15,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.json_data_loader import get_json_file_path
 from utils.log_output import log_to_file
+from utils.log_config import log_payload, log_py_lopa_message
 
 from pypws.calculations import DispersionCalculation, VesselLeakCalculation, JetFireCalculation, RadiationTransectCalculation
 from pypws.entities import FlammableParameters, FlammableOutputConfig, Transect, LocalPosition
@@ -21,159 +23,327 @@ from pypws.enums import ContourType, ResultCode
 
 from py_lopa.calcs import helpers
 from py_lopa.model_interface import Model_Interface
-from py_lopa.classes.vce import VCE
+
+from classes.array_vce import Array_VCE, envelope_df_to_records, use_array_vce_in_py_lopa
+from calcs.array_pv_burst_blast_calculation import use_array_pv_burst_in_py_lopa
+from calcs.flammable_mass_index import Flammable_Mass_Index
+from utils.envelope_store import envelope_store
+from utils.flammable_mass_index_store import flammable_mass_index_store
+from utils.result_cache import flammable_envelope_cache, get_inputs_key
+from utils.single_flight import get_single_flight
+from utils.pws_limiter import pws_limiter
+from utils.job_runner import job_runner, Job_Queue_Full, Model_Run_Error
+from utils.request_timing import timed
+from utils.point_cloud_format import client_accepts_arrow, arrow_response, get_request_points_and_data, ENVELOPE_DTYPE
 
 import logging
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
-async def flammable_envelope(path_to_json_file=None):
+use_array_vce_in_py_lopa()
+use_array_pv_burst_in_py_lopa()
+
+FLAMMABLE_ENVELOPE_JOB = 'vce_get_flammable_envelope'
+PV_BURST_JOB = 'get_pv_burst_results'
+
+flammable_envelope_flight = get_single_flight(FLAMMABLE_ENVELOPE_JOB)
+pv_burst_flight = get_single_flight(PV_BURST_JOB)
+flammable_mass_index_flight = get_single_flight('build_flammable_mass_index')
+
+MAX_BATCH_VOLUMES = 1000
 
+def run_flammable_envelope(data = None, path_to_json_file = None):
+    # runs the model (or reads the result cache) and leaves the envelope in the envelope store.
+    # no request context is used, so this can run on a job worker.
     m_io = Model_Interface()
-    data=None
-    if path_to_json_file is None:
-        data = request.get_json()
-        m_io.set_inputs_from_json(json_data=json.dumps(data))
-    else:
-        m_io.set_inputs_from_json(path_to_json_file=path_to_json_file)
-    logging.debug(f'in flammable env method.  data to be modeled in py_lopa:  {data}')
+    with timed('input_parse'):
+        if path_to_json_file is None:
+            m_io.set_inputs_from_json(json_data=json.dumps(data))
+        else:
+            m_io.set_inputs_from_json(path_to_json_file=path_to_json_file)
+    log_payload(logger, 'in flammable env method.  data to be modeled in py_lopa:', data)
     m_io.inputs['vapor_cloud_explosion'] = True
-    # m_io.inputs['log_handler'] = log_to_file
-    
-    
-    try:
-        res = m_io.run()
+    m_io.inputs['log_handler'] = log_py_lopa_message
+
+    # adaptive elevation / concentration refinement of the envelope (see calcs.adaptive_envelope)
+    if data is not None and data.get('adaptiveEnvelope', False):
+        m_io.inputs[Array_VCE.ADAPTIVE_ENVELOPE_INPUT] = True
+        if data.get('adaptiveEnvelopeMassTolerance') is not None:
+            m_io.inputs[Array_VCE.ADAPTIVE_ENVELOPE_REL_TOL_INPUT] = float(data['adaptiveEnvelopeMassTolerance'])
+
+    # footprints are sent to PWS in elevation bands (see calcs.chunked_footprints) unless switched off
+    if data is not None and not data.get('chunkedFootprints', True):
+        m_io.inputs[Array_VCE.FOOTPRINT_CHUNKING_INPUT] = False
+
+    # identical runs already in progress are joined rather than started again
+    cache_key = flammable_envelope_cache.make_key(m_io.inputs)
+    return flammable_envelope_flight.do(cache_key, get_flammable_envelope, m_io, cache_key)
+
+def get_flammable_envelope(m_io, cache_key):
+    # repeat runs of the same study are served from the result cache
+    cached = flammable_envelope_cache.get(cache_key)
+    if cached is not None:
+        envelope_df, cached_data = cached
+        max_dist_m = cached_data['maximum_downwind_extent']
+        flash_data = cached_data['flash_data']
+        # the envelope from an earlier run of this key is still held under its id unless it expired or was evicted
+        envelope_id = envelope_store.find(cache_key)
+        logger.debug('flammable envelope found in result cache.  key: %s', cache_key)
+    else:
+        res = pws_limiter.call(m_io.run)
         if res != ResultCode.SUCCESS:
-            logging.debug(f'VCE model for flammable envelope model did not complete successfully.  Result Code:  {res.name}')
-            return jsonify({'error': 'Internal Server Error'}), 500
+            raise Model_Run_Error(f'VCE model for flammable envelope model did not complete successfully.  Result Code:  {res.name}')
         resp = m_io.vce_data
 
-        # return {
-        #     'flammable_envelope_list_of_dicts': self.flammable_envelope_list_of_dicts,
-        #     'maximum_downwind_extent': self.max_dw_extent,
-        # }
-
-        recs = resp['flammable_envelope_list_of_dicts']
+        envelope_df = resp['flammable_envelope_df']
         max_dist_m = int(resp['maximum_downwind_extent'])
         flash_data = resp['flash_data']
+        flammable_envelope_cache.put(cache_key, envelope_df, metadata={'maximum_downwind_extent': max_dist_m, 'flash_data': flash_data})
+        envelope_id = None
+
+    logger.debug('data successful.  envelope points:  %s', len(envelope_df))
+
+    if envelope_id is None:
+        envelope_id = envelope_store.put(envelope_df, flash_data=flash_data, key=cache_key)
+
+    return {
+        'envelope_id' : envelope_id,
+        'maximum_downwind_extent' : max_dist_m,
+        'flash_data' : flash_data,
+    }
+
+def flammable_envelope_response(flam_env_data, as_dict = False):
+    stored_envelope = envelope_store.get(flam_env_data['envelope_id'])
+    if stored_envelope is None:
+        return jsonify({'error': 'Flammable envelope expired.  Please rerun the flammable extent calculation.'}), 404
+    envelope_df = stored_envelope['df']
+
+    if client_accepts_arrow() and not as_dict:
+        with timed('serialize'):
+            columns = {col: envelope_df[col].to_numpy() for col in Array_VCE.ENVELOPE_COLUMNS}
+            return arrow_response(columns, metadata=flam_env_data, dtype=ENVELOPE_DTYPE)
+
+    # list of dicts is only materialized for json responses
+    with timed('serialize'):
+        flam_env_data = dict(flam_env_data)
+        flam_env_data['flammable_envelope_list_of_dicts'] = envelope_df_to_records(envelope_df)
+        ans = {'flam_env_data': flam_env_data}
+
+        if as_dict:
+            return ans
 
-        logging.debug(f'data successful.  first few records:  {recs[:min(5, len(recs))]}')
-
-        ans = {
-            'flam_env_data':{
-                'flammable_envelope_list_of_dicts' : recs,
-                'maximum_downwind_extent' : max_dist_m,
-                'flash_data' : flash_data,
-            }}
+        return jsonify(ans), 200
 
+async def flammable_envelope(path_to_json_file=None):
+    try:
         if path_to_json_file is not None:
-            return ans
+            return flammable_envelope_response(run_flammable_envelope(path_to_json_file=path_to_json_file), as_dict=True)
 
-        return jsonify(ans), 200
+        flam_env_data = await job_runner.run(FLAMMABLE_ENVELOPE_JOB, request.get_json())
+        return flammable_envelope_response(flam_env_data)
 
+    except Job_Queue_Full as e:
+        logger.debug(f'flammable envelope not queued.  {e}')
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
-        logging.debug(f'exception caused from vce endpoint.  error info: {e}')
+        logger.debug(f'exception caused from vce endpoint.  error info: {e}')
         return jsonify({'error': 'Internal Server Error'}), 500
 
+def get_stored_envelope(data):
+    # envelope_id is returned by the flammable envelope endpoint and can be sent in place of the point list.
+    return envelope_store.get(data.get('envelope_id'))
+
+def get_flash_data(data, stored_envelope):
+    flash_data = data.get('flash_data')
+    if flash_data is None and stored_envelope is not None:
+        flash_data = stored_envelope['flash_data']
+    return flash_data
+
 def flammable_mass():
-    data = request.get_json()
+    # the envelope can be posted as an arrow stream with the other fields in its metadata
+    posted_envelope_df, data = get_request_points_and_data()
     x_min = data['xMin']
     x_max = data['xMax']
     y_min = data['yMin']
     y_max = data['yMax']
     z_min = data['zMin']
     z_max = data['zMax']
-    flammable_envelope_list_of_dicts = data['flammable_envelope_list_of_dicts']
-    flash_data = data['flash_data']
+    stored_envelope = get_stored_envelope(data)
+    flammable_envelope_list_of_dicts = data.get('flammable_envelope_list_of_dicts')
+    flash_data = get_flash_data(data, stored_envelope)
     stoich_mol_o2_to_mol_fuel = data['stoich_mol_o2_to_mol_fuel']
 
-    
-    vce = VCE()
+    flammable_envelope_df = posted_envelope_df
+    if stored_envelope is not None:
+        flammable_envelope_df = stored_envelope['df']
+    elif flammable_envelope_df is None and data.get('envelope_id') is not None and flammable_envelope_list_of_dicts is None and stoich_mol_o2_to_mol_fuel is None:
+        logger.debug(f'flammable envelope {data["envelope_id"]} not found in envelope store')
+        return jsonify({'error': 'Flammable envelope expired.  Please rerun the flammable extent calculation.'}), 404
+
+    vce = Array_VCE()
     try:
-        resp = vce.get_flammable_mass(x_min, x_max, y_min, y_max, z_min, z_max, flammable_envelope_list_of_dicts = flammable_envelope_list_of_dicts, cv = None, stoich_moles_o2_to_fuel = stoich_mol_o2_to_mol_fuel, flash_data = flash_data)
+        resp = vce.get_flammable_mass(x_min, x_max, y_min, y_max, z_min, z_max, flammable_envelope_list_of_dicts = flammable_envelope_list_of_dicts, cv = None, stoich_moles_o2_to_fuel = stoich_mol_o2_to_mol_fuel, flash_data = flash_data, flammable_envelope_df = flammable_envelope_df)
         return jsonify({'flammable_mass_g':resp['flammable_mass_g']}), 200
     except Exception as e:
-        logging.debug(f'exception caused from flammable mass endpoint.  error info: {e}')
+        logger.debug(f'exception caused from flammable mass endpoint.  error info: {e}')
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+def get_volume_bounds(volumes):
+    # 'volumes' - list of {xMin, xMax, yMin, yMax, zMin, zMax} dicts (m), as for the single volume.
+    # returns the bounds as arrays, one entry per volume.
+    volumes = list(volumes)
+    if len(volumes) == 0:
+        raise ValueError('No volumes given.')
+    if len(volumes) > MAX_BATCH_VOLUMES:
+        raise ValueError(f'{len(volumes)} volumes given.  The limit is {MAX_BATCH_VOLUMES}.')
+    bounds = {key: np.array([float(vol[key]) for vol in volumes]) for key in ['xMin', 'xMax', 'yMin', 'yMax', 'zMin', 'zMax']}
+    if not all(np.all(np.isfinite(v)) for v in bounds.values()):
+        raise ValueError('Volume bounds must be finite numbers.')
+    if np.any(bounds['xMax'] <= bounds['xMin']) or np.any(bounds['yMax'] <= bounds['yMin']) or np.any(bounds['zMax'] < bounds['zMin']):
+        raise ValueError('Volumes must have xMax > xMin, yMax > yMin and zMax >= zMin.')
+    return bounds
+
+def get_or_build_flammable_mass_index(envelope_id, flammable_envelope_df):
+    index = flammable_mass_index_store.get(envelope_id)
+    if index is None:
+        index = Flammable_Mass_Index(flammable_envelope_df)
+        flammable_mass_index_store.put(envelope_id, index)
+    return index
+
+def get_flammable_mass_index(envelope_id, flammable_envelope_df):
+    # stored envelopes keep their index (see utils/flammable_mass_index_store.py).  a posted envelope is
+    # indexed for the one request.
+    if envelope_id is None:
+        return Flammable_Mass_Index(flammable_envelope_df)
+    return flammable_mass_index_flight.do(envelope_id, get_or_build_flammable_mass_index, envelope_id, flammable_envelope_df)
+
+def flammable_masses():
+    # flammable mass in many congested volumes against one envelope.  the envelope is indexed once
+    # (see calcs/flammable_mass_index.py) and each volume integrates only the points in its x range.
+    # masses are in the order of the volumes.
+    posted_envelope_df, data = get_request_points_and_data()
+    try:
+        bounds = get_volume_bounds(data['volumes'])
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid flammable masses request.  {e}'}), 400
+    stored_envelope = get_stored_envelope(data)
+    flammable_envelope_list_of_dicts = data.get('flammable_envelope_list_of_dicts')
+    flash_data = get_flash_data(data, stored_envelope)
+    stoich_mol_o2_to_mol_fuel = data.get('stoich_mol_o2_to_mol_fuel')
+
+    try:
+        if stoich_mol_o2_to_mol_fuel is not None:
+            # the stoich method does not use the envelope
+            vce = Array_VCE()
+            masses_g = [vce.get_flammable_mass(*vol, stoich_moles_o2_to_fuel=stoich_mol_o2_to_mol_fuel, flash_data=flash_data)['flammable_mass_g'] for vol in zip(*bounds.values())]
+            return jsonify({'flammable_masses_g': masses_g}), 200
+
+        envelope_id = None
+        flammable_envelope_df = posted_envelope_df
+        if stored_envelope is not None:
+            envelope_id = data['envelope_id']
+            flammable_envelope_df = stored_envelope['df']
+        elif flammable_envelope_df is None and flammable_envelope_list_of_dicts is not None:
+            flammable_envelope_df = pd.DataFrame(flammable_envelope_list_of_dicts)
+        elif flammable_envelope_df is None:
+            logger.debug(f'flammable envelope {data.get("envelope_id")} not found in envelope store')
+            return jsonify({'error': 'Flammable envelope expired.  Please rerun the flammable extent calculation.'}), 404
+
+        with timed('index'):
+            index = get_flammable_mass_index(envelope_id, flammable_envelope_df)
+        with timed('integration'):
+            masses_g = index.get_masses_g(bounds['xMin'], bounds['xMax'], bounds['yMin'], bounds['yMax'], bounds['zMin'], bounds['zMax'])
+        return jsonify({'flammable_masses_g': masses_g.tolist()}), 200
+    except Exception as e:
+        logger.debug(f'exception caused from flammable masses endpoint.  error info: {e}')
         return jsonify({'error': 'Internal Server Error'}), 500
 
 def vce_overpressure_results():
     data = request.get_json()
-    flash_data = data['flash_data']
+    flash_data = get_flash_data(data, get_stored_envelope(data))
     buildings = data['buildings']
     congested_volumes = data['volumes']
     # logging.debug(f"*** data: {data}\n\n\n*** flash data: {flash_data}\n\n\n***buidings: {buildings}\n\n\n***congested volumes: {congested_volumes}")
-    vce = VCE(logging=logging)
+    vce = Array_VCE(logging=logging)
     
     try:
         updated_buildings = vce.get_blast_overpressures_at_buildings_from_congested_volumes_store_highest_pressure_at_each_building_return_updated_buildings(buildings=buildings, congested_volumes=congested_volumes, flash_data=flash_data)
         return jsonify({'updatedBuildings':updated_buildings}), 200
     except Exception as e:
-        logging.debug(f'Exception caused from building overpressure calculation.  error info: {e}')
+        logger.debug(f'Exception caused from building overpressure calculation.  error info: {e}')
         return jsonify({'error': 'Internal Server Error'}), 500
 
 def vce_overpressure_distances_results():
     data = request.get_json()
     
-    flash_data = data['flash_data']
+    flash_data = get_flash_data(data, get_stored_envelope(data))
     flammable_mass_g = data['flammableMassG']
     is_indoors = data['isIndoors']
     congestion_level = data['congestionLevel']
     overpressures_psi = data['overpressuresPsi']
-    vce = VCE(logging=logging)
-    dists_m = []
-    press_psi = None
+    vce = Array_VCE(logging=logging)
     try:
-        for press_psi in overpressures_psi:
-            dist_m = vce.get_distance_m_to_target_overpressure(target_pressure_psi=press_psi, flammable_mass_g=flammable_mass_g, flash_data=flash_data, congestion_level=congestion_level, is_indoors=is_indoors)
-            dists_m.append(dist_m)
-        return jsonify({'distances_m' : dists_m}), 200
+        dists_m = vce.get_distances_m_to_target_overpressures(target_pressures_psi=overpressures_psi, flammable_mass_g=flammable_mass_g, flash_data=flash_data, congestion_level=congestion_level, is_indoors=is_indoors)
+        return jsonify({'distances_m' : dists_m.tolist()}), 200
     except Exception as e:
-        logging.debug(f'Exception caused while finding distances to target over pressure.  pressure target on error: {press_psi} | distances so far: {dists_m} | error info: {e}')
+        logger.debug(f'Exception caused while finding distances to target over pressure.  pressure targets: {overpressures_psi} | error info: {e}')
         return jsonify({'error': 'Internal Server Error'}), 500
 
-def pv_burst_results(path_to_json_file=None):
-
+def run_pv_burst(data = None, path_to_json_file = None):
     m_io = Model_Interface()
-    data=None
-    if path_to_json_file is None:
-        data = request.get_json()
-        m_io.set_inputs_from_json(json_data=json.dumps(data))
-    else:
-        m_io.set_inputs_from_json(path_to_json_file=path_to_json_file)
-    logging.debug(f'in flammable env method.  data to be modeled in py_lopa:  {data}')
+    with timed('input_parse'):
+        if path_to_json_file is None:
+            m_io.set_inputs_from_json(json_data=json.dumps(data))
+        else:
+            m_io.set_inputs_from_json(path_to_json_file=path_to_json_file)
+    log_payload(logger, 'in flammable env method.  data to be modeled in py_lopa:', data)
     m_io.inputs['vapor_cloud_explosion'] = False
+    m_io.inputs['log_handler'] = log_py_lopa_message
     m_io.inputs['pv_burst'] = True
     m_io.inputs['catastrophic_vessel_failure'] = True
     m_io.inputs['inhalation'] = False
 
-    try:
-        res = m_io.run()
-        if res != ResultCode.SUCCESS:
-            logging.debug(f'Pv Burst model model did not complete successfully.  Result Code:  {res.name}')
-            return jsonify({'error': 'Internal Server Error'}), 500
-        bldgs = []
+    return pv_burst_flight.do(get_inputs_key(m_io.inputs, namespace=PV_BURST_JOB), get_pv_burst_bldgs, m_io)
+
+def get_pv_burst_bldgs(m_io):
+    res = pws_limiter.call(m_io.run)
+    if res != ResultCode.SUCCESS:
+        raise Model_Run_Error(f'Pv Burst model model did not complete successfully.  Result Code:  {res.name}')
+    bldgs = []
+
+    for bldg in m_io.mc.mi.bldgs:
+        bldgs.append({
+            'name': bldg.num,
+            'occupancy': bldg.occupancy,
+            'dist_m': bldg.dist_m,
+            'pv_burst_overpressure_psi': bldg.pv_burst_overpressure_psi,
+        })
 
-        for bldg in m_io.mc.mi.bldgs:
-            bldgs.append({
-                'name': bldg.num,
-                'occupancy': bldg.occupancy,
-                'dist_m': bldg.dist_m,
-                'pv_burst_overpressure_psi': bldg.pv_burst_overpressure_psi,
-            })
+    logger.debug('pv burst data successful.  bldg results:  %s', bldgs)
 
-        logging.debug(f'pv burst data successful.  bldg results:  {bldgs}')
+    return {'bldgs': bldgs}
 
-        ans = {'bldgs': bldgs}
+def pv_burst_response(ans):
+    return jsonify(ans), 200
 
+async def pv_burst_results(path_to_json_file=None):
+    try:
         if path_to_json_file is not None:
-            return ans
+            return run_pv_burst(path_to_json_file=path_to_json_file)
 
-        return jsonify(ans), 200
+        ans = await job_runner.run(PV_BURST_JOB, request.get_json())
+        return pv_burst_response(ans)
 
+    except Job_Queue_Full as e:
+        logger.debug(f'pv burst not queued.  {e}')
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
-        logging.debug(f"error with calcuating pv burst consequence: {e}")
+        logger.debug(f"error with calcuating pv burst consequence: {e}")
         return jsonify({'error': 'Internal Server Error'}), 500
 
+job_runner.register(FLAMMABLE_ENVELOPE_JOB, run_flammable_envelope)
+job_runner.register(PV_BURST_JOB, run_pv_burst)
+
 def main():
     path = get_json_file_path()
     bldg_data_w_pv_burst_impact = asyncio.run(pv_burst_results(path_to_json_file = path))
@@ -0,0 +1,51 @@
+from flask import request, jsonify
+
+from controllers.rad_analysis_controller import RADIATION_ANALYSIS_JOB, RADIATION_BATCH_JOB, RADIATION_FIELD_JOB, RADIATION_SWEEP_JOB, radiation_response, radiation_batch_response, radiation_field_response, radiation_sweep_response
+from controllers.blast_analysis_controller import FLAMMABLE_ENVELOPE_JOB, PV_BURST_JOB, flammable_envelope_response, pv_burst_response
+from utils.job_runner import job_runner, Job_Queue_Full, JOB_DONE, JOB_FAILED
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# submit / status / result endpoints for the long model runs.  a job is submitted with the same body
+# as its synchronous route, and its result is returned in the same form that route would return.
+
+RESPONSE_BUILDERS = {
+    RADIATION_ANALYSIS_JOB: radiation_response,
+    RADIATION_BATCH_JOB: radiation_batch_response,
+    RADIATION_FIELD_JOB: radiation_field_response,
+    RADIATION_SWEEP_JOB: radiation_sweep_response,
+    FLAMMABLE_ENVELOPE_JOB: flammable_envelope_response,
+    PV_BURST_JOB: pv_burst_response,
+}
+
+def submit_job(kind):
+    if kind not in RESPONSE_BUILDERS or not job_runner.is_registered(kind):
+        return jsonify({'error': f'Unknown job type: {kind}'}), 404
+    try:
+        job_id = job_runner.submit(kind, request.get_json())
+    except Job_Queue_Full as e:
+        logger.debug(f'{kind} job not queued.  {e}')
+        return jsonify({'error': str(e)}), 503
+    return jsonify(job_runner.get_status(job_id)), 202
+
+def job_status(job_id):
+    status = job_runner.get_status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found.  It may have expired.'}), 404
+    return jsonify(status), 200
+
+def job_result(job_id):
+    job = job_runner.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found.  It may have expired.'}), 404
+    if job['status'] == JOB_FAILED:
+        return jsonify({'error': 'Internal Server Error'}), 500
+    if job['status'] != JOB_DONE:
+        return jsonify(job_runner.get_status(job_id)), 202
+    try:
+        return RESPONSE_BUILDERS[job['kind']](job['result'])
+    except Exception as e:
+        logger.debug(f'exception building result for job {job_id}.  error info: {e}')
+        return jsonify({'error': 'Internal Server Error'}), 500
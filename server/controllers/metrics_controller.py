@@ -0,0 +1,49 @@
+from flask import Response
+
+from utils.metrics import metrics
+from utils.result_cache import flammable_envelope_cache
+from utils.cache_handling import vlc_cache
+from utils.jet_fire_cache import jet_fire_cache
+from utils.radiation_field_store import radiation_field_store
+from utils.flammable_mass_index_store import flammable_mass_index_store
+from utils.single_flight import get_single_flight_stats
+from utils.pws_limiter import pws_limiter
+from utils.pws_tape import pws_tape, MODE_OFF
+from utils.job_runner import job_runner
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+CACHES = {
+    'flammable_envelope': flammable_envelope_cache,
+    'vlc': vlc_cache,
+    'jet_fire': jet_fire_cache,
+    'radiation_field': radiation_field_store,
+    'flammable_mass_index': flammable_mass_index_store,
+}
+
+def get_gauges():
+    # current values read from the caches, limiters and job runner at scrape time
+    gauges = {}
+    for name, cache in CACHES.items():
+        stats = cache.stats()
+        for key in ['hits', 'misses', 'hit_rate', 'entries', 'bytes', 'evictions']:
+            gauges.setdefault(f'cmct_cache_{key}', []).append(({'cache': name}, stats[key]))
+
+    for name, stats in get_single_flight_stats().items():
+        for key in ['calls', 'runs', 'runs_saved', 'in_flight']:
+            gauges.setdefault(f'cmct_single_flight_{key}', []).append(({'flight': name}, stats[key]))
+
+    for key, val in pws_limiter.stats().items():
+        gauges[f'cmct_pws_limiter_{key}'] = [({}, val)]
+
+    gauges['cmct_jobs'] = [({'status': status}, count) for status, count in job_runner.stats().items()]
+
+    tape_stats = pws_tape.stats()
+    if tape_stats['mode'] != MODE_OFF:
+        for key in ['recorded', 'replayed', 'misses']:
+            gauges[f'cmct_pws_tape_{key}'] = [({'mode': tape_stats['mode']}, tape_stats[key])]
+
+    return gauges
+
+def metrics_results():
+    return Response(metrics.render(get_gauges()), status=200, content_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,9 +1,11 @@
 import os
 import sys
+import copy
 import math
 import json
 import pickle
 import asyncio
+import numpy as np
 import pandas as pd
 from functools import reduce
 
@@ -20,16 +22,42 @@ from py_lopa.calcs.consts import Wx_Enum
 from py_lopa.model_interface import Model_Interface
 
 from utils.cache_handling import get_cache, store_cache
+from utils.point_cloud_format import client_accepts_arrow, arrow_response
+from utils.job_runner import job_runner, Job_Queue_Full, Model_Run_Error
+from utils.result_cache import get_inputs_key
+from utils.single_flight import get_single_flight
+from utils.pws_limiter import pws_limiter
+from utils.request_timing import timed
+from utils.log_config import log_py_lopa_message
+from utils.jet_fire_cache import jet_fire_cache, get_jet_fire_key, Jet_Fire_Result
+from utils.radiation_field_store import radiation_field_store
+
+from calcs.radiation_field import Radiation_Field_Builder, RADIATION_FIELD_REL_TOL
 
 import logging
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+RADIATION_ANALYSIS_JOB = 'radiation_analysis'
+RADIATION_BATCH_JOB = 'radiation_analysis_batch'
+RADIATION_FIELD_JOB = 'radiation_field'
+RADIATION_SWEEP_JOB = 'radiation_analysis_sweep'
+
+vlc_flight = get_single_flight('run_py_lopa_get_vlc')
+jet_fire_flight = get_single_flight('run_jet_fire_calc')
+radiation_field_flight = get_single_flight('radiation_field')
 
 def run_py_lopa_get_vlc(py_lopa_inputs):
+    # identical discharge runs already in progress are joined rather than started again
+    return vlc_flight.do(get_inputs_key(py_lopa_inputs, namespace='vlc'), get_vlc, py_lopa_inputs)
+
+def get_vlc(py_lopa_inputs):
     m_io = Model_Interface()
-    m_io.set_inputs_from_json(json_data=json.dumps(py_lopa_inputs))
+    with timed('input_parse'):
+        m_io.set_inputs_from_json(json_data=json.dumps(py_lopa_inputs))
+    m_io.inputs['log_handler'] = log_py_lopa_message
     m_io.inputs['get_phast_discharge_only'] = True
-    res = m_io.run()
+    res = pws_limiter.call(m_io.run)
     if res != ResultCode.SUCCESS:
         return None
     p_disch_dict = m_io.phast_discharge
@@ -56,7 +84,8 @@ def run_jet_fire_calc(vlc, stack_height_m, ws_mph = 3.3554):
     discharge_record_count = 0
     if discharge_records is not None:
         discharge_record_count = len(discharge_records)
-    discharge_result = vlc.discharge_result
+    # copied, as the vlc may be shared with other requests
+    discharge_result = copy.copy(vlc.discharge_result)
     discharge_result.height = stack_height_m
     weather = prep_weather() # defaults to nighttime stable wx condition
     
@@ -75,13 +104,33 @@ def run_jet_fire_calc(vlc, stack_height_m, ws_mph = 3.3554):
         flammable_parameters=flammable_parameters
     )
 
-    res:ResultCode = jetFireCalc.run()
+    res:ResultCode = pws_limiter.call(jetFireCalc.run)
 
     if res != ResultCode.SUCCESS:
-        logging.debug(f'Jet fire calc failed.  response code: {res.name}\nresponses:  {jetFireCalc.messages}')
+        logger.debug(f'Jet fire calc failed.  response code: {res.name}\nresponses:  {jetFireCalc.messages}')
 
     return jetFireCalc
 
+def run_and_cache_jet_fire(key, vlc, stack_height_m, ws_mph):
+    # checked inside the single flight, so a caller arriving just after a run finished finds its result
+    cached = jet_fire_cache.get(key)
+    if cached is not None:
+        return cached
+    jetFireCalc = run_jet_fire_calc(vlc, stack_height_m=stack_height_m, ws_mph=ws_mph)
+    if jetFireCalc.result_code != ResultCode.SUCCESS:
+        # failures are not cached.  the radiation transect reports them.
+        return jetFireCalc
+    result = Jet_Fire_Result.from_calc(jetFireCalc)
+    jet_fire_cache.put(key, result)
+    return result
+
+async def get_shared_jet_fire(vlc, stack_height_m, ws_mph):
+    # flames are cached by vlc, stack height and wind speed (see utils.jet_fire_cache).  identical
+    # jet fire runs already in progress are joined rather than started again.  the PWS slot is taken by
+    # the run itself (run_jet_fire_calc), so a request joining a run in progress does not hold one.
+    key = await asyncio.to_thread(get_jet_fire_key, vlc, stack_height_m, ws_mph)
+    return await asyncio.to_thread(jet_fire_flight.do, key, run_and_cache_jet_fire, key, vlc, stack_height_m, ws_mph)
+
 def prep_flammable_output_config(flare_position, start_position, final_position):
     #flam output config inputs:  
         # position: Optional[LocalPosition]=LocalPosition(), 
@@ -122,10 +171,10 @@ async def run_radiation_transect(jetFireCalc, flam_output_config):
         flammable_parameters=flammable_parameters, 
         flammable_output_config=flam_output_config)
 
-    res = await asyncio.to_thread(radiation_transect.run)
+    res = await pws_limiter.call_async(radiation_transect.run)
 
     if res != ResultCode.SUCCESS:
-        logging.debug(f'Radiation transect calc failed.  response code: {res.name}\nresponses:  {radiation_transect.messages}')
+        logger.debug(f'Radiation transect calc failed.  response code: {res.name}\nresponses:  {radiation_transect.messages}')
     return radiation_transect
 
 def reducer(acc = [], item= None):
@@ -137,60 +186,494 @@ def reducer(acc = [], item= None):
     })
     return acc
 
+def radiation_records_to_columns(rad_recs):
+    return {
+        'x': [rec.position.x for rec in rad_recs],
+        'y': [rec.position.y for rec in rad_recs],
+        'z': [rec.position.z for rec in rad_recs],
+        'rad_level_w_m2': [rec.radiation_result for rec in rad_recs],
+    }
+
 apple = 1
 
-async def radiation_analysis():
+M_PER_FT = 1 / 3.28084
 
-    data = request.get_json()
+# batch requests are capped so one request can't queue an unbounded number of PWS calls
+MAX_BATCH_TRANSECTS = 100
+
+def get_position_m(coords, prefix, defaults):
+    # coords are in ft, keyed like xFlare / yFlare / zFlare
+    return LocalPosition(
+        x = float(coords.get(f'x{prefix}', defaults[0])) * M_PER_FT,
+        y = float(coords.get(f'y{prefix}', defaults[1])) * M_PER_FT,
+        z = float(coords.get(f'z{prefix}', defaults[2])) * M_PER_FT,
+    )
+
+def get_flare_position(coords_and_met):
+    return get_position_m(coords_and_met, 'Flare', (45, 0, 50))
+
+def get_transect_positions(coords):
+    start_pos = get_position_m(coords, 'TransectStart', (0, 0, 0))
+    final_pos = get_position_m(coords, 'TransectFinal', (0, 0, 200))
+    return start_pos, final_pos
+
+async def get_shared_vlc(py_lopa_inputs):
+    # discharge results are cached by the py_lopa inputs.  stored before the jet fire run sets the stack height.
+    # the blocking steps run off the event loop.  the py_lopa run takes its PWS slot inside the single
+    # flight (get_vlc), so a request joining a run in progress does not hold one.
+    vlc = await asyncio.to_thread(get_cache, py_lopa_inputs)
+    if vlc is None:
+        vlc = await asyncio.to_thread(run_py_lopa_get_vlc, py_lopa_inputs)
+        if vlc is not None:
+            await asyncio.to_thread(store_cache, vlc=vlc, py_lopa_inputs=py_lopa_inputs)
+    return vlc
+
+async def run_radiation_analysis(data):
     py_lopa_inputs = data['py_lopa_inputs']
-    cache_ready = False
-    if 'cache' in data:
-        cache = data['cache']
-        ready_1 = False
-        ready_2 = False
-        if 'json_file_name' in cache:
-            json_file_name = cache['json_file_name']
-            ready_1 = json_file_name is not None
-        if 'case_num' in cache:
-            case_num = cache['case_num']
-            ready_2 = case_num is not None
-        cache_ready = ready_1 and ready_2
-        
+
     coords_and_met = data['coordsAndMet']
     ws_mph = coords_and_met['windSpeedMph']
-    x_flare_m = float(coords_and_met.get('xFlare', 45)) / 3.28084
-    y_flare_m = float(coords_and_met.get('yFlare', 0)) / 3.28084
-    z_flare_m = float(coords_and_met.get('zFlare', 50)) / 3.28084
-    flare_position = LocalPosition(x = x_flare_m, y = y_flare_m, z = z_flare_m)
-
-    transect_start_x_m = float(coords_and_met.get('xTransectStart', 0)) / 3.28084
-    transect_start_y_m = float(coords_and_met.get('yTransectStart', 0)) / 3.28084
-    transect_start_z_m = float(coords_and_met.get('zTransectStart', 0)) / 3.28084
-    transect_start_pos = LocalPosition(x=transect_start_x_m, y=transect_start_y_m, z=transect_start_z_m)
-
-    transect_final_x_m = float(coords_and_met.get('xTransectFinal', 0)) / 3.28084
-    transect_final_y_m = float(coords_and_met.get('yTransectFinal', 0)) / 3.28084
-    transect_final_z_m = float(coords_and_met.get('zTransectFinal', 200)) / 3.28084
-    transect_final_pos = LocalPosition(x=transect_final_x_m, y=transect_final_y_m, z=transect_final_z_m)
-    
-    try:
-        vlc = None
-        if cache_ready:
-            vlc = get_cache(json_file_name=json_file_name, case_num=case_num)
-        if vlc is None:
-            vlc = run_py_lopa_get_vlc(py_lopa_inputs)
-        jetFireCalc = run_jet_fire_calc(vlc, stack_height_m=z_flare_m, ws_mph = ws_mph)
-        if cache_ready:
-            store_cache(vlc=vlc, json_file_name=json_file_name, case_num=case_num)
-        # pipe racks have heights between 7 m (23 ft) and 13 m (43 ft)
-        flammable_output_config = prep_flammable_output_config(flare_position=flare_position, start_position=transect_start_pos, final_position=transect_final_pos)
+    flare_position = get_flare_position(coords_and_met)
+    transect_start_pos, transect_final_pos = get_transect_positions(coords_and_met)
+
+    vlc = await get_shared_vlc(py_lopa_inputs)
+    jetFireCalc = await get_shared_jet_fire(vlc, stack_height_m=flare_position.z, ws_mph=ws_mph)
+    # pipe racks have heights between 7 m (23 ft) and 13 m (43 ft)
+    flammable_output_config = prep_flammable_output_config(flare_position=flare_position, start_position=transect_start_pos, final_position=transect_final_pos)
+
+    radiation_transect = await run_radiation_transect(jetFireCalc=jetFireCalc, flam_output_config=flammable_output_config)
+    return radiation_transect.radiation_records
 
+def get_grid_transects(grid):
+    # a plan view grid is evaluated as rows of transects along x, one per (y, z).  ft, like the single transect.
+    # z can be a single height or zMin / zMax with nz levels (e.g. several pipe rack heights).
+    x_min = float(grid['xMin'])
+    x_max = float(grid['xMax'])
+    ys = _get_levels(float(grid['yMin']), float(grid['yMax']), int(grid.get('ny', 11)))
+    if 'z' in grid:
+        zs = [float(grid['z'])]
+    else:
+        zs = _get_levels(float(grid['zMin']), float(grid['zMax']), int(grid.get('nz', 1)))
+    transects = []
+    for z in zs:
+        for y in ys:
+            transects.append({
+                'xTransectStart': x_min, 'yTransectStart': y, 'zTransectStart': z,
+                'xTransectFinal': x_max, 'yTransectFinal': y, 'zTransectFinal': z,
+            })
+    return transects
+
+def _get_levels(lo, hi, n):
+    if n <= 1:
+        return [lo]
+    return [lo + (hi - lo) * i / (n - 1) for i in range(n)]
+
+def get_batch_transects(data):
+    # 'transects' - list of {x,y,z}TransectStart / {x,y,z}TransectFinal dicts (ft), as in coordsAndMet
+    # 'grid'      - regular plan view grid, see get_grid_transects
+    if data.get('transects') is not None:
+        transects = list(data['transects'])
+    elif data.get('grid') is not None:
+        transects = get_grid_transects(data['grid'])
+    else:
+        raise ValueError('Radiation batch needs either transects or a grid.')
+    if len(transects) == 0:
+        raise ValueError('Radiation batch has no transects.')
+    if len(transects) > MAX_BATCH_TRANSECTS:
+        raise ValueError(f'Radiation batch has {len(transects)} transects.  The limit is {MAX_BATCH_TRANSECTS}.')
+    return transects
+
+async def run_radiation_batch(data):
+    # one vlc and one jet fire for the flare, then every transect against that flame.  the transect
+    # calls run concurrently, each taking a pws_limiter slot.
+    transects = get_batch_transects(data)
+    py_lopa_inputs = data['py_lopa_inputs']
+
+    coords_and_met = data['coordsAndMet']
+    ws_mph = coords_and_met['windSpeedMph']
+    flare_position = get_flare_position(coords_and_met)
+
+    vlc = await get_shared_vlc(py_lopa_inputs)
+    jetFireCalc = await get_shared_jet_fire(vlc, stack_height_m=flare_position.z, ws_mph=ws_mph)
+
+    configs = []
+    for transect in transects:
+        start_pos, final_pos = get_transect_positions(transect)
+        configs.append(prep_flammable_output_config(flare_position=flare_position, start_position=start_pos, final_position=final_pos))
+
+    radiation_transects = await asyncio.gather(*[run_radiation_transect(jetFireCalc=jetFireCalc, flam_output_config=config) for config in configs])
+
+    return [
+        {
+            'transect': i,
+            'start_m': _position_to_dict(config.transect.transect_start_point),
+            'final_m': _position_to_dict(config.transect.transect_end_point),
+            'records': radiation_transect.radiation_records or [],
+            'succeeded': radiation_transect.radiation_records is not None,
+        }
+        for i, (config, radiation_transect) in enumerate(zip(configs, radiation_transects))
+    ]
+
+def _position_to_dict(position):
+    return {'x': position.x, 'y': position.y, 'z': position.z}
+
+# wind speed sweep:  one transect evaluated at several wind speeds, for the worst case across them.
+# the vlc is shared, and each speed's jet fire goes through the jet fire cache.
+
+MAX_SWEEP_WIND_SPEEDS = 25
+
+def get_sweep_wind_speeds(coords_and_met):
+    # 'windSpeedsMph' - list of wind speeds, or
+    # 'windSpeedMinMph' / 'windSpeedMaxMph' / 'windSpeedStepMph' - an inclusive range
+    if coords_and_met.get('windSpeedsMph') is not None:
+        speeds = [float(ws) for ws in coords_and_met['windSpeedsMph']]
+    elif coords_and_met.get('windSpeedMinMph') is not None:
+        ws_min = float(coords_and_met['windSpeedMinMph'])
+        ws_max = float(coords_and_met['windSpeedMaxMph'])
+        ws_step = float(coords_and_met.get('windSpeedStepMph', 1))
+        if ws_step <= 0 or ws_max < ws_min:
+            raise ValueError('Wind speed range needs windSpeedMaxMph >= windSpeedMinMph and a positive windSpeedStepMph.')
+        speeds = [float(ws) for ws in np.arange(ws_min, ws_max + ws_step / 2, ws_step)]
+    else:
+        raise ValueError('Wind speed sweep needs windSpeedsMph or windSpeedMinMph / windSpeedMaxMph.')
+    speeds = sorted(set(speeds))
+    if len(speeds) == 0 or min(speeds) <= 0:
+        raise ValueError('Wind speed sweep needs positive wind speeds.')
+    if len(speeds) > MAX_SWEEP_WIND_SPEEDS:
+        raise ValueError(f'Wind speed sweep has {len(speeds)} wind speeds.  The limit is {MAX_SWEEP_WIND_SPEEDS}.')
+    return speeds
+
+async def run_radiation_sweep(data):
+    py_lopa_inputs = data['py_lopa_inputs']
+    coords_and_met = data['coordsAndMet']
+    speeds = get_sweep_wind_speeds(coords_and_met)
+    flare_position = get_flare_position(coords_and_met)
+    transect_start_pos, transect_final_pos = get_transect_positions(coords_and_met)
+
+    vlc = await get_shared_vlc(py_lopa_inputs)
+
+    async def run_wind_speed(ws_mph):
+        jetFireCalc = await get_shared_jet_fire(vlc, stack_height_m=flare_position.z, ws_mph=ws_mph)
+        flammable_output_config = prep_flammable_output_config(flare_position=flare_position, start_position=transect_start_pos, final_position=transect_final_pos)
         radiation_transect = await run_radiation_transect(jetFireCalc=jetFireCalc, flam_output_config=flammable_output_config)
+        return radiation_transect.radiation_records
+
+    # each speed runs its jet fire (or cache lookup) and then its transect, concurrently with the others
+    rad_recs_by_speed = await asyncio.gather(*[run_wind_speed(ws_mph) for ws_mph in speeds])
+
+    return {
+        'start_m': _position_to_dict(transect_start_pos),
+        'final_m': _position_to_dict(transect_final_pos),
+        'speeds': [
+            {'ws_mph': ws_mph, 'records': rad_recs or [], 'succeeded': rad_recs is not None}
+            for ws_mph, rad_recs in zip(speeds, rad_recs_by_speed)
+        ],
+    }
+
+def get_max_radiation_envelope(sweep):
+    # maximum radiation over the wind speeds at each position along the transect, and the speed that gives it.
+    # positions are matched by distance from the transect start.  speeds whose records fall at other
+    # distances are interpolated onto the union of all distances.
+    start = np.array([sweep['start_m'][k] for k in ['x', 'y', 'z']])
+    final = np.array([sweep['final_m'][k] for k in ['x', 'y', 'z']])
+    direction = final - start
+    length = np.linalg.norm(direction)
+    unit = direction / length if length > 0 else direction
+
+    curves = []
+    for speed in sweep['speeds']:
+        if len(speed['records']) == 0:
+            continue
+        positions = np.array([[rec.position.x, rec.position.y, rec.position.z] for rec in speed['records']])
+        dists = (positions - start) @ unit
+        order = np.argsort(dists)
+        rad = np.array([rec.radiation_result for rec in speed['records']], dtype=float)
+        curves.append((speed['ws_mph'], dists[order], rad[order]))
+
+    if len(curves) == 0:
+        return {'distance_m': [], 'x': [], 'y': [], 'z': [], 'max_rad_level_w_m2': [], 'ws_mph_at_max': []}
+
+    dists = np.unique(np.round(np.concatenate([d for _, d, _ in curves]), 6))
+    rad_by_speed = np.array([np.interp(dists, d, rad) for _, d, rad in curves])
+    i_max = np.argmax(rad_by_speed, axis=0)
+    points = start + dists[:, None] * unit
+    return {
+        'distance_m': dists.tolist(),
+        'x': points[:, 0].tolist(),
+        'y': points[:, 1].tolist(),
+        'z': points[:, 2].tolist(),
+        'max_rad_level_w_m2': rad_by_speed[i_max, np.arange(len(dists))].tolist(),
+        'ws_mph_at_max': [curves[i][0] for i in i_max],
+    }
+
+def radiation_sweep_response(sweep):
+    # per speed transects as one set of columns (ws_mph identifies the speed), plus the envelope
+    with timed('serialize'):
+        columns = {'ws_mph': [], 'x': [], 'y': [], 'z': [], 'rad_level_w_m2': []}
+        for speed in sweep['speeds']:
+            rec_columns = radiation_records_to_columns(speed['records'])
+            columns['ws_mph'].extend([speed['ws_mph']] * len(speed['records']))
+            for key, vals in rec_columns.items():
+                columns[key].extend(vals)
+        wind_speeds = [{'ws_mph': speed['ws_mph'], 'points': len(speed['records']), 'succeeded': speed['succeeded']} for speed in sweep['speeds']]
+        envelope = get_max_radiation_envelope(sweep)
+
+        if client_accepts_arrow():
+            return arrow_response(columns, metadata={'wind_speeds': wind_speeds, 'envelope': envelope})
+
+        return jsonify({'rad_columns': columns, 'wind_speeds': wind_speeds, 'envelope': envelope}), 200
+
+# radiation field mode (see calcs.radiation_field):  the field around one flame is sampled once, then
+# transect and point queries are interpolated locally instead of each running a PWS radiation transect.
+
+# field box (ft, relative to the release) used for any bound the request leaves out
+RADIATION_FIELD_DEFAULT_BOUNDS_FT = {'xMin': -100, 'xMax': 300, 'yMin': -200, 'yMax': 200, 'zMin': 0, 'zMax': 200}
+RADIATION_FIELD_QUERY_POINTS = 101
+MAX_RADIATION_FIELD_QUERY_POINTS = 100000
+
+def get_field_bounds_ft(field):
+    bounds = {k: float(field.get(k, v)) for k, v in RADIATION_FIELD_DEFAULT_BOUNDS_FT.items()}
+    for axis in ['x', 'y', 'z']:
+        if bounds[f'{axis}Max'] <= bounds[f'{axis}Min']:
+            raise ValueError(f'Radiation field {axis}Max must be greater than {axis}Min.')
+    return bounds
+
+def get_field_tolerance(field):
+    rel_tol = float(field.get('tolerance', RADIATION_FIELD_REL_TOL))
+    if rel_tol <= 0:
+        raise ValueError('Radiation field tolerance must be greater than 0.')
+    return rel_tol
+
+def get_radiation_field_id(data):
+    # the same inputs always give the same id, so a stored field is found again
+    coords_and_met = data['coordsAndMet']
+    field = data.get('field') or {}
+    inputs = {
+        'py_lopa_inputs': data['py_lopa_inputs'],
+        'windSpeedMph': float(coords_and_met['windSpeedMph']),
+        'flare_m': _position_to_dict(get_flare_position(coords_and_met)),
+        'bounds_ft': get_field_bounds_ft(field),
+        'rel_tol': get_field_tolerance(field),
+    }
+    return get_inputs_key(inputs, namespace='radiation_field')
+
+async def sample_radiation_lines(jetFireCalc, flare_position, x_min, x_max, pairs):
+    # one transect along x per (y, z) line, run concurrently
+    configs = [prep_flammable_output_config(flare_position=flare_position, start_position=LocalPosition(x=x_min, y=y, z=z), final_position=LocalPosition(x=x_max, y=y, z=z)) for y, z in pairs]
+    radiation_transects = await asyncio.gather(*[run_radiation_transect(jetFireCalc=jetFireCalc, flam_output_config=config) for config in configs])
+    lines = []
+    for radiation_transect in radiation_transects:
         rad_recs = radiation_transect.radiation_records
+        if rad_recs is None:
+            raise Model_Run_Error('Radiation transect for the radiation field did not complete successfully.')
+        lines.append(([rec.position.x for rec in rad_recs], [rec.radiation_result for rec in rad_recs]))
+    return lines
+
+async def build_radiation_field(data):
+    coords_and_met = data['coordsAndMet']
+    field = data.get('field') or {}
+    flare_position = get_flare_position(coords_and_met)
+    bounds_m = {k: v * M_PER_FT for k, v in get_field_bounds_ft(field).items()}
+
+    vlc = await get_shared_vlc(data['py_lopa_inputs'])
+    jetFireCalc = await get_shared_jet_fire(vlc, stack_height_m=flare_position.z, ws_mph=coords_and_met['windSpeedMph'])
+
+    async def sample_lines(pairs):
+        return await sample_radiation_lines(jetFireCalc, flare_position, bounds_m['xMin'], bounds_m['xMax'], pairs)
+
+    builder = Radiation_Field_Builder(
+        sample_lines,
+        x_min=bounds_m['xMin'], x_max=bounds_m['xMax'],
+        y_min=bounds_m['yMin'], y_max=bounds_m['yMax'],
+        z_min=bounds_m['zMin'], z_max=bounds_m['zMax'],
+        rel_tol=get_field_tolerance(field),
+    )
+    return await builder.build()
+
+def run_radiation_sweep_job(data):
+    return asyncio.run(run_radiation_sweep(data))
+
+def build_and_store_radiation_field(field_id, data):
+    field = asyncio.run(build_radiation_field(data))
+    radiation_field_store.put(field_id, field)
+    return field
+
+def run_radiation_field_job(data):
+    # returns (field id, field).  identical builds already in progress are joined.
+    field_id = get_radiation_field_id(data)
+    field = radiation_field_store.get(field_id)
+    if field is None:
+        field = radiation_field_flight.do(field_id, build_and_store_radiation_field, field_id, data)
+    return field_id, field
+
+def radiation_field_response(result):
+    field_id, field = result
+    return jsonify({'field_id': field_id, **field.stats()}), 200
+
+def query_radiation_field(field, data):
+    # 'transects' - list of {x,y,z}TransectStart / {x,y,z}TransectFinal dicts (ft), each with an optional
+    #               'points' count along it
+    # 'points'    - list of {x, y, z} dicts (ft), returned as transect 0
+    groups = []
+    if data.get('transects') is not None:
+        for transect in data['transects']:
+            start_pos, final_pos = get_transect_positions(transect)
+            n_points = int(transect.get('points', RADIATION_FIELD_QUERY_POINTS))
+            if n_points < 2:
+                raise ValueError('Transect queries need at least 2 points.')
+            groups.append((start_pos, final_pos, n_points))
+    elif data.get('points') is None:
+        raise ValueError('Radiation field query needs either transects or points.')
+
+    n_total = sum(n for _, _, n in groups) + len(data.get('points') or [])
+    if n_total > MAX_RADIATION_FIELD_QUERY_POINTS:
+        raise ValueError(f'Radiation field query has {n_total} points.  The limit is {MAX_RADIATION_FIELD_QUERY_POINTS}.')
+
+    results = []
+    for i, (start_pos, final_pos, n_points) in enumerate(groups):
+        points, rad = field.query_line([start_pos.x, start_pos.y, start_pos.z], [final_pos.x, final_pos.y, final_pos.z], n_points)
+        results.append((i, points, rad))
+    if len(groups) == 0:
+        points = np.array([[float(p['x']), float(p['y']), float(p['z'])] for p in data['points']]).reshape(-1, 3) * M_PER_FT
+        results.append((0, points, field.query(points)))
+    return results
+
+def radiation_field_query_response(field, results):
+    with timed('serialize'):
+        columns = {
+            'transect': np.concatenate([np.full(len(rad), i) for i, _, rad in results]),
+            'x': np.concatenate([points[:, 0] for _, points, _ in results]),
+            'y': np.concatenate([points[:, 1] for _, points, _ in results]),
+            'z': np.concatenate([points[:, 2] for _, points, _ in results]),
+            'rad_level_w_m2': np.concatenate([rad for _, _, rad in results]),
+        }
+        outside = int(np.isnan(columns['rad_level_w_m2']).sum())
+        info = {'error_bound': field.error_bound, 'converged': field.converged, 'points_outside_field': outside}
+
+        if client_accepts_arrow():
+            return arrow_response(columns, metadata=info)
+
+        # points outside the sampled box are null
+        json_columns = {k: [None if np.isnan(v) else float(v) for v in vals] for k, vals in columns.items()}
+        return jsonify({'rad_columns': json_columns, **info}), 200
+
+def run_radiation_analysis_job(data):
+    # job workers have no event loop of their own
+    return asyncio.run(run_radiation_analysis(data))
+
+def run_radiation_batch_job(data):
+    return asyncio.run(run_radiation_batch(data))
+
+def radiation_response(rad_recs):
+    with timed('serialize'):
+        if client_accepts_arrow():
+            return arrow_response(radiation_records_to_columns(rad_recs))
+
         rad_list_of_dicts = reduce(reducer, rad_recs, [])
-        
+
         return jsonify({'rad_data':rad_list_of_dicts}), 200
 
+def radiation_batch_response(batch):
+    # all transects in one set of columns.  transect is the index into the transects list.
+    with timed('serialize'):
+        columns = {'transect': [], 'x': [], 'y': [], 'z': [], 'rad_level_w_m2': []}
+        transects = []
+        for res in batch:
+            rec_columns = radiation_records_to_columns(res['records'])
+            columns['transect'].extend([res['transect']] * len(res['records']))
+            for key, vals in rec_columns.items():
+                columns[key].extend(vals)
+            transects.append({k: v for k, v in res.items() if k != 'records'} | {'points': len(res['records'])})
+
+        if client_accepts_arrow():
+            return arrow_response(columns, metadata={'transects': transects})
+
+        return jsonify({'rad_columns': columns, 'transects': transects}), 200
+
+async def radiation_analysis():
+    try:
+        rad_recs = await job_runner.run(RADIATION_ANALYSIS_JOB, request.get_json())
+        return radiation_response(rad_recs)
+
+    except Job_Queue_Full as e:
+        logger.debug(f'radiation analysis not queued.  {e}')
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
-        logging.debug(f'exception caused from radiation_analysis endpoint.  error info: {e}')
+        logger.debug(f'exception caused from radiation_analysis endpoint.  error info: {e}')
         return jsonify({'error': 'Internal Server Error'}), 500
+
+job_runner.register(RADIATION_ANALYSIS_JOB, run_radiation_analysis_job)
+
+async def radiation_batch():
+    try:
+        data = request.get_json()
+        # checked here so a bad request gets a 400 rather than failing on a worker
+        get_batch_transects(data)
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': f'Invalid radiation batch request.  {e}'}), 400
+    try:
+        batch = await job_runner.run(RADIATION_BATCH_JOB, data)
+        return radiation_batch_response(batch)
+
+    except Job_Queue_Full as e:
+        logger.debug(f'radiation batch not queued.  {e}')
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.debug(f'exception caused from radiation_analysis_batch endpoint.  error info: {e}')
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+job_runner.register(RADIATION_BATCH_JOB, run_radiation_batch_job)
+
+async def radiation_field():
+    try:
+        data = request.get_json()
+        get_radiation_field_id(data)
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': f'Invalid radiation field request.  {e}'}), 400
+    try:
+        result = await job_runner.run(RADIATION_FIELD_JOB, data)
+        return radiation_field_response(result)
+
+    except Job_Queue_Full as e:
+        logger.debug(f'radiation field not queued.  {e}')
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.debug(f'exception caused from radiation_field endpoint.  error info: {e}')
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+def radiation_field_query():
+    data = request.get_json()
+    field = radiation_field_store.get(data.get('field_id'))
+    if field is None:
+        return jsonify({'error': 'Radiation field not found.  It may have expired.'}), 404
+    try:
+        with timed('interpolation'):
+            results = query_radiation_field(field, data)
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': f'Invalid radiation field query.  {e}'}), 400
+    try:
+        return radiation_field_query_response(field, results)
+    except Exception as e:
+        logger.debug(f'exception caused from radiation_field_query endpoint.  error info: {e}')
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+job_runner.register(RADIATION_FIELD_JOB, run_radiation_field_job)
+
+async def radiation_sweep():
+    try:
+        data = request.get_json()
+        get_sweep_wind_speeds(data['coordsAndMet'])
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': f'Invalid wind speed sweep request.  {e}'}), 400
+    try:
+        sweep = await job_runner.run(RADIATION_SWEEP_JOB, data)
+        return radiation_sweep_response(sweep)
+
+    except Job_Queue_Full as e:
+        logger.debug(f'wind speed sweep not queued.  {e}')
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.debug(f'exception caused from radiation_analysis_sweep endpoint.  error info: {e}')
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+job_runner.register(RADIATION_SWEEP_JOB, run_radiation_sweep_job)
@@ -1,5 +1,35 @@
+import sys
+
 from waitress import serve
 from app import app
+from utils.table_registry import table_registry
+from utils.pws_tape import use_pws_tape, MODE_RECORD, MODE_REPLAY
+
+HOST = '0.0.0.0'
+PORT = 8090
+
+# python run.py         - waitress (wsgi)
+# python run.py --asgi  - uvicorn, with the model endpoints served on the event loop (see asgi.py)
+# either can be started with:
+#   --pws-record           - PWS calls go out as usual and each request / response pair is also saved
+#   --pws-replay           - PWS calls are answered from the saved pairs without the network (see utils/pws_tape.py)
+#   --pws-latency=<sec>    - fixed delay added to each replayed call
+
+def get_arg_value(name, default):
+    for arg in sys.argv:
+        if arg.startswith(f'{name}='):
+            return arg.split('=', 1)[1]
+    return default
 
 if __name__ == '__main__':
-    serve(app, host='0.0.0.0', port=8090)
\ No newline at end of file
+    if '--pws-record' in sys.argv:
+        use_pws_tape(MODE_RECORD)
+    elif '--pws-replay' in sys.argv:
+        use_pws_tape(MODE_REPLAY, latency_sec=float(get_arg_value('--pws-latency', 0.0)))
+    if '--asgi' in sys.argv:
+        import uvicorn
+        uvicorn.run('asgi:application', host=HOST, port=PORT, workers=1)
+    else:
+        table_registry.warm_up()
+        # model runs are capped by the job runner's workers.  the extra threads only wait on them, leaving room for the cheap endpoints
+        serve(app, host=HOST, port=PORT, threads=16)
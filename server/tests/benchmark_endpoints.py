@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import logging
+from datetime import datetime as dt
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# repeatable benchmark of the routes in app.py, run in-process with the flask test client.  each
+# tt_json scenario is sent through every model route, followed by the routes that use its results.
+# PWS calls are answered from a recorded tape (see utils/pws_tape.py), so no network is needed.
+# record the tape once with --record (needs a PWS access token), then replay it as often as needed.
+# every stage reports wall time, python peak memory (tracemalloc) and request / response sizes.
+# results are written as json, named by py_lopa / pypws version.  --compare prints the change
+# against an earlier results file.
+#
+#   python tests/benchmark_endpoints.py --record
+#   python tests/benchmark_endpoints.py --repeat 3 --compare data/benchmarks/<earlier run>.json
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+TT_JSON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'tt_json')
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'benchmarks')
+
+ARROW_ACCEPT = {'Accept': 'application/vnd.apache.arrow.stream'}
+
+# buildings placed north of the release point for the overpressure stages
+BLDG_OFFSETS_M = [30, 75, 150, 300]
+M_PER_DEG_LAT = 111320
+OVERPRESSURES_PSI = [0.5, 1, 2, 3, 5, 8]
+
+# congested volumes for the flammable masses stage:  the envelope's bounding box cut into nx x ny x nz boxes
+VOLUME_DIVISIONS = (4, 4, 2)
+
+# radiation stages (ft, relative to the release).  the batch grid is 11 transects along x at one height.
+RAD_WIND_SPEED_MPH = 5
+RAD_GRID = {'xMin': 0, 'xMax': 300, 'yMin': -100, 'yMax': 100, 'ny': 11, 'z': 30}
+RAD_SWEEP_WIND_SPEEDS = {'windSpeedMinMph': 2, 'windSpeedMaxMph': 20, 'windSpeedStepMph': 2}
+RAD_FIELD_QUERY_TRANSECTS = [
+    {'xTransectStart': 0, 'yTransectStart': y, 'zTransectStart': 30, 'xTransectFinal': 300, 'yTransectFinal': y, 'zTransectFinal': 30, 'points': 201}
+    for y in [-100, -50, 0, 50, 100]
+]
+
+def get_scenarios(names = None):
+    scenarios = {}
+    for path in sorted(glob.glob(os.path.join(TT_JSON_DIR, '*.json'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if names and name not in names:
+            continue
+        with open(path, 'r') as f:
+            scenarios[name] = json.load(f)
+    return scenarios
+
+def get_release_position(scenario):
+    prim = scenario.get('PrimaryInputs', scenario.get('AssesmentDetails', {}))
+    return {'lat': float(prim.get('ApproxLatitude') or 0), 'lng': float(prim.get('ApproxLongitude') or 0)}
+
+def offset_position(position, north_m):
+    return {'lat': position['lat'] + north_m / M_PER_DEG_LAT, 'lng': position['lng']}
+
+class Stage_Timer:
+
+    def __init__(self, client) -> None:
+        self.client = client
+        self.results = []
+
+    def request(self, stage, method, route, payload = None, headers = None, repeat = 0):
+        request_bytes = len(json.dumps(payload).encode('utf-8')) if payload is not None else 0
+        tracemalloc.reset_peak()
+        mem_start = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        if method == 'GET':
+            response = self.client.get(route, headers=headers)
+        else:
+            response = self.client.post(route, json=payload, headers=headers)
+        body = response.get_data()
+        wall_sec = time.perf_counter() - t0
+        peak_mb = (tracemalloc.get_traced_memory()[1] - mem_start) / 1e6
+        self.results.append({
+            'stage': stage,
+            'route': route,
+            'repeat': repeat,
+            'status': response.status_code,
+            'wall_sec': wall_sec,
+            'peak_mem_mb': peak_mb,
+            'request_bytes': request_bytes,
+            'response_bytes': len(body),
+            'content_type': response.content_type,
+        })
+        return response
+
+    def skip(self, stage, route, reason, repeat = 0):
+        self.results.append({'stage': stage, 'route': route, 'repeat': repeat, 'status': None, 'skipped': reason})
+
+def get_envelope_bounds(records):
+    bounds = {}
+    for col in ['x', 'y', 'z']:
+        vals = [rec[col] for rec in records]
+        bounds[f'{col}Min'] = min(vals)
+        bounds[f'{col}Max'] = max(vals)
+    return bounds
+
+def get_volume_grid(bounds):
+    # boxes tiling the bounding box.  a zero width axis is given 1 m.
+    edges = {}
+    for axis, n in zip(['x', 'y', 'z'], VOLUME_DIVISIONS):
+        lo = bounds[f'{axis}Min']
+        hi = max(bounds[f'{axis}Max'], lo + 1)
+        edges[axis] = [lo + (hi - lo) * i / n for i in range(n + 1)]
+    return [
+        {'xMin': edges['x'][i], 'xMax': edges['x'][i + 1], 'yMin': edges['y'][j], 'yMax': edges['y'][j + 1], 'zMin': edges['z'][k], 'zMax': edges['z'][k + 1]}
+        for i in range(VOLUME_DIVISIONS[0]) for j in range(VOLUME_DIVISIONS[1]) for k in range(VOLUME_DIVISIONS[2])
+    ]
+
+def run_radiation_stages(timer, scenario, repeat):
+    coords_and_met = {'windSpeedMph': RAD_WIND_SPEED_MPH}
+    rad_payload = {'py_lopa_inputs': scenario, 'coordsAndMet': coords_and_met}
+    timer.request('radiation_analysis', 'POST', '/api/radiation_analysis', rad_payload, repeat=repeat)
+    timer.request('radiation_analysis_arrow', 'POST', '/api/radiation_analysis', rad_payload, headers=ARROW_ACCEPT, repeat=repeat)
+    timer.request('radiation_analysis_batch', 'POST', '/api/radiation_analysis_batch', rad_payload | {'grid': RAD_GRID}, headers=ARROW_ACCEPT, repeat=repeat)
+    timer.request('radiation_analysis_sweep', 'POST', '/api/radiation_analysis_sweep', {'py_lopa_inputs': scenario, 'coordsAndMet': coords_and_met | RAD_SWEEP_WIND_SPEEDS}, headers=ARROW_ACCEPT, repeat=repeat)
+
+    # the field is built once per scenario (later repeats find it in the field store) and then queried locally
+    resp = timer.request('radiation_field', 'POST', '/api/radiation_field', rad_payload, repeat=repeat)
+    if resp.status_code != 200:
+        timer.skip('radiation_field_query', '/api/radiation_field_query', 'no radiation field', repeat=repeat)
+        return
+    timer.request('radiation_field_query', 'POST', '/api/radiation_field_query', {'field_id': resp.get_json()['field_id'], 'transects': RAD_FIELD_QUERY_TRANSECTS}, headers=ARROW_ACCEPT, repeat=repeat)
+
+def run_scenario(timer, name, scenario, repeat):
+    release_position = get_release_position(scenario)
+
+    resp = timer.request('flammable_envelope', 'POST', '/api/vce_get_flammable_envelope', scenario, repeat=repeat)
+    timer.request('flammable_envelope_arrow', 'POST', '/api/vce_get_flammable_envelope', scenario, headers=ARROW_ACCEPT, repeat=repeat)
+    flam_env_data = resp.get_json().get('flam_env_data') if resp.status_code == 200 else None
+
+    if flam_env_data is None:
+        for stage, route in [('flammable_mass', '/api/vce_get_flammable_mass'), ('flammable_masses', '/api/vce_get_flammable_masses'), ('overpressure_results', '/api/vce_get_overpressure_results'), ('distances_to_overpressures', '/api/vce_get_distances_to_overpressures')]:
+            timer.skip(stage, route, 'no flammable envelope', repeat=repeat)
+    else:
+        envelope_bounds = get_envelope_bounds(flam_env_data['flammable_envelope_list_of_dicts'])
+        mass_payload = {'envelope_id': flam_env_data['envelope_id'], 'stoich_mol_o2_to_mol_fuel': None}
+        mass_payload.update(envelope_bounds)
+        resp = timer.request('flammable_mass', 'POST', '/api/vce_get_flammable_mass', mass_payload, repeat=repeat)
+        flammable_mass_g = resp.get_json().get('flammable_mass_g', 0) if resp.status_code == 200 else 0
+        timer.request('flammable_masses', 'POST', '/api/vce_get_flammable_masses', {'envelope_id': flam_env_data['envelope_id'], 'volumes': get_volume_grid(envelope_bounds)}, repeat=repeat)
+
+        volumes = [{'position': release_position, 'flammableMassG': flammable_mass_g, 'isIndoors': False, 'congestionLevel': level} for level in [0, 1, 2]]
+        buildings = [{'name': f'bldg_{dist_m}m', 'location': offset_position(release_position, dist_m)} for dist_m in BLDG_OFFSETS_M]
+        timer.request('overpressure_results', 'POST', '/api/vce_get_overpressure_results', {'envelope_id': flam_env_data['envelope_id'], 'buildings': buildings, 'volumes': volumes}, repeat=repeat)
+        timer.request('distances_to_overpressures', 'POST', '/api/vce_get_distances_to_overpressures', {'envelope_id': flam_env_data['envelope_id'], 'flammableMassG': flammable_mass_g, 'isIndoors': False, 'congestionLevel': 2, 'overpressuresPsi': OVERPRESSURES_PSI}, repeat=repeat)
+
+    run_radiation_stages(timer, scenario, repeat)
+    timer.request('pv_burst', 'POST', '/api/get_pv_burst_results', scenario, repeat=repeat)
+
+    # job api round trip.  the run itself is served from the caches filled above.
+    resp = timer.request('job_submit', 'POST', '/api/jobs/vce_get_flammable_envelope', scenario, repeat=repeat)
+    if resp.status_code == 202:
+        job_id = resp.get_json()['job_id']
+        t0 = time.perf_counter()
+        while True:
+            resp = timer.client.get(f'/api/jobs/{job_id}/result')
+            if resp.status_code != 202:
+                break
+            time.sleep(0.05)
+        timer.results.append({'stage': 'job_result_wait', 'route': '/api/jobs/<job_id>/result', 'repeat': repeat, 'status': resp.status_code, 'wall_sec': time.perf_counter() - t0, 'response_bytes': len(resp.get_data())})
+
+    timer.request('stats', 'GET', '/api/stats', repeat=repeat)
+    timer.request('metrics', 'GET', '/api/metrics', repeat=repeat)
+
+def summarize(results):
+    # median wall time and max peak memory per scenario / stage
+    summary = {}
+    for name, stage_results in results.items():
+        by_stage = {}
+        summary[name] = {}
+        for res in stage_results:
+            if 'wall_sec' not in res:
+                summary[name][res['stage']] = {'skipped': res['skipped']}
+                continue
+            by_stage.setdefault(res['stage'], []).append(res)
+        for stage, recs in by_stage.items():
+            walls = sorted(rec['wall_sec'] for rec in recs)
+            summary[name][stage] = {
+                'runs': len(recs),
+                'first_wall_sec': recs[0]['wall_sec'],
+                'median_wall_sec': walls[len(walls) // 2],
+                'max_peak_mem_mb': max(rec.get('peak_mem_mb', 0) for rec in recs),
+                'response_bytes': recs[-1].get('response_bytes'),
+                'statuses': sorted(set(rec['status'] for rec in recs)),
+            }
+    return summary
+
+def print_summary(summary, previous = None):
+    for name, stages in summary.items():
+        print(f'\n{name}')
+        for stage, s in stages.items():
+            if 'skipped' in s:
+                print(f'  {stage:<28} skipped:  {s["skipped"]}')
+                continue
+            line = f'  {stage:<28} {s["median_wall_sec"]*1000:>10.1f} ms  {s["max_peak_mem_mb"]:>8.1f} MB  {s["response_bytes"] or 0:>10} B  {s["statuses"]}'
+            prev = (previous or {}).get(name, {}).get(stage)
+            if prev is not None and prev.get('median_wall_sec', 0) > 0:
+                line += f'  ({(s["median_wall_sec"] / prev["median_wall_sec"] - 1) * 100:+.0f}% vs previous)'
+            print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark the cmct server routes in-process')
+    parser.add_argument('--scenarios', nargs='*', help='tt_json file names (without .json).  default: all')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per scenario.  the first run starts with empty result caches')
+    parser.add_argument('--record', action='store_true', help='call PWS and record the responses instead of replaying them')
+    parser.add_argument('--tape', default=None, help='PWS tape directory.  default: data/pws_tape')
+    parser.add_argument('--latency', type=float, default=0.0, help='fixed delay (sec) added to each replayed PWS call')
+    parser.add_argument('--latency-scale', type=float, default=0.0, help='multiple of the recorded PWS round trip added to each replayed call')
+    parser.add_argument('--out', default=None, help='results file.  default: data/benchmarks/benchmark_<versions>_<time>.json')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    from utils.pws_tape import use_pws_tape, PWS_TAPE_DIR, MODE_RECORD, MODE_REPLAY
+    tape = use_pws_tape(MODE_RECORD if args.record else MODE_REPLAY, tape_dir=args.tape or PWS_TAPE_DIR, latency_sec=args.latency, latency_scale=args.latency_scale)
+
+    from app import app
+    from utils.result_cache import flammable_envelope_cache, get_model_versions
+    from utils.cache_handling import vlc_cache
+    from utils.table_registry import table_registry
+
+    # result caches start empty so the first run of each scenario measures the model, not the cache
+    cache_dir = tempfile.mkdtemp(prefix='cmct_benchmark_')
+    flammable_envelope_cache.cache_dir = os.path.join(cache_dir, 'flammable_envelope')
+    vlc_cache.cache_dir = os.path.join(cache_dir, 'vlc')
+
+    table_registry.warm_up()
+    tracemalloc.start()
+
+    versions = get_model_versions()
+    scenarios = get_scenarios(args.scenarios)
+    results = {}
+    t0 = time.perf_counter()
+    with app.test_client() as client:
+        for name, scenario in scenarios.items():
+            timer = Stage_Timer(client)
+            for repeat in range(args.repeat):
+                run_scenario(timer, name, scenario, repeat)
+            results[name] = timer.results
+    total_sec = time.perf_counter() - t0
+    tracemalloc.stop()
+
+    summary = summarize(results)
+    output = {
+        'started': dt.now().isoformat(timespec='seconds'),
+        'versions': versions,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'pws_tape': tape.stats(),
+        'total_sec': total_sec,
+        'summary': summary,
+        'results': results,
+    }
+
+    out_path = args.out
+    if out_path is None:
+        os.makedirs(BENCHMARK_DIR, exist_ok=True)
+        out_path = os.path.join(BENCHMARK_DIR, f'benchmark_py_lopa-{versions["py_lopa"]}_pypws-{versions["pypws"]}_{dt.now().strftime("%Y%m%d_%H%M%S")}.json')
+    with open(out_path, 'w') as f:
+        json.dump(output, f, indent=2)
+
+    previous = None
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            previous = json.load(f)['summary']
+    print_summary(summary, previous)
+    print(f'\npws tape:  {tape.stats()}')
+    print(f'results written to {out_path}')
+
+if __name__ == '__main__':
+    main()
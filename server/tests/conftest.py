@@ -0,0 +1,44 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# manual scripts.  they need a running server, the network or local pickles.
+collect_ignore = ['api_test.py', 'api_async_testing.py', 'benchmark_endpoints.py', 'vce_test.py']
+
+# tests marked benchmark time the py_lopa originals and take a while.  CMCT_BENCHMARK=1 runs them.
+RUN_BENCHMARKS = os.environ.get('CMCT_BENCHMARK', '') == '1'
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: slow timing comparison against py_lopa, run with CMCT_BENCHMARK=1')
+
+def pytest_collection_modifyitems(config, items):
+    if RUN_BENCHMARKS:
+        return
+    skip = pytest.mark.skip(reason='benchmark.  set CMCT_BENCHMARK=1 to run it.')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
+
+def get_contour_envelope(points_per_contour = 60, n_z = 6, mw = 30):
+    # flammable envelope shaped like the PWS footprints it is built from:  closed contours at a few
+    # concentrations on every z level, shrinking with height and with concentration
+    rows = []
+    for z in range(n_z):
+        for conc in [0.05, 0.08, 0.1, 0.15, 0.2]:
+            length_m = 120 * (1 - z / (n_z + 3)) * (0.05 / conc)**0.7
+            width_m = 15 * (1 - z / (n_z + 3)) * (0.05 / conc)**0.5
+            t = np.linspace(0, 2 * np.pi, points_per_contour, endpoint=False)
+            for x, y in zip(length_m / 2 * (1 + np.cos(t)), width_m * np.sin(t)):
+                rows.append((x, y, float(z), conc * 1e6))
+    df = pd.DataFrame(rows, columns=['x', 'y', 'z', 'conc_ppm'])
+    df['conc_g_m3'] = df['conc_ppm'] * mw / 24450
+    return df
+
+@pytest.fixture
+def contour_envelope():
+    return get_contour_envelope()
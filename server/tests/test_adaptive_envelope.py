@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pypws.calculations import DistancesAndFootprintsToConcentrationLevelsCalculation
+from pypws.enums import ResultCode
+
+from calcs import chunked_footprints
+from classes.array_vce import Array_VCE
+from tests.test_chunked_footprints import get_stand_in_run, get_vce
+
+# the 20 levels py_lopa's VCE asks for (two of them repeated), lfl = 0.05
+LFL = 0.05
+TARG_CONCS = sorted(np.linspace(LFL, 0.99, 10).tolist() + np.linspace(LFL, np.linspace(LFL, 0.99, 10)[1], 10).tolist())
+FLASH_DATA = {'ys': [1.0], 'k_times_zi': [0], 'mws': [16.04], 'chem_mix': ['74-82-8']}
+
+@pytest.fixture
+def pws(monkeypatch):
+    # configs sent to the stand-in footprint model, per request
+    requests = []
+
+    def use_cloud(cloud_top_m):
+        stand_in_run = get_stand_in_run(cloud_top_m)
+        monkeypatch.setattr(DistancesAndFootprintsToConcentrationLevelsCalculation, 'run', lambda calc: requests.append(len(calc.dispersion_output_configs)) or stand_in_run(calc))
+        return requests
+
+    return use_cloud
+
+def get_envelope(inputs = None):
+    vce = get_vce(inputs if inputs is not None else {})
+    vce.targ_concs = TARG_CONCS
+    vce.flash_data = FLASH_DATA
+    assert vce.run_dispersion_model_inside_flammable_envelope() == ResultCode.SUCCESS
+    vce.parse_flam_env_contour_points()
+    return vce
+
+def get_full_batch():
+    # every level at every elevation from 0 to 50 m
+    vce = get_envelope({Array_VCE.ADAPTIVE_ENVELOPE_INPUT: False})
+    assert [cfg.elevation for cfg in vce.phast_dispersion.distancesAndFootprintsCalc.dispersion_output_configs] == [elev for elev in chunked_footprints.VCE_ELEVATIONS_M for _ in TARG_CONCS]
+    return vce
+
+def get_adaptive(rel_tol):
+    return get_envelope({Array_VCE.ADAPTIVE_ENVELOPE_INPUT: True, Array_VCE.ADAPTIVE_ENVELOPE_REL_TOL_INPUT: rel_tol})
+
+@pytest.mark.parametrize('rel_tol', [0.02, 0.05, 0.1])
+def test_mass_within_rel_tol_of_full_batch(pws, rel_tol):
+    pws(cloud_top_m=40)
+    full_mass_g = get_full_batch().get_flammable_mass()['flammable_mass_g']
+
+    adaptive = get_adaptive(rel_tol)
+
+    assert adaptive.get_flammable_mass()['flammable_mass_g'] == adaptive.envelope_refinement['flammable_mass_g']
+    assert abs(adaptive.envelope_refinement['flammable_mass_g'] - full_mass_g) <= rel_tol * full_mass_g
+
+def test_stops_before_a_1_m_step_once_converged(pws):
+    pws(cloud_top_m=40)
+
+    assert get_adaptive(0.05).envelope_refinement['elevation_step_m'] > 1
+
+@pytest.mark.parametrize('cloud_top_m', [40, 6, 2])
+def test_1_m_step_matches_full_batch(pws, cloud_top_m):
+    pws(cloud_top_m=cloud_top_m)
+    full = get_full_batch()
+
+    adaptive = get_adaptive(0)
+
+    assert adaptive.envelope_refinement['elevation_step_m'] == 1
+    pd.testing.assert_frame_equal(adaptive.flammable_envelope_df, full.flammable_envelope_df)
+    assert adaptive.max_dw_extent == full.max_dw_extent
+
+def test_shallow_cloud_requests_fewer_configs(pws):
+    counts = {}
+    for cloud_top_m in [40, 6]:
+        requests = pws(cloud_top_m=cloud_top_m)
+        requests.clear()
+        get_full_batch()
+        full_configs = sum(requests)
+        requests.clear()
+        adaptive = get_adaptive(0)
+        assert sum(requests) == adaptive.envelope_refinement['configs_requested']
+        counts[cloud_top_m] = sum(requests)
+        assert counts[cloud_top_m] < full_configs
+
+    assert adaptive.envelope_refinement['cloud_top_m'] == 5
+    # a 6 m cloud needs its 6 elevations and a few probes above it, not all 51
+    assert counts[6] < counts[40] / 4
+    assert counts[6] < full_configs / 8
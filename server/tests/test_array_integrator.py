@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+import pytest
+
+from py_lopa.calcs.integrator import Integrator
+
+from calcs.array_integrator import Array_Integrator
+
+from tests.conftest import get_contour_envelope
+
+# the acceptance target for the array integrator on a 100k point envelope
+MIN_SPEEDUP = 50
+
+BOXES = [
+    {},
+    {'x_min': 0, 'x_max': 60, 'y_min': -10, 'y_max': 10, 'z_min': 0, 'z_max': 2},
+    {'x_min': 20, 'x_max': 130, 'y_min': -20, 'y_max': 0, 'z_min': 1, 'z_max': 5},
+    {'x_min': 5.5, 'x_max': 6.5, 'y_min': -1, 'y_max': 1, 'z_min': 3, 'z_max': 3},
+    {'x_min': 500, 'x_max': 600, 'y_min': 0, 'y_max': 10, 'z_min': 0, 'z_max': 5},
+]
+
+def integrate(integrator_class, df, box, **kwargs):
+    integrator = integrator_class(**kwargs)
+    integrator.load_data(df)
+    results = integrator.integrate(**box)
+    return results, integrator.z_level_masses_g
+
+@pytest.mark.parametrize('box', BOXES)
+@pytest.mark.parametrize('min_points_per_voxel', [1, 2])
+def test_matches_py_lopa_integrator(contour_envelope, box, min_points_per_voxel):
+    expected, expected_z_levels = integrate(Integrator, contour_envelope, box, min_points_per_voxel=min_points_per_voxel)
+    actual, actual_z_levels = integrate(Array_Integrator, contour_envelope, box, min_points_per_voxel=min_points_per_voxel)
+
+    assert actual['total_mass_g'] == expected['total_mass_g']
+    assert actual['total_volume_m3'] == expected['total_volume_m3']
+    assert actual['effective_voxel_count'] == expected['effective_voxel_count']
+    assert [z['z_level_m'] for z in actual_z_levels] == [z['z_level_m'] for z in expected_z_levels]
+    assert [z['thickness_m'] for z in actual_z_levels] == [z['thickness_m'] for z in expected_z_levels]
+    np.testing.assert_allclose([z['mass_g'] for z in actual_z_levels], [z['mass_g'] for z in expected_z_levels], rtol=1e-12)
+
+def test_matches_py_lopa_integrator_on_coarse_grid(contour_envelope):
+    # several points per voxel
+    expected, _ = integrate(Integrator, contour_envelope, {}, x_bins=10, y_bins=5)
+    actual, _ = integrate(Array_Integrator, contour_envelope, {}, x_bins=10, y_bins=5)
+
+    assert actual['total_mass_g'] == expected['total_mass_g']
+    assert actual['effective_voxel_count'] == expected['effective_voxel_count']
+
+def get_integrate_sec(integrator_class, df, runs):
+    # best of runs, load_data included (it is part of every flammable mass request)
+    best_sec = np.inf
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        integrate(integrator_class, df, {})
+        best_sec = min(best_sec, time.perf_counter() - t0)
+    return best_sec
+
+@pytest.mark.benchmark
+def test_speedup_on_100k_point_envelope():
+    df = get_contour_envelope(points_per_contour=2000, n_z=10)
+    assert len(df) == 100000
+
+    expected_sec = get_integrate_sec(Integrator, df, runs=1)
+    actual_sec = get_integrate_sec(Array_Integrator, df, runs=5)
+    speedup = expected_sec / actual_sec
+    print(f'\n100k point envelope:  py_lopa Integrator {expected_sec:.3f} s  Array_Integrator {actual_sec:.4f} s  ({speedup:.0f}x)')
+
+    assert speedup >= MIN_SPEEDUP
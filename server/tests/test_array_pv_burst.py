@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from py_lopa.calcs.pv_burst_blast_calculation import Pv_Burst_Blast_Calc
+
+from calcs.array_pv_burst_blast_calculation import Array_Pv_Burst_Blast_Calc, get_pv_burst_curve_index
+
+CURVE_INDEX = get_pv_burst_curve_index()
+MIN_P_RATIO = float(CURVE_INDEX.p_ratios.min())
+MAX_P_RATIO = float(CURVE_INDEX.p_ratios.max())
+
+# every tabulated family, ratios between them, and just inside the table's ends
+P_RATIOS = sorted(set(CURVE_INDEX.p_ratios.tolist() + [7.5, 14.1, 33.3, 75, 150, 333.3, 750, MIN_P_RATIO + 1e-6, MAX_P_RATIO - 1e-6]))
+
+def get_scaled_radii(p_ratio):
+    # a log sweep, r' = 0, past the end of the curves (extrapolated from the last two points), and the
+    # tabulated radii of the families either side of p_ratio with their neighbours
+    radii = [0.0] + list(np.geomspace(1e-3, 50, 60))
+    for family in [CURVE_INDEX.p_ratios[CURVE_INDEX.p_ratios <= p_ratio].max(), CURVE_INDEX.p_ratios[CURVE_INDEX.p_ratios >= p_ratio].min()]:
+        for r in CURVE_INDEX.families[float(family)][0]:
+            radii += [r, np.nextafter(r, np.inf)] + ([np.nextafter(r, 0)] if r > 0 else [])
+    return [float(r) for r in radii]
+
+def get_phast_discharge(press_pa, dists_m):
+    vlc = SimpleNamespace(discharge_result=SimpleNamespace(expansion_energy=2.5e5, release_mass=800.0))
+    mi = SimpleNamespace(PRESS_PA=press_pa, bldgs=[SimpleNamespace(dist_m=d) for d in dists_m])
+    return SimpleNamespace(mi=mi, vesselLeakCalculation=vlc, flashresult=None)
+
+def get_py_lopa_calc(p_ratio):
+    calc = Pv_Burst_Blast_Calc.__new__(Pv_Burst_Blast_Calc)
+    calc.pv_burst_curves_df = CURVE_INDEX.pv_burst_curves_df
+    calc.p_ratio = p_ratio
+    return calc
+
+@pytest.mark.parametrize('p_ratio', P_RATIOS)
+def test_overpressure_matches_py_lopa(p_ratio):
+    radii = get_scaled_radii(p_ratio)
+    expected = [get_py_lopa_calc(p_ratio).get_overpressure_psi_at_bldg(scaled_r=r) for r in radii]
+
+    actual = CURVE_INDEX.get_overpressure_psi(p_ratio=p_ratio, scaled_r=radii)
+
+    np.testing.assert_allclose(actual, expected, rtol=1e-12)
+
+@pytest.mark.parametrize('press_pa', [101325 * 2, 101325 * 5, 101325 * 42, 101325 * 1000, 101325 * 5000])
+def test_run_matches_py_lopa(press_pa, monkeypatch):
+    # pressure ratios outside the table are clamped to its ends by get_p_ratio
+    dists_m = [0.0, 1.0, 5.0, 20.0, 75.0, 300.0, 2000.0]
+    monkeypatch.setattr('py_lopa.calcs.helpers.get_dataframe_from_csv', lambda *args, **kwargs: CURVE_INDEX.pv_burst_curves_df.copy())
+    expected = get_phast_discharge(press_pa, dists_m)
+    Pv_Burst_Blast_Calc(expected).run()
+
+    actual = get_phast_discharge(press_pa, dists_m)
+    calc = Array_Pv_Burst_Blast_Calc(actual)
+    calc.run()
+
+    assert calc.p_ratio == Pv_Burst_Blast_Calc(expected).p_ratio
+    np.testing.assert_allclose([b.pv_burst_overpressure_psi for b in actual.mi.bldgs], [b.pv_burst_overpressure_psi for b in expected.mi.bldgs], rtol=1e-12)
@@ -0,0 +1,137 @@
+import os
+import json
+import threading
+
+import pyarrow as pa
+import pytest
+
+from pypws.entities import DischargeRecord, DischargeResult, Material, MaterialComponent, State
+from pypws.enums import DynamicType
+
+import utils.cache_handling as cache_handling
+import utils.result_cache as result_cache
+from utils.convert_between_objects_and_dicts import EmptyObj, vlc_to_cache_dict
+from utils.result_cache import FILE_EXTENSION, METADATA_KEY, Result_Cache
+
+PY_LOPA_INPUTS = {'chemical_mix': ['74-82-8', '74-84-0'], 'composition': [0.9, 0.1], 'pressure_psig': 150, 'temp_deg_c': 25, 'hole_size_in': 1.0, 'log_handler': print}
+
+def get_vlc(release_mass = 812.5):
+    # the parts of a VesselLeakCalculation the cache keeps
+    storage = State(pressure=1.1342e6, temperature=298.15, liquid_fraction=0.0)
+    final = State(pressure=101325.0, temperature=251.3, liquid_fraction=0.0)
+    vlc = EmptyObj()
+    vlc.exit_material = Material(name='methane+ethane', components=[MaterialComponent(name='METHANE', mole_fraction=0.9), MaterialComponent(name='ETHANE', mole_fraction=0.1)], component_count=2)
+    vlc.discharge_records = [
+        DischargeRecord(time=t, mass_flow=4.25 - t / 100, final_state=final, final_velocity=412.7, orifice_state=storage, orifice_velocity=398.1, storage_state=storage, droplet_diameter=0.0, expanded_diameter=0.0524)
+        for t in [0.0, 10.0, 60.0]
+    ]
+    vlc.discharge_result = DischargeResult(expansion_energy=2.51e5, release_mass=release_mass, height=1.0, angle=0.0, hole_diameter=0.0254, release_type=DynamicType.CONTINUOUS)
+    return vlc
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = Result_Cache(cache_dir=str(tmp_path / 'vlc'), namespace=cache_handling.vlc_cache.namespace)
+    monkeypatch.setattr(cache_handling, 'vlc_cache', cache)
+    return cache
+
+def read_metadata(cache, key):
+    with pa.memory_map(cache._path(key), 'r') as source:
+        return json.loads(pa.ipc.open_file(source).read_all().schema.metadata[METADATA_KEY])
+
+def test_round_trip(cache):
+    vlc = get_vlc()
+    cache_handling.store_cache(vlc, PY_LOPA_INPUTS)
+
+    # the entry is json in the arrow schema metadata, tagged with the schema version
+    metadata = read_metadata(cache, cache.make_key(PY_LOPA_INPUTS))
+    assert metadata['schema_version'] == cache_handling.VLC_CACHE_SCHEMA_VERSION
+    assert metadata['vlc'] == json.loads(json.dumps(vlc_to_cache_dict(vlc)))
+
+    loaded = cache_handling.get_cache(dict(PY_LOPA_INPUTS))
+    assert vlc_to_cache_dict(loaded) == vlc_to_cache_dict(vlc)
+    assert loaded.discharge_result.release_mass == vlc.discharge_result.release_mass
+    assert loaded.discharge_result.release_type == DynamicType.CONTINUOUS
+    assert [c.name for c in loaded.exit_material.components] == ['METHANE', 'ETHANE']
+    assert [r.mass_flow for r in loaded.discharge_records] == [r.mass_flow for r in vlc.discharge_records]
+    assert loaded.discharge_records[0].storage_state.pressure == vlc.discharge_records[0].storage_state.pressure
+
+    # a new process finds the entry on disk
+    reopened = Result_Cache(cache_dir=cache.cache_dir, namespace=cache.namespace)
+    assert reopened.get(cache.make_key(PY_LOPA_INPUTS)) is not None
+
+def test_schema_version_change_discards_entry(cache, monkeypatch):
+    cache_handling.store_cache(get_vlc(), PY_LOPA_INPUTS)
+    key = cache.make_key(PY_LOPA_INPUTS)
+
+    monkeypatch.setattr(cache_handling, 'VLC_CACHE_SCHEMA_VERSION', cache_handling.VLC_CACHE_SCHEMA_VERSION + 1)
+
+    assert cache_handling.get_cache(PY_LOPA_INPUTS) is None
+    assert not os.path.exists(cache._path(key))
+    assert cache.stats()['entries'] == 0
+
+def test_changed_inputs_change_the_key(cache, monkeypatch):
+    key = cache.make_key(PY_LOPA_INPUTS)
+    for name, value in [('pressure_psig', 151), ('composition', [0.8, 0.2]), ('chemical_mix', ['74-82-8', '74-98-6'])]:
+        assert cache.make_key(PY_LOPA_INPUTS | {name: value}) != key
+    # inputs that do not change the result do not change the key
+    assert cache.make_key(PY_LOPA_INPUTS | {'log_handler': None, 'pressure_psig': 150.0}) == key
+
+    cache_handling.store_cache(get_vlc(), PY_LOPA_INPUTS)
+    assert cache_handling.get_cache(PY_LOPA_INPUTS | {'pressure_psig': 151}) is None
+    assert cache_handling.get_cache(PY_LOPA_INPUTS) is not None
+
+    # nor does a py_lopa or pypws upgrade find results from the old version
+    versions = result_cache.get_model_versions() | {'py_lopa': 'next'}
+    monkeypatch.setattr(result_cache, 'get_model_versions', lambda: versions)
+    assert cache_handling.get_cache(PY_LOPA_INPUTS) is None
+
+def test_concurrent_writes(cache):
+    # every thread stores the same key while others read it.  readers see a whole entry or none.
+    n_threads = 16
+    barrier = threading.Barrier(n_threads)
+    loaded = []
+    errors = []
+
+    def store_and_get(i):
+        try:
+            barrier.wait()
+            cache_handling.store_cache(get_vlc(release_mass=800.0 + i), PY_LOPA_INPUTS)
+            loaded.append(cache_handling.get_cache(PY_LOPA_INPUTS))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=store_and_get, args=(i,)) for i in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert all(vlc is not None for vlc in loaded)
+    assert {vlc.discharge_result.release_mass for vlc in loaded} <= {800.0 + i for i in range(n_threads)}
+    # one entry, no temp files left behind
+    assert os.listdir(cache.cache_dir) == [cache.make_key(PY_LOPA_INPUTS) + FILE_EXTENSION]
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['bytes'] == os.path.getsize(cache._path(cache.make_key(PY_LOPA_INPUTS)))
+
+def test_corrupt_file_is_discarded(cache):
+    cache_handling.store_cache(get_vlc(), PY_LOPA_INPUTS)
+    key = cache.make_key(PY_LOPA_INPUTS)
+    with open(cache._path(key), 'r+b') as f:
+        f.truncate(os.path.getsize(cache._path(key)) // 2)
+
+    assert cache_handling.get_cache(PY_LOPA_INPUTS) is None
+    assert not os.path.exists(cache._path(key))
+
+    # the next run stores it again
+    cache_handling.store_cache(get_vlc(), PY_LOPA_INPUTS)
+    assert cache_handling.get_cache(PY_LOPA_INPUTS) is not None
+
+def test_entry_that_does_not_load_is_discarded(cache):
+    key = cache.make_key(PY_LOPA_INPUTS)
+    vlc_dict = vlc_to_cache_dict(get_vlc())
+    vlc_dict['discharge_result']['releaseMass'] = 'not a number'
+    cache.put(key, df=None, metadata={'schema_version': cache_handling.VLC_CACHE_SCHEMA_VERSION, 'vlc': vlc_dict})
+
+    assert cache_handling.get_cache(PY_LOPA_INPUTS) is None
+    assert not os.path.exists(cache._path(key))
@@ -0,0 +1,106 @@
+import functools
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from pypws.calculations import DistancesAndFootprintsToConcentrationLevelsCalculation
+from pypws.entities import LocalPosition
+from pypws.enums import ResultCode
+
+from py_lopa.phast_io.phast_dispersion import Phast_Dispersion
+
+from calcs import chunked_footprints
+from classes.array_vce import Array_VCE
+
+TARG_CONCS = [0.05, 0.08, 0.12, 0.2]
+
+def get_stand_in_run(cloud_top_m = 40):
+    # a footprint per config, its size set by the config's elevation and concentration.  no footprint
+    # at or above cloud_top_m, and a failure for any config at 99 m.
+    def stand_in_run(calc):
+        calc.concs_used = []
+        calc.n_contour_points = []
+        calc.areas_contour = []
+        calc.distances_concentration = []
+        calc.contour_points = []
+        calc.messages = [f'{len(calc.dispersion_output_configs)} configs']
+        for cfg in calc.dispersion_output_configs:
+            if cfg.elevation == 99:
+                calc.result_code = ResultCode.FAIL_EXECUTION
+                return calc.result_code
+            length_m = max(0.0, 100 * (1 - cfg.elevation / cloud_top_m) * (0.05 / cfg.concentration))
+            n = 0 if length_m == 0 else 3 + (cfg.elevation * 7 + int(cfg.concentration * 1000)) % 5
+            t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+            calc.concs_used.append(cfg.concentration)
+            calc.n_contour_points.append(n)
+            calc.areas_contour.append(length_m**2 / 10)
+            calc.distances_concentration.append(length_m)
+            calc.contour_points.extend(LocalPosition(x=float(x), y=float(y), z=float(cfg.elevation)) for x, y in zip(length_m / 2 * (1 + np.cos(t)), length_m / 10 * np.sin(t)))
+        calc.calculation_elapsed_time = 0.01 * len(calc.dispersion_output_configs)
+        calc.result_code = ResultCode.SUCCESS
+        return calc.result_code
+    return stand_in_run
+
+stand_in_run = get_stand_in_run()
+
+def get_phast_dispersion():
+    phast_dispersion = SimpleNamespace(
+        dispersionCalculation = SimpleNamespace(scalar_udm_outputs=None, dispersion_records=[], dispersion_parameters=None),
+        weather = None,
+        substrate = None,
+        phast_discharge = SimpleNamespace(vesselLeakCalculation=SimpleNamespace(exit_material=None)),
+        mi = SimpleNamespace(LOG_HANDLER=lambda msg: None),
+    )
+    phast_dispersion.run_footprint_models_for_vce = functools.partial(Phast_Dispersion.run_footprint_models_for_vce, phast_dispersion)
+    return phast_dispersion
+
+def get_outputs(calc):
+    return {
+        'configs': [(cfg.elevation, cfg.concentration) for cfg in calc.dispersion_output_configs],
+        'concs_used': calc.concs_used,
+        'n_contour_points': calc.n_contour_points,
+        'areas_contour': calc.areas_contour,
+        'distances_concentration': calc.distances_concentration,
+        'contour_points': [(p.x, p.y, p.z) for p in calc.contour_points],
+    }
+
+@pytest.fixture(autouse=True)
+def stand_in_pws(monkeypatch):
+    monkeypatch.setattr(DistancesAndFootprintsToConcentrationLevelsCalculation, 'run', stand_in_run)
+
+@pytest.mark.parametrize('elevations_per_chunk', [1, 6, 7, 51, None])
+def test_chunked_matches_single_request(elevations_per_chunk):
+    # py_lopa's own single request
+    single = get_phast_dispersion()
+    assert single.run_footprint_models_for_vce(TARG_CONCS) == ResultCode.SUCCESS
+
+    chunked = get_phast_dispersion()
+    res = chunked_footprints.run_footprint_models_for_vce_chunked(chunked, TARG_CONCS, elevations_per_chunk=elevations_per_chunk)
+
+    assert res == ResultCode.SUCCESS
+    assert get_outputs(chunked.distancesAndFootprintsCalc) == get_outputs(single.distancesAndFootprintsCalc)
+    assert chunked.distancesAndFootprintsCalc.dispersion_output_config_count == single.distancesAndFootprintsCalc.dispersion_output_config_count
+
+def test_failed_chunk_fails_the_merged_calc():
+    phast_dispersion = get_phast_dispersion()
+    calc = chunked_footprints.run_footprint_configs(phast_dispersion, [(0, 0.05), (10, 0.05), (99, 0.05)], elevations_per_chunk=1)
+    assert calc.result_code == ResultCode.FAIL_EXECUTION
+
+def get_vce(inputs):
+    vce = Array_VCE.__new__(Array_VCE)
+    vce.mi = SimpleNamespace(inputs=inputs)
+    vce.phast_dispersion = get_phast_dispersion()
+    vce.targ_concs = TARG_CONCS
+    return vce
+
+def test_chunking_can_be_switched_off(monkeypatch):
+    n_requests = []
+    monkeypatch.setattr(DistancesAndFootprintsToConcentrationLevelsCalculation, 'run', lambda calc: n_requests.append(1) or stand_in_run(calc))
+
+    assert get_vce({}).run_dispersion_model_inside_flammable_envelope() == ResultCode.SUCCESS
+    assert len(n_requests) == len(chunked_footprints.get_elevation_bands(chunked_footprints.VCE_ELEVATIONS_M, Array_VCE.footprint_elevations_per_chunk))
+
+    n_requests.clear()
+    assert get_vce({Array_VCE.FOOTPRINT_CHUNKING_INPUT: False}).run_dispersion_model_inside_flammable_envelope() == ResultCode.SUCCESS
+    assert len(n_requests) == 1
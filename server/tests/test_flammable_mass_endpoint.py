@@ -0,0 +1,45 @@
+import pytest
+
+from app import app
+from calcs.array_integrator import Array_Integrator
+from utils.envelope_store import envelope_store
+
+from tests.conftest import get_contour_envelope
+
+BOX = {'xMin': 0, 'xMax': 60, 'yMin': -10, 'yMax': 10, 'zMin': 0, 'zMax': 3}
+
+@pytest.fixture
+def client():
+    with app.test_client() as client:
+        yield client
+
+def get_expected_mass_g(df):
+    integrator = Array_Integrator()
+    integrator.load_data(df)
+    return integrator.integrate(BOX['xMin'], BOX['xMax'], BOX['yMin'], BOX['yMax'], BOX['zMin'], BOX['zMax'])['total_mass_g']
+
+def post_flammable_mass(client, **fields):
+    return client.post('/api/vce_get_flammable_mass', json=dict(BOX, stoich_mol_o2_to_mol_fuel=None, **fields))
+
+def test_stored_envelope(client):
+    df = get_contour_envelope()
+    envelope_id = envelope_store.put(df)
+
+    resp = post_flammable_mass(client, envelope_id=envelope_id)
+
+    assert resp.status_code == 200
+    assert resp.get_json()['flammable_mass_g'] == pytest.approx(get_expected_mass_g(df), rel=1e-12)
+
+def test_expired_envelope_id(client):
+    # the id outlived its envelope (ttl, eviction or a server restart)
+    df = get_contour_envelope()
+    envelope_id = envelope_store.put(df)
+    envelope_store.discard(envelope_id)
+
+    resp = post_flammable_mass(client, envelope_id=envelope_id)
+    assert resp.status_code == 404
+
+    # the client sends the request again with the points it holds
+    resp = post_flammable_mass(client, envelope_id=envelope_id, flammable_envelope_list_of_dicts=df.to_dict('records'))
+    assert resp.status_code == 200
+    assert resp.get_json()['flammable_mass_g'] == pytest.approx(get_expected_mass_g(df), rel=1e-12)
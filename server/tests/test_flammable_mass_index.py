@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calcs.array_integrator import Array_Integrator
+from calcs.flammable_mass_index import Flammable_Mass_Index
+
+from tests.conftest import get_contour_envelope
+
+def get_random_boxes(df, n_boxes, seed):
+    # boxes from a fraction of a voxel to the whole envelope, some partly or wholly outside it
+    rng = np.random.default_rng(seed)
+    x_lo, x_hi = df['x'].min(), df['x'].max()
+    y_lo, y_hi = df['y'].min(), df['y'].max()
+    z_lo, z_hi = df['z'].min(), df['z'].max()
+    # planar envelopes are padded 0.1 m by the integrator
+    x_span = max(x_hi - x_lo, 0.1)
+    y_span = max(y_hi - y_lo, 0.1)
+    x_min = rng.uniform(x_lo - 0.2 * x_span, x_hi, n_boxes)
+    y_min = rng.uniform(y_lo - 0.2 * y_span, y_hi, n_boxes)
+    z_min = rng.uniform(z_lo - 1, z_hi, n_boxes)
+    x_max = x_min + x_span * 10**rng.uniform(-3, 0.2, n_boxes)
+    y_max = y_min + y_span * 10**rng.uniform(-3, 0.2, n_boxes)
+    z_max = z_min + rng.uniform(0, z_hi - z_lo + 1, n_boxes)
+    # boxes whose faces lie on points and z levels
+    on_points = rng.integers(0, len(df), (n_boxes // 5, 2))
+    x_min[:len(on_points)] = np.minimum(df['x'].to_numpy()[on_points[:, 0]], df['x'].to_numpy()[on_points[:, 1]])
+    x_max[:len(on_points)] = np.maximum(df['x'].to_numpy()[on_points[:, 0]], df['x'].to_numpy()[on_points[:, 1]]) + 1e-3
+    z_min[:len(on_points)] = df['z'].to_numpy()[on_points[:, 0]]
+    z_max[:len(on_points)] = z_min[:len(on_points)]
+    return x_min, x_max, y_min, y_max, z_min, z_max
+
+def get_integrated_masses_g(df, boxes):
+    masses_g = []
+    for box in zip(*boxes):
+        integrator = Array_Integrator()
+        integrator.load_data(df)
+        masses_g.append(integrator.integrate(*box)['total_mass_g'])
+    return np.array(masses_g)
+
+def get_random_envelope(seed):
+    rng = np.random.default_rng(seed)
+    n = 3000
+    df = pd.DataFrame({'x': rng.uniform(0, 80, n), 'y': rng.uniform(-15, 15, n), 'z': rng.integers(0, 8, n).astype(float)})
+    df['conc_g_m3'] = rng.uniform(0.05, 0.3, n)
+    return df
+
+@pytest.mark.parametrize('df', [
+    get_contour_envelope(),
+    get_contour_envelope(points_per_contour=400, n_z=11),
+    get_random_envelope(seed=1),
+    # planar envelopes, padded by the integrator
+    get_contour_envelope(n_z=1),
+    get_random_envelope(seed=2).assign(y=0.0),
+])
+def test_matches_integrate_on_random_boxes(df):
+    boxes = get_random_boxes(df, n_boxes=200, seed=3)
+    index = Flammable_Mass_Index(df)
+    masses_g = index.get_masses_g(*boxes)
+    expected_g = get_integrated_masses_g(df, boxes)
+
+    assert np.count_nonzero(expected_g) > 20
+    np.testing.assert_array_equal(masses_g, expected_g)
+
+def test_empty_boxes_have_no_mass():
+    df = get_contour_envelope()
+    index = Flammable_Mass_Index(df)
+    masses_g = index.get_masses_g([-50, 0, 0], [-10, 10, 10], [-5, 100, -5], [5, 200, 5], [0, 0, 100], [5, 5, 200])
+    np.testing.assert_array_equal(masses_g, [0, 0, 0])
+
+def test_invalid_boxes_are_rejected():
+    index = Flammable_Mass_Index(get_contour_envelope())
+    with pytest.raises(ValueError):
+        index.get_masses_g(10, 0, 0, 1, 0, 1)
+    with pytest.raises(ValueError):
+        index.get_masses_g(0, np.nan, 0, 1, 0, 1)
@@ -0,0 +1,118 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from pypws.calculations import JetFireCalculation
+from pypws.enums import ResultCode
+
+from controllers import rad_analysis_controller
+from utils.jet_fire_cache import JET_FIRE_CACHE_MAX_ENTRIES, Jet_Fire_Cache, Jet_Fire_Result
+from tests.test_cache_handling import get_vlc
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = Jet_Fire_Cache()
+    monkeypatch.setattr(rad_analysis_controller, 'jet_fire_cache', cache)
+    return cache
+
+@pytest.fixture
+def jet_fire_runs(monkeypatch):
+    # (stack height, wind speed) of every stand-in JetFireCalculation run.  each run takes long enough
+    # for concurrent requests to overlap it.
+    runs = []
+    lock = threading.Lock()
+
+    def stand_in_run(calc):
+        with lock:
+            runs.append((calc.discharge_result.height, calc.weather.wind_speed))
+        time.sleep(0.05)
+        calc.flame_result = f'flame {calc.discharge_result.height} {calc.weather.wind_speed}'
+        calc.flame_records = []
+        calc.messages = []
+        calc.result_code = ResultCode.FAIL_EXECUTION if calc.discharge_result.height < 0 else ResultCode.SUCCESS
+        return calc.result_code
+
+    monkeypatch.setattr(JetFireCalculation, 'run', stand_in_run)
+    return runs
+
+def get_jet_fires(vlc, calls):
+    async def run_all():
+        return await asyncio.gather(*[rad_analysis_controller.get_shared_jet_fire(vlc, stack_height_m=h, ws_mph=ws) for h, ws in calls])
+    return asyncio.run(run_all())
+
+def test_concurrent_calls_share_one_run(cache, jet_fire_runs):
+    vlc = get_vlc()
+
+    results = get_jet_fires(vlc, [(15.24, 5)] * 8)
+
+    assert len(jet_fire_runs) == 1
+    assert all(isinstance(result, Jet_Fire_Result) for result in results)
+    assert len({result.flame_result for result in results}) == 1
+    # an equal vlc (e.g. rebuilt from the vlc cache) finds the same flame
+    assert get_jet_fires(get_vlc(), [(15.24, 5.0)])[0] is cache.get(next(iter(cache.entries)))
+    assert len(jet_fire_runs) == 1
+    assert cache.stats()['stores'] == 1
+
+def test_concurrent_calls_from_threads_share_one_run(cache, jet_fire_runs):
+    vlc = get_vlc()
+    results = []
+
+    def request():
+        results.append(get_jet_fires(vlc, [(15.24, 5)])[0])
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(jet_fire_runs) == 1
+    assert len(results) == 8
+    assert len({result.flame_result for result in results}) == 1
+
+def test_other_wind_speed_or_stack_height_misses(cache, jet_fire_runs):
+    vlc = get_vlc()
+    get_jet_fires(vlc, [(15.24, 5)])
+
+    get_jet_fires(vlc, [(15.24, 6), (20.0, 5), (15.24, 5)])
+
+    assert sorted(jet_fire_runs) == sorted([(15.24, 5 * 1.5 / 3.3554), (15.24, 6 * 1.5 / 3.3554), (20.0, 5 * 1.5 / 3.3554)])
+    assert cache.stats()['entries'] == 3
+    # as does a different discharge
+    get_jet_fires(get_vlc(release_mass=900.0), [(15.24, 5)])
+    assert len(jet_fire_runs) == 4
+
+def test_failed_run_is_not_cached(cache, jet_fire_runs):
+    vlc = get_vlc()
+
+    first, second = [get_jet_fires(vlc, [(-1, 5)])[0] for _ in range(2)]
+
+    assert first.result_code == ResultCode.FAIL_EXECUTION
+    assert second.result_code == ResultCode.FAIL_EXECUTION
+    assert len(jet_fire_runs) == 2
+    assert cache.stats()['entries'] == 0
+
+def test_least_recently_used_evicted_past_max_entries(cache, jet_fire_runs):
+    vlc = get_vlc()
+    speeds = list(range(1, JET_FIRE_CACHE_MAX_ENTRIES + 1))
+    get_jet_fires(vlc, [(15.24, ws) for ws in speeds])
+    assert cache.stats()['entries'] == JET_FIRE_CACHE_MAX_ENTRIES
+    assert cache.stats()['evictions'] == 0
+    # the runs above finish in any order.  reading them back in order makes 1 mph the least recently used.
+    for ws in speeds:
+        get_jet_fires(vlc, [(15.24, ws)])
+    assert len(jet_fire_runs) == JET_FIRE_CACHE_MAX_ENTRIES
+
+    # 1 mph is used again, so 2 mph is now the least recently used
+    get_jet_fires(vlc, [(15.24, 1)])
+    get_jet_fires(vlc, [(15.24, JET_FIRE_CACHE_MAX_ENTRIES + 1)])
+    assert cache.stats()['entries'] == JET_FIRE_CACHE_MAX_ENTRIES
+    assert cache.stats()['evictions'] == 1
+    assert len(jet_fire_runs) == JET_FIRE_CACHE_MAX_ENTRIES + 1
+
+    get_jet_fires(vlc, [(15.24, 1)])
+    assert len(jet_fire_runs) == JET_FIRE_CACHE_MAX_ENTRIES + 1
+    get_jet_fires(vlc, [(15.24, 2)])
+    assert len(jet_fire_runs) == JET_FIRE_CACHE_MAX_ENTRIES + 2
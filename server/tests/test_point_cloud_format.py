@@ -0,0 +1,47 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from app import app
+from controllers.blast_analysis_controller import flammable_envelope_response
+from utils.envelope_store import envelope_store
+from utils.point_cloud_format import ARROW_MIME_TYPE, ENVELOPE_DTYPE, arrow_bytes_to_df, df_to_arrow_bytes
+
+from tests.conftest import get_contour_envelope
+
+BOX = {'xMin': 0, 'xMax': 60, 'yMin': -10, 'yMax': 10, 'zMin': 0, 'zMax': 3}
+
+def get_envelope():
+    # coordinates and concentrations that float32 cannot hold
+    df = get_contour_envelope()
+    rng = np.random.default_rng(0)
+    for col in ['x', 'y', 'conc_ppm', 'conc_g_m3']:
+        df[col] = df[col] * (1 + rng.uniform(-1e-6, 1e-6, len(df)))
+    return df
+
+def test_envelope_round_trip_is_exact():
+    df = get_envelope()
+    round_trip, metadata = arrow_bytes_to_df(df_to_arrow_bytes(df, metadata={'envelope_id': 'abc'}, dtype=ENVELOPE_DTYPE))
+    assert metadata == {'envelope_id': 'abc'}
+    for col in df.columns:
+        np.testing.assert_array_equal(round_trip[col].to_numpy(), df[col].to_numpy())
+
+def test_envelope_posted_back_as_arrow_gives_the_stored_mass():
+    df = get_envelope()
+    envelope_id = envelope_store.put(df)
+    flam_env_data = {'envelope_id': envelope_id, 'maximum_downwind_extent': 60, 'flash_data': None}
+
+    with app.test_request_context(headers={'Accept': ARROW_MIME_TYPE}):
+        resp = flammable_envelope_response(flam_env_data)
+    table = pa.ipc.open_stream(pa.py_buffer(resp.get_data())).read_all()
+    assert all(field.type == pa.float64() for field in table.schema)
+
+    received_df, _ = arrow_bytes_to_df(resp.get_data())
+    with app.test_client() as client:
+        by_id = client.post('/api/vce_get_flammable_mass', json=dict(BOX, envelope_id=envelope_id, stoich_mol_o2_to_mol_fuel=None))
+        body = df_to_arrow_bytes(received_df, metadata=dict(BOX, stoich_mol_o2_to_mol_fuel=None), dtype=ENVELOPE_DTYPE)
+        by_arrow = client.post('/api/vce_get_flammable_mass', data=body, content_type=ARROW_MIME_TYPE)
+
+    assert by_id.status_code == 200
+    assert by_arrow.status_code == 200
+    assert by_arrow.get_json()['flammable_mass_g'] == by_id.get_json()['flammable_mass_g']
@@ -0,0 +1,77 @@
+import os
+import json
+import time
+import asyncio
+import threading
+
+import pandas as pd
+import pytest
+
+from pypws.enums import ResultCode
+
+from py_lopa.model_interface import Model_Interface
+
+import asgi
+from controllers import blast_analysis_controller
+from utils.pws_limiter import Pws_Limiter, pws_limiter
+from utils.result_cache import Result_Cache
+
+TT_JSON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'tt_json')
+
+def stand_in_run(self):
+    self.vce_data = {
+        'flammable_envelope_df': pd.DataFrame({'x': [0.0, 5.0], 'y': [0.0, 0.0], 'z': [0.0, 0.0], 'conc_g_m3': [0.1, 0.1]}),
+        'maximum_downwind_extent': 5,
+        'flash_data': {'ys': [1.0], 'k_times_zi': [0], 'mws': [16.04], 'chem_mix': ['74-82-8'], 'ave_mw_vap': 16.04},
+    }
+    return ResultCode.SUCCESS
+
+def wait_for(condition, timeout_sec = 5):
+    t_end = time.monotonic() + timeout_sec
+    while not condition():
+        assert time.monotonic() < t_end
+        time.sleep(0.01)
+
+def test_nested_calls_do_not_queue_again():
+    limiter = Pws_Limiter(max_calls=1)
+    assert limiter.call(limiter.call, lambda: 'done') == 'done'
+    assert limiter.stats()['completed'] == 1
+
+def test_request_joining_a_run_holds_no_slot(tmp_path, monkeypatch):
+    # one PWS slot.  a run started off the event loop (as a job worker would) is joined by an asgi
+    # request for the same study before the run takes its slot.  the run must still get the slot.
+    with open(os.path.join(TT_JSON_DIR, 'paraffins.json'), 'r') as f:
+        data = json.load(f)
+    # every caller shares the process wide limiter.  it is left one free slot.
+    monkeypatch.setattr(pws_limiter, 'free', 1)
+    completed = pws_limiter.stats()['completed']
+    cache = Result_Cache(cache_dir=str(tmp_path / 'cache'), namespace='flammable_envelope')
+    joined = threading.Event()
+    cache_get = cache.get
+
+    def get_after_join(key):
+        joined.wait(5)
+        return cache_get(key)
+
+    monkeypatch.setattr(cache, 'get', get_after_join)
+    monkeypatch.setattr(blast_analysis_controller, 'flammable_envelope_cache', cache)
+    monkeypatch.setattr(Model_Interface, 'run', stand_in_run)
+    flight = blast_analysis_controller.flammable_envelope_flight
+    runs_saved = flight.stats()['runs_saved']
+
+    results = {}
+    leader = threading.Thread(target=lambda: results.update(leader=blast_analysis_controller.run_flammable_envelope(data=data)), daemon=True)
+    leader.start()
+    wait_for(lambda: flight.stats()['in_flight'] == 1)
+
+    async def join_run():
+        request = asyncio.ensure_future(asgi.flammable_envelope_model(data))
+        while flight.stats()['runs_saved'] == runs_saved:
+            await asyncio.sleep(0.01)
+        joined.set()
+        return await asyncio.wait_for(request, timeout=5)
+
+    result = asyncio.run(join_run())
+    leader.join(5)
+    assert result['envelope_id'] == results['leader']['envelope_id']
+    assert pws_limiter.stats()['completed'] == completed + 1
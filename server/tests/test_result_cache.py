@@ -0,0 +1,170 @@
+import os
+import copy
+import json
+
+import pandas as pd
+import pytest
+
+from pypws import materials as pws_materials
+from pypws.enums import ResultCode
+
+from py_lopa.model_interface import Model_Interface
+
+import utils.result_cache as result_cache
+from controllers import blast_analysis_controller
+from utils.envelope_store import Envelope_Store, envelope_store
+from utils.job_runner import Model_Run_Error
+from utils.pws_tape import MODE_OFF, MODE_REPLAY, get_request_key, make_response, use_pws_tape
+from utils.result_cache import Result_Cache
+
+TT_JSON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'tt_json')
+
+# the stand-in model below makes one PWS call per run.  its response (the envelope) comes off the tape.
+PWS_URL = 'https://pws.local/api/materials-storage/v1/envelopes/{}'
+
+def get_envelope_url(inputs):
+    return PWS_URL.format(inputs['pressure_psig'])
+
+def stand_in_run(self):
+    response = pws_materials.get_request(get_envelope_url(self.inputs))
+    if response.status_code != 200:
+        return ResultCode.FAIL_VALIDATION
+    self.vce_data = {
+        'flammable_envelope_df': pd.DataFrame(json.loads(response.text)),
+        'maximum_downwind_extent': 50,
+        'flash_data': {'ys': [1.0], 'k_times_zi': [0], 'mws': [16.04], 'chem_mix': ['74-82-8'], 'ave_mw_vap': 16.04},
+    }
+    return ResultCode.SUCCESS
+
+def put_on_tape(tape, url, envelope):
+    response = make_response(url, 200, reason='OK', text=json.dumps(envelope))
+    tape.put(get_request_key('GET', url), 'GET', url, response, elapsed_sec=0.0)
+
+@pytest.fixture
+def paraffins():
+    with open(os.path.join(TT_JSON_DIR, 'paraffins.json'), 'r') as f:
+        return json.load(f)
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = Result_Cache(cache_dir=str(tmp_path / 'cache'), namespace='flammable_envelope')
+    monkeypatch.setattr(blast_analysis_controller, 'flammable_envelope_cache', cache)
+    return cache
+
+@pytest.fixture
+def tape(tmp_path, monkeypatch):
+    monkeypatch.setattr(Model_Interface, 'run', stand_in_run)
+    tape = use_pws_tape(MODE_REPLAY, tape_dir=str(tmp_path / 'tape'))
+    # the tape is process wide.  counts start from zero in every test.
+    monkeypatch.setattr(tape, 'replayed', 0)
+    monkeypatch.setattr(tape, 'misses', 0)
+    yield tape
+    use_pws_tape(MODE_OFF)
+
+@pytest.fixture
+def store(monkeypatch):
+    now = [0.0]
+    store = Envelope_Store(ttl_sec=60, clock=lambda: now[0])
+    store.now = now
+    monkeypatch.setattr(blast_analysis_controller, 'envelope_store', store)
+    return store
+
+def get_inputs(data):
+    m_io = Model_Interface()
+    m_io.set_inputs_from_json(json_data=json.dumps(data))
+    return m_io.inputs
+
+def test_hits_and_misses(paraffins, cache, tape):
+    envelope = {'x': [0.0, 10.0, 20.0], 'y': [0.0, 1.0, -1.0], 'z': [0.0, 0.0, 1.0], 'conc_g_m3': [0.1, 0.2, 0.3]}
+    put_on_tape(tape, get_envelope_url(get_inputs(paraffins)), envelope)
+
+    first = blast_analysis_controller.run_flammable_envelope(data=copy.deepcopy(paraffins))
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['stores'] == 1
+    assert tape.stats()['replayed'] == 1
+
+    # the second run is read from the cache.  PWS is not called.
+    second = blast_analysis_controller.run_flammable_envelope(data=copy.deepcopy(paraffins))
+    assert cache.stats()['hits'] == 1
+    assert tape.stats()['replayed'] == 1
+    assert second['maximum_downwind_extent'] == first['maximum_downwind_extent']
+    assert second['flash_data'] == first['flash_data']
+    pd.testing.assert_frame_equal(
+        envelope_store.get(second['envelope_id'])['df'],
+        envelope_store.get(first['envelope_id'])['df'],
+    )
+
+    # the entries are on disk, so a new process finds them
+    reopened = Result_Cache(cache_dir=cache.cache_dir, namespace='flammable_envelope')
+    df, metadata = reopened.get(cache.make_key(get_inputs(paraffins) | {'vapor_cloud_explosion': True}))
+    pd.testing.assert_frame_equal(df, pd.DataFrame(envelope))
+    assert metadata['maximum_downwind_extent'] == 50
+
+def test_changed_input_is_a_new_key(paraffins, cache, tape):
+    changed = copy.deepcopy(paraffins)
+    changed['PrimaryInputs']['StoragePressure'] = 150
+    assert cache.make_key(get_inputs(changed)) != cache.make_key(get_inputs(paraffins))
+    # inputs that do not change the result do not change the key
+    assert cache.make_key(get_inputs(paraffins) | {'log_handler': print}) == cache.make_key(get_inputs(paraffins))
+
+    envelope = {'x': [0.0, 5.0], 'y': [0.0, 0.0], 'z': [0.0, 0.0], 'conc_g_m3': [0.1, 0.1]}
+    put_on_tape(tape, get_envelope_url(get_inputs(paraffins)), envelope)
+    put_on_tape(tape, get_envelope_url(get_inputs(changed)), envelope)
+    blast_analysis_controller.run_flammable_envelope(data=copy.deepcopy(paraffins))
+    blast_analysis_controller.run_flammable_envelope(data=copy.deepcopy(changed))
+
+    assert cache.stats()['misses'] == 2
+    assert cache.stats()['hits'] == 0
+    assert tape.stats()['replayed'] == 2
+
+def test_model_version_is_part_of_the_key(paraffins, cache, tape, monkeypatch):
+    envelope = {'x': [0.0, 5.0], 'y': [0.0, 0.0], 'z': [0.0, 0.0], 'conc_g_m3': [0.1, 0.1]}
+    put_on_tape(tape, get_envelope_url(get_inputs(paraffins)), envelope)
+    blast_analysis_controller.run_flammable_envelope(data=copy.deepcopy(paraffins))
+    key = cache.make_key(get_inputs(paraffins))
+
+    versions = result_cache.get_model_versions() | {'pypws': 'next'}
+    monkeypatch.setattr(result_cache, 'get_model_versions', lambda: versions)
+    assert cache.make_key(get_inputs(paraffins)) != key
+
+    blast_analysis_controller.run_flammable_envelope(data=copy.deepcopy(paraffins))
+    assert cache.stats()['misses'] == 2
+    assert tape.stats()['replayed'] == 2
+
+def test_failed_run_is_not_cached(paraffins, cache, tape):
+    # nothing on the tape, so the PWS call fails
+    with pytest.raises(Model_Run_Error):
+        blast_analysis_controller.run_flammable_envelope(data=copy.deepcopy(paraffins))
+    assert tape.stats()['misses'] == 1
+    assert cache.stats()['stores'] == 0
+    assert cache.stats()['entries'] == 0
+
+def test_cache_hit_reuses_the_stored_envelope(paraffins, cache, tape, store):
+    envelope = {'x': [0.0, 10.0], 'y': [0.0, 1.0], 'z': [0.0, 0.0], 'conc_g_m3': [0.1, 0.2]}
+    put_on_tape(tape, get_envelope_url(get_inputs(paraffins)), envelope)
+
+    first = blast_analysis_controller.run_flammable_envelope(data=copy.deepcopy(paraffins))
+    for _ in range(3):
+        store.now[0] += 45
+        repeat = blast_analysis_controller.run_flammable_envelope(data=copy.deepcopy(paraffins))
+        # each hit hands the same id out again and restarts its ttl
+        assert repeat['envelope_id'] == first['envelope_id']
+    assert cache.stats()['hits'] == 3
+    assert len(store.entries) == 1
+    assert store.total_bytes == store.entries[first['envelope_id']]['n_bytes']
+
+def test_cache_hit_after_the_envelope_expired_stores_it_again(paraffins, cache, tape, store):
+    envelope = {'x': [0.0, 10.0], 'y': [0.0, 1.0], 'z': [0.0, 0.0], 'conc_g_m3': [0.1, 0.2]}
+    put_on_tape(tape, get_envelope_url(get_inputs(paraffins)), envelope)
+
+    first = blast_analysis_controller.run_flammable_envelope(data=copy.deepcopy(paraffins))
+    store.now[0] += 61
+    second = blast_analysis_controller.run_flammable_envelope(data=copy.deepcopy(paraffins))
+    third = blast_analysis_controller.run_flammable_envelope(data=copy.deepcopy(paraffins))
+
+    assert cache.stats()['hits'] == 2
+    assert tape.stats()['replayed'] == 1
+    assert second['envelope_id'] != first['envelope_id']
+    assert third['envelope_id'] == second['envelope_id']
+    assert list(store.entries) == [second['envelope_id']]
+    pd.testing.assert_frame_equal(store.get(second['envelope_id'])['df'], pd.DataFrame(envelope))
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from py_lopa.calcs import helpers
+
+from utils import table_registry as table_registry_module
+from utils.table_registry import Table_Registry, use_table_registry_in_py_lopa
+
+@pytest.fixture
+def registry():
+    return Table_Registry()
+
+def test_get_mw_matches_py_lopa(registry):
+    cheminfo = registry.get_cheminfo().copy()
+    cas_nos = cheminfo['cas_no'].tolist()
+
+    expected = [table_registry_module._get_mw_from_cheminfo(cas_no, cheminfo=cheminfo) for cas_no in cas_nos]
+
+    np.testing.assert_array_equal([registry.get_mw(cas_no) for cas_no in cas_nos], expected)
+    assert registry.get_mw('not-a-cas') is None
+
+def test_warm_up_builds_mw_index(registry):
+    registry.warm_up()
+
+    assert 'mw' in registry.indexes
+
+def test_py_lopa_get_mw_uses_index(monkeypatch):
+    monkeypatch.setattr(helpers, 'get_dataframe_from_csv', helpers.get_dataframe_from_csv)
+    monkeypatch.setattr(helpers, 'get_cheminfo', helpers.get_cheminfo)
+    monkeypatch.setattr(helpers, 'get_mw', helpers.get_mw)
+    use_table_registry_in_py_lopa()
+    cheminfo = helpers.get_cheminfo()
+    chem_mix = ['74-82-8', '74-84-0', '7732-18-5']
+
+    def fail(*args, **kwargs):
+        raise AssertionError('cheminfo scanned for a cas number in the index')
+
+    expected = [table_registry_module._get_mw_from_cheminfo(cas_no, cheminfo=cheminfo) for cas_no in chem_mix]
+    monkeypatch.setattr(table_registry_module, '_get_mw_from_cheminfo', fail)
+    looked_up = []
+    get_mw = table_registry_module.table_registry.get_mw
+    monkeypatch.setattr(table_registry_module.table_registry, 'get_mw', lambda cas_no: looked_up.append(cas_no) or get_mw(cas_no))
+
+    assert helpers.get_mws(list(chem_mix), cheminfo=cheminfo) == expected
+    assert looked_up == chem_mix
+
+def test_py_lopa_get_mw_falls_back_for_names(monkeypatch):
+    monkeypatch.setattr(helpers, 'get_dataframe_from_csv', helpers.get_dataframe_from_csv)
+    monkeypatch.setattr(helpers, 'get_cheminfo', helpers.get_cheminfo)
+    monkeypatch.setattr(helpers, 'get_mw', helpers.get_mw)
+    use_table_registry_in_py_lopa()
+    cheminfo = helpers.get_cheminfo()
+    name = cheminfo['chem_name'].iloc[0]
+
+    assert helpers.get_mw(name, cheminfo=cheminfo) == table_registry_module._get_mw_from_cheminfo(name, cheminfo=cheminfo)
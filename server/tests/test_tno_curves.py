@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from py_lopa.calcs.tno_multienergy_blast_correlations import get_psc_given_blast_strength_class_and_scaled_radius
+
+from calcs import tno_curves
+
+CLASSES = list(range(1, tno_curves.N_CLASSES + 1))
+
+def get_segment_ranges(tno_class):
+    # (segment, lower bound, upper bound) for the segments the class has
+    bounds = [0.0] + list(tno_curves.SEGMENT_UPPER_BOUNDS[tno_class]) + [float(tno_curves.MAX_SCALED_RADIUS)]
+    return [(segment, lo, hi) for segment, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])) if hi > lo]
+
+def get_scaled_radii(tno_class):
+    # a log spaced sweep past the end of the curve, and every segment bound with its neighbours
+    radii = list(np.logspace(-3, 2.5, 2000)) + [0.0]
+    for upper in tno_curves.SEGMENT_UPPER_BOUNDS[tno_class]:
+        radii += [np.nextafter(upper, 0), upper, np.nextafter(upper, np.inf)]
+    return np.array(radii)
+
+@pytest.mark.parametrize('tno_class', CLASSES)
+def test_psc_matches_py_lopa(tno_class):
+    radii = get_scaled_radii(tno_class)
+    expected = np.array([get_psc_given_blast_strength_class_and_scaled_radius(tno_class, r) for r in radii])
+
+    actual = tno_curves.get_psc_given_blast_strength_class_and_scaled_radius(tno_class, radii)
+
+    np.testing.assert_allclose(actual, expected, rtol=1e-12, atol=0)
+
+def test_psc_for_mixed_classes_and_radii():
+    classes = np.array(CLASSES)[:, np.newaxis]
+    radii = np.logspace(-2, 2, 50)[np.newaxis, :]
+    expected = np.array([[get_psc_given_blast_strength_class_and_scaled_radius(c, r) for r in radii[0]] for c in CLASSES])
+
+    np.testing.assert_allclose(tno_curves.get_psc_given_blast_strength_class_and_scaled_radius(classes, radii), expected, rtol=1e-12)
+
+def get_largest_radius_m_by_search(tno_class, psc, radii):
+    # the largest radius of a dense sweep at which py_lopa's curve still reaches psc
+    reached = [r for r in radii if get_psc_given_blast_strength_class_and_scaled_radius(tno_class, r) >= psc]
+    return max(reached) if len(reached) > 0 else 0.0
+
+@pytest.mark.parametrize('tno_class', CLASSES)
+def test_inverse_round_trip_on_every_segment(tno_class):
+    for segment, lo, hi in get_segment_ranges(tno_class):
+        # points inside the segment, away from its bounds
+        radii = np.geomspace(max(lo, 1e-3) * 1.001, hi * 0.999, 7) if segment != tno_curves.SEGMENT_FLAT else np.array([hi * 0.5])
+        psc = tno_curves.get_psc_given_blast_strength_class_and_scaled_radius(tno_class, radii)
+        psc = psc[psc > tno_curves.MIN_PSC]
+
+        scaled_r = tno_curves.get_scaled_radius_given_blast_strength_class_and_psc(tno_class, psc)
+
+        # the curve still reaches psc at the returned radius, and nowhere beyond it
+        at_r = tno_curves.get_psc_given_blast_strength_class_and_scaled_radius(tno_class, scaled_r)
+        np.testing.assert_array_less(psc * (1 - 1e-9), at_r)
+        beyond = np.minimum(scaled_r * (1 + 1e-6), tno_curves.MAX_SCALED_RADIUS)
+        beyond_psc = tno_curves.get_psc_given_blast_strength_class_and_scaled_radius(tno_class, beyond)
+        assert np.all((beyond_psc < psc) | (scaled_r >= tno_curves.MAX_SCALED_RADIUS)), f'class {tno_class} segment {segment}'
+
+@pytest.mark.parametrize('tno_class', CLASSES)
+def test_inverse_matches_search_over_py_lopa_curve(tno_class):
+    # the curves are discontinuous between some segments, so the largest radius reaching a pressure can
+    # lie in a later segment than the first one to reach it
+    radii = np.geomspace(1e-3, tno_curves.MAX_SCALED_RADIUS, 2000)
+    psc = np.geomspace(tno_curves.MIN_PSC * 1.01, tno_curves._flat_psc[tno_class], 30)
+
+    scaled_r = tno_curves.get_scaled_radius_given_blast_strength_class_and_psc(tno_class, psc)
+
+    expected = np.array([get_largest_radius_m_by_search(tno_class, p, radii) for p in psc])
+    # the search is no finer than the sweep spacing
+    spacing = radii[1] / radii[0]
+    assert np.all(scaled_r >= expected * (1 - 1e-9))
+    assert np.all(scaled_r <= expected * spacing * (1 + 1e-9))
+
+def test_inverse_limits():
+    # above the flat top nothing qualifies.  at or below the floor the whole curve does.
+    assert tno_curves.get_scaled_radius_given_blast_strength_class_and_psc(10, 17)[()] == 0
+    np.testing.assert_array_equal(tno_curves.get_scaled_radius_given_blast_strength_class_and_psc(CLASSES, tno_curves.MIN_PSC), tno_curves.MAX_SCALED_RADIUS)
+
+def test_invalid_class():
+    with pytest.raises(ValueError):
+        tno_curves.get_psc_given_blast_strength_class_and_scaled_radius(11, 1.0)
+    with pytest.raises(ValueError):
+        tno_curves.get_scaled_radius_given_blast_strength_class_and_psc(0, 0.1)
@@ -1,9 +1,20 @@
 import os
 import logging
 
-from py_lopa.calcs import helpers
+from marshmallow import ValidationError
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+from utils.convert_between_objects_and_dicts import vlc_to_cache_dict, cache_dict_to_vlc
+from utils.result_cache import Result_Cache
+
+logger = logging.getLogger(__name__)
+
+# discharge results (VesselLeakCalculation) used by the radiation endpoint are cached by a hash of the
+# py_lopa inputs that produced them.  entries are stored as json through the pypws entity schemas, not
+# pickled.  bump VLC_CACHE_SCHEMA_VERSION whenever the stored layout changes so older entries are
+# no longer found.
+
+VLC_CACHE_SCHEMA_VERSION = 1
+VLC_CACHE_MAX_BYTES = 256 * 1024**2
 
 def _get_data_path():
     path = os.path.dirname(os.path.abspath(__file__))
@@ -11,13 +22,27 @@ def _get_data_path():
     data_path = os.path.join(parent, 'data')
     return data_path
 
-def store_cache(vlc, json_file_name, case_num):
-    data_path = _get_data_path()
-    json_file_name = helpers.replace_chars_in_string_prior_to_naming_windows_text_file(json_file_name)
-    _ = helpers.save_object_as_pickle_return_path_and_file_name(obj=vlc, descr=f'vlc-{json_file_name}-{case_num}',out_dir=data_path, use_time_stamp=False)
+vlc_cache = Result_Cache(cache_dir=os.path.join(_get_data_path(), 'result_cache', 'vlc'), max_bytes=VLC_CACHE_MAX_BYTES, namespace=f'vlc-v{VLC_CACHE_SCHEMA_VERSION}')
+
+def store_cache(vlc, py_lopa_inputs):
+    key = vlc_cache.make_key(py_lopa_inputs)
+    vlc_cache.put(key, df=None, metadata={'schema_version': VLC_CACHE_SCHEMA_VERSION, 'vlc': vlc_to_cache_dict(vlc)})
+
+def get_cache(py_lopa_inputs):
+    key = vlc_cache.make_key(py_lopa_inputs)
+    cached = vlc_cache.get(key)
+    if cached is None:
+        return None
+    _, metadata = cached
+    if metadata.get('schema_version') != VLC_CACHE_SCHEMA_VERSION:
+        vlc_cache.discard(key)
+        return None
+    try:
+        return cache_dict_to_vlc(metadata['vlc'])
+    except (KeyError, ValidationError) as e:
+        logger.debug(f'vlc cache entry {key} could not be loaded and was discarded.  error info: {e}')
+        vlc_cache.discard(key)
+        return None
 
-def get_cache(json_file_name, case_num):
-    data_path = _get_data_path()
-    json_file_name = helpers.replace_chars_in_string_prior_to_naming_windows_text_file(json_file_name)
-    vlc = helpers.load_pickled_object(file_nm=f'{data_path}/vlc-{json_file_name}-{case_num}.pickle')
-    return vlc
\ No newline at end of file
+def get_cache_stats():
+    return vlc_cache.stats()
@@ -3,10 +3,11 @@ from flask import jsonify
 import logging
 
 from pypws.entities import DischargeRecord, DischargeResult, Material
+from pypws.entity_schemas import DischargeRecordSchema, DischargeResultSchema, MaterialSchema
 
 from py_lopa.calcs import helpers
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
 class EmptyObj:
 
@@ -52,6 +53,23 @@ def cache_to_dicts(cache):
 
     return cache
 
+def vlc_to_cache_dict(vlc):
+    # the parts of a VesselLeakCalculation needed to run a jet fire, as plain json-ready dicts.
+    # the pypws schemas are the same ones used to send these entities to PWS.
+    return {
+        'exit_material': MaterialSchema().dump(vlc.exit_material),
+        'discharge_records': DischargeRecordSchema(many=True).dump(vlc.discharge_records if vlc.discharge_records is not None else []),
+        'discharge_result': DischargeResultSchema().dump(vlc.discharge_result),
+    }
+
+def cache_dict_to_vlc(cache):
+    # rebuilds the pypws entities.  the returned object stands in for the VesselLeakCalculation.
+    vlc = EmptyObj()
+    vlc.exit_material = MaterialSchema().load(cache['exit_material'])
+    vlc.discharge_records = DischargeRecordSchema(many=True).load(cache['discharge_records'])
+    vlc.discharge_result = DischargeResultSchema().load(cache['discharge_result'])
+    return vlc
+
 if __name__ == "__main__":
     path = os.path.dirname(os.path.abspath(__file__))
     parent = os.path.dirname(path)
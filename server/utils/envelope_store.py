@@ -0,0 +1,94 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# flammable envelopes are kept in process so the client can refer to them by id instead of
+# posting the full point list back with every flammable mass request.  an envelope put with a key
+# (the result cache key of the run that made it) is found again by that key, so repeat runs of the
+# same study share one entry.
+
+MAX_STORE_BYTES = 256 * 1024 * 1024
+TTL_SEC = 2 * 60 * 60
+
+class Envelope_Store:
+
+    def __init__(self, max_bytes = MAX_STORE_BYTES, ttl_sec = TTL_SEC, clock = time.monotonic) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.ids_by_key = {}
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def put(self, flammable_envelope_df, flash_data = None, key = None):
+        envelope_df = pd.DataFrame(flammable_envelope_df)
+        for col in ['x', 'y', 'z', 'conc_g_m3']:
+            envelope_df[col] = envelope_df[col].astype(float)
+        n_bytes = int(envelope_df.memory_usage(index=True, deep=False).sum())
+        envelope_id = uuid.uuid4().hex
+        with self.lock:
+            self.entries[envelope_id] = {
+                'df': envelope_df,
+                'flash_data': flash_data,
+                'n_bytes': n_bytes,
+                'expires_at': self.clock() + self.ttl_sec,
+                'key': key,
+            }
+            if key is not None:
+                self.ids_by_key[key] = envelope_id
+            self.total_bytes += n_bytes
+            self._evict()
+        return envelope_id
+
+    def get(self, envelope_id):
+        if envelope_id is None:
+            return None
+        with self.lock:
+            entry = self.entries.get(envelope_id)
+            if entry is None:
+                return None
+            if entry['expires_at'] <= self.clock():
+                self._remove(envelope_id)
+                return None
+            self.entries.move_to_end(envelope_id)
+            return entry
+
+    def find(self, key):
+        # id of the live envelope put with this key, or None.  the id is handed out again, so its ttl restarts.
+        with self.lock:
+            envelope_id = self.ids_by_key.get(key)
+            if envelope_id is None:
+                return None
+            entry = self.entries[envelope_id]
+            if entry['expires_at'] <= self.clock():
+                self._remove(envelope_id)
+                return None
+            entry['expires_at'] = self.clock() + self.ttl_sec
+            self.entries.move_to_end(envelope_id)
+            return envelope_id
+
+    def discard(self, envelope_id):
+        with self.lock:
+            if envelope_id in self.entries:
+                self._remove(envelope_id)
+
+    def _remove(self, envelope_id):
+        entry = self.entries.pop(envelope_id)
+        self.total_bytes -= entry['n_bytes']
+        if entry['key'] is not None and self.ids_by_key.get(entry['key']) == envelope_id:
+            del self.ids_by_key[entry['key']]
+
+    def _evict(self):
+        now = self.clock()
+        expired = [k for k, v in self.entries.items() if v['expires_at'] <= now]
+        for envelope_id in expired:
+            self._remove(envelope_id)
+        # least recently used first.  the newest entry is always kept, even if it alone exceeds the limit.
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            self._remove(next(iter(self.entries)))
+
+envelope_store = Envelope_Store()
@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+# flammable mass indexes (calcs.flammable_mass_index) kept in process by envelope_id, so every batch of
+# congested volumes against a stored envelope after the first skips loading and indexing it.  an index
+# holds the envelope's points and a count table (MB each), so the store is bounded by bytes.  least
+# recently used first out.
+# an index outlives its envelope at most until it is evicted.  callers look the envelope up first.
+
+MAX_INDEX_STORE_BYTES = 256 * 1024 * 1024
+
+class Flammable_Mass_Index_Store:
+
+    def __init__(self, max_bytes = MAX_INDEX_STORE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, envelope_id, index):
+        with self.lock:
+            if envelope_id in self.entries:
+                self.total_bytes -= self.entries.pop(envelope_id).n_bytes
+            self.entries[envelope_id] = index
+            self.total_bytes += index.n_bytes
+            # the newest index is always kept, even if it alone exceeds the limit
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= evicted.n_bytes
+                self.evictions += 1
+
+    def get(self, envelope_id):
+        with self.lock:
+            index = self.entries.get(envelope_id)
+            if index is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(envelope_id)
+            self.hits += 1
+            return index
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups > 0 else 0,
+                'evictions': self.evictions,
+            }
+
+flammable_mass_index_store = Flammable_Mass_Index_Store()
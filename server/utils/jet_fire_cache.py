@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+
+from utils.convert_between_objects_and_dicts import vlc_to_cache_dict
+from utils.result_cache import get_inputs_key
+
+# jet fire (flame) results kept in memory for the radiation endpoints.  the flame depends only on the
+# discharge (vlc), the stack height and the wind speed, so moving a transect or adding transects reuses
+# it and only the radiation transect calls go to PWS.  entries are least recently used first out.
+# the cached pypws entities are shared between requests and must not be modified in place.
+
+JET_FIRE_CACHE_MAX_ENTRIES = 128
+JET_FIRE_CACHE_SCHEMA_VERSION = 1
+
+def get_jet_fire_key(vlc, stack_height_m, ws_mph):
+    # the vlc is hashed through the same json form used by the vlc cache
+    inputs = {
+        'vlc': vlc_to_cache_dict(vlc),
+        'stack_height_m': float(stack_height_m),
+        'ws_mph': float(ws_mph),
+    }
+    return get_inputs_key(inputs, namespace=f'jet_fire-v{JET_FIRE_CACHE_SCHEMA_VERSION}')
+
+class Jet_Fire_Result:
+    # the parts of a JetFireCalculation a RadiationTransectCalculation needs.  stands in for the calc.
+
+    def __init__(self, flame_result, flame_records, weather, flammable_parameters) -> None:
+        self.flame_result = flame_result
+        self.flame_records = flame_records
+        self.weather = weather
+        self.flammable_parameters = flammable_parameters
+
+    @classmethod
+    def from_calc(cls, jetFireCalc):
+        return cls(
+            flame_result=jetFireCalc.flame_result,
+            flame_records=jetFireCalc.flame_records,
+            weather=jetFireCalc.weather,
+            flammable_parameters=jetFireCalc.flammable_parameters,
+        )
+
+class Jet_Fire_Cache:
+
+    def __init__(self, max_entries = JET_FIRE_CACHE_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            self.stores += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                # entries are kept as python objects, so no byte count
+                'bytes': None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups > 0 else 0,
+                'stores': self.stores,
+                'evictions': self.evictions,
+            }
+
+jet_fire_cache = Jet_Fire_Cache()
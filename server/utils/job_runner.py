@@ -0,0 +1,132 @@
+import time
+import uuid
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# background runner for the long py_lopa / PWS model runs.  a fixed number of workers run the
+# models, so a burst of model requests queues here instead of tying up every server thread, and
+# cheap requests (flammable mass, overpressures) keep being served.  finished jobs are kept for
+# result_ttl_sec so their results can be collected.
+
+MAX_MODEL_WORKERS = 4
+MAX_PENDING_JOBS = 32
+JOB_RESULT_TTL_SEC = 60 * 60
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+class Job_Queue_Full(Exception):
+    pass
+
+class Model_Run_Error(Exception):
+    pass
+
+class Job_Runner:
+
+    def __init__(self, max_workers = MAX_MODEL_WORKERS, max_pending = MAX_PENDING_JOBS, result_ttl_sec = JOB_RESULT_TTL_SEC, clock = time.time) -> None:
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl_sec = result_ttl_sec
+        self.clock = clock
+        self.job_types = {}
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='model_job')
+
+    def register(self, kind, fn):
+        # fn is called with the posted request data and returns the job result
+        self.job_types[kind] = fn
+
+    def is_registered(self, kind):
+        return kind in self.job_types
+
+    def submit(self, kind, data):
+        fn = self.job_types[kind]
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self._purge()
+            n_pending = sum(1 for job in self.jobs.values() if job['status'] in (JOB_QUEUED, JOB_RUNNING))
+            if n_pending >= self.max_pending:
+                raise Job_Queue_Full(f'{n_pending} model runs are already waiting.  please try again shortly.')
+            job = {
+                'job_id': job_id,
+                'kind': kind,
+                'status': JOB_QUEUED,
+                'submitted_at': self.clock(),
+                'started_at': None,
+                'finished_at': None,
+                'error': None,
+                'result': None,
+                'future': None,
+            }
+            self.jobs[job_id] = job
+            # the submitter's context goes with the job, so its stage timings reach the request
+            job['future'] = self.executor.submit(contextvars.copy_context().run, self._run, job, fn, data)
+        return job_id
+
+    def _run(self, job, fn, data):
+        with self.lock:
+            job['status'] = JOB_RUNNING
+            job['started_at'] = self.clock()
+        try:
+            result = fn(data)
+        except Exception as e:
+            logger.debug(f'{job["kind"]} job {job["job_id"]} failed.  error info: {e}')
+            with self.lock:
+                job['status'] = JOB_FAILED
+                job['error'] = str(e)
+                job['finished_at'] = self.clock()
+            raise
+        with self.lock:
+            job['status'] = JOB_DONE
+            job['result'] = result
+            job['finished_at'] = self.clock()
+        return result
+
+    def _purge(self):
+        now = self.clock()
+        expired = [job_id for job_id, job in self.jobs.items() if job['finished_at'] is not None and now - job['finished_at'] > self.result_ttl_sec]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def get_job(self, job_id):
+        with self.lock:
+            self._purge()
+            return self.jobs.get(job_id)
+
+    def get_status(self, job_id):
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+        with self.lock:
+            status = {k: v for k, v in job.items() if k not in ('result', 'future')}
+            if job['status'] == JOB_QUEUED:
+                status['position'] = sum(1 for other in self.jobs.values() if other['status'] == JOB_QUEUED and other['submitted_at'] <= job['submitted_at'])
+        return status
+
+    def stats(self):
+        with self.lock:
+            counts = {status: 0 for status in (JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED)}
+            for job in self.jobs.values():
+                counts[job['status']] += 1
+            return counts
+
+    async def run(self, kind, data):
+        # for the synchronous routes:  queue the run like any other job and wait for its result
+        job_id = self.submit(kind, data)
+        job = self.get_job(job_id)
+        try:
+            return await asyncio.wrap_future(job['future'])
+        finally:
+            # nobody polls for these, so they are not kept around
+            with self.lock:
+                self.jobs.pop(job_id, None)
+
+job_runner = Job_Runner()
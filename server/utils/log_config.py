@@ -0,0 +1,201 @@
+import os
+import sys
+import queue
+import atexit
+import reprlib
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# logging for the server.  request threads only put records on a queue.  a background listener
+# formats them and writes to stderr and to a size rotated file in logs/, so neither string
+# formatting of large messages nor disk writes happen on the request path.
+# levels are set per logger (module).  the defaults below can be changed with environment variables:
+#   CMCT_LOG_LEVEL   - level for everything not listed, e.g. INFO
+#   CMCT_LOG_LEVELS  - per logger levels, e.g. "controllers=DEBUG,urllib3=WARNING"
+#   CMCT_LOG_DIR     - directory for the rotating log file
+# request payloads go through log_payload:  only 1 in PAYLOAD_SAMPLE_EVERY is logged, and then as a
+# size limited repr.
+
+def _get_server_path():
+    path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(path)
+
+LOG_DIR = os.environ.get('CMCT_LOG_DIR', os.path.join(_get_server_path(), 'logs'))
+LOG_FILE_NAME = 'cmct_server.log'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+DEFAULT_LEVEL = 'INFO'
+
+DEFAULT_LEVELS = {
+    'controllers': 'DEBUG',
+    'utils': 'INFO',
+    'asgi': 'DEBUG',
+    'app': 'DEBUG',
+    # py_lopa's own progress messages (see log_py_lopa_message)
+    'py_lopa': 'INFO',
+    # connection pool chatter for every PWS call
+    'urllib3': 'WARNING',
+    'requests': 'WARNING',
+    'waitress': 'INFO',
+    'werkzeug': 'INFO',
+    'uvicorn': 'INFO',
+    'matplotlib': 'WARNING',
+    'PIL': 'WARNING',
+}
+
+PAYLOAD_SAMPLE_EVERY = 20
+PAYLOAD_MAX_CHARS = 2000
+
+LOG_QUEUE_SIZE = 10000
+
+_payload_repr = reprlib.Repr()
+_payload_repr.maxlevel = 4
+_payload_repr.maxdict = 25
+_payload_repr.maxlist = 10
+_payload_repr.maxtuple = 10
+_payload_repr.maxstring = 200
+_payload_repr.maxother = 200
+
+class Payload:
+    # defers the repr of a (possibly multi-megabyte) payload to the listener thread, and bounds it.
+    # the payload must not be changed after it is logged.
+
+    def __init__(self, data, max_chars = PAYLOAD_MAX_CHARS) -> None:
+        self.data = data
+        self.max_chars = max_chars
+
+    def __str__(self):
+        text = _payload_repr.repr(self.data)
+        if len(text) > self.max_chars:
+            text = f'{text[:self.max_chars]}... ({len(text) - self.max_chars} more chars)'
+        return text
+
+class Payload_Sampler:
+
+    def __init__(self, every = PAYLOAD_SAMPLE_EVERY) -> None:
+        self.every = every
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def take(self):
+        if self.every <= 1:
+            return True
+        with self.lock:
+            self.count += 1
+            return self.count % self.every == 1
+
+payload_sampler = Payload_Sampler()
+
+def log_payload(logger, message, data, level = logging.DEBUG):
+    if not logger.isEnabledFor(level) or not payload_sampler.take():
+        return
+    logger.log(level, '%s  %s', message, Payload(data))
+
+class Deferred_Queue_Handler(QueueHandler):
+    # the stock QueueHandler formats the message on the calling thread (so records can be pickled).
+    # records here stay in process, so msg % args is left for the listener.  tracebacks are rendered
+    # now, while the frames are still as they were.
+
+    def prepare(self, record):
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # a stalled disk drops log records rather than blocking requests
+            pass
+
+def parse_levels(text):
+    levels = {}
+    for item in (text or '').split(','):
+        if '=' not in item:
+            continue
+        name, level = item.split('=', 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+def get_levels():
+    levels = dict(DEFAULT_LEVELS)
+    levels.update(parse_levels(os.environ.get('CMCT_LOG_LEVELS')))
+    return levels
+
+_listeners = {}
+_file_loggers = {}
+_config_lock = threading.Lock()
+
+def _start_listener(name, handlers):
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners[name] = listener
+    return Deferred_Queue_Handler(log_queue)
+
+def _get_file_handler(path, fmt = LOG_FORMAT, datefmt = None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8', delay=True)
+    handler.setFormatter(logging.Formatter(fmt, datefmt=datefmt))
+    return handler
+
+def configure_logging(force = False):
+    # like logging.basicConfig, nothing is changed if the root logger already has handlers (e.g. a
+    # script that set its own), unless force is set
+    with _config_lock:
+        root = logging.getLogger()
+        if 'root' in _listeners and not force:
+            return
+        if len(root.handlers) > 0 and not force:
+            return
+        stop_logging(names=['root'])
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers = [stream_handler]
+        try:
+            handlers.append(_get_file_handler(os.path.join(LOG_DIR, LOG_FILE_NAME)))
+        except OSError as e:
+            sys.stderr.write(f'log file not available in {LOG_DIR}.  logging to stderr only.  error info: {e}\n')
+
+        root.addHandler(_start_listener('root', handlers))
+        root.setLevel(os.environ.get('CMCT_LOG_LEVEL', DEFAULT_LEVEL).upper())
+        for name, level in get_levels().items():
+            logging.getLogger(name).setLevel(level)
+
+def get_file_logger(file_nm):
+    # a logger that writes only to file_nm (rotated), through its own queue
+    with _config_lock:
+        logger = _file_loggers.get(file_nm)
+        if logger is None:
+            logger = logging.getLogger(f'cmct.file.{file_nm}')
+            logger.propagate = False
+            logger.setLevel(logging.DEBUG)
+            logger.addHandler(_start_listener(file_nm, [_get_file_handler(file_nm, fmt='[%(asctime)s] [%(levelname)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')]))
+            _file_loggers[file_nm] = logger
+        return logger
+
+py_lopa_logger = logging.getLogger('py_lopa')
+
+def log_py_lopa_message(message):
+    # used as py_lopa's log_handler (its default is print)
+    py_lopa_logger.info('%s', message)
+
+def stop_logging(names = None):
+    # flushes and stops the listeners.  records logged afterwards are queued but not written.
+    for name in list(names or _listeners.keys()):
+        listener = _listeners.pop(name, None)
+        if listener is None:
+            continue
+        try:
+            listener.stop()
+        except queue.Full:
+            pass
+
+atexit.register(stop_logging)
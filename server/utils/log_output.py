@@ -1,7 +1,5 @@
-from datetime import datetime
+from utils.log_config import get_file_logger
 
 def log_to_file(message, file_nm = "C:/cmct_tools/server/flask_log.txt"):
-    level="DEBUG"
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(file_nm, "a") as f:
-        f.write(f"[{timestamp}] [{level}] {message}\n")
+    # written by a background thread to a size rotated file (see utils/log_config.py)
+    get_file_logger(file_nm).debug('%s', message)
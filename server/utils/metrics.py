@@ -0,0 +1,99 @@
+import math
+import threading
+
+# process wide counters and latency histograms, rendered in the prometheus text format by /api/metrics.
+# names and labels follow prometheus conventions (seconds, _total for counters).  values are kept
+# in memory and start from zero when the server restarts.
+
+LATENCY_BUCKETS_SEC = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+METRIC_HELP = {
+    'cmct_http_request_duration_seconds': 'request latency by route, method and status',
+    'cmct_stage_duration_seconds': 'time spent in each request stage (input parse, flash, discharge, dispersion, ...)',
+    'cmct_pws_call_duration_seconds': 'round trip of each PWS calculation, by calculation',
+    'cmct_pws_calls_total': 'PWS calculations run, by calculation and result code',
+}
+
+def _label_key(labels):
+    return tuple(sorted((str(k), str(v)) for k, v in (labels or {}).items()))
+
+def _format_labels(label_key, extra = None):
+    pairs = list(label_key) + list(extra or [])
+    if len(pairs) == 0:
+        return ''
+    text = ','.join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return '{' + text + '}'
+
+def _escape(val):
+    return str(val).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(val):
+    if isinstance(val, bool):
+        return '1' if val else '0'
+    if isinstance(val, float) and math.isinf(val):
+        return '+Inf' if val > 0 else '-Inf'
+    return repr(float(val)) if isinstance(val, float) else str(val)
+
+class Metrics:
+
+    def __init__(self, buckets = LATENCY_BUCKETS_SEC) -> None:
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # name: {label key: [bucket counts..., sum, count]}
+        self.histograms = {}
+        # name: {label key: value}
+        self.counters = {}
+
+    def observe(self, name, value, labels = None):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            vals = series.get(key)
+            if vals is None:
+                vals = [0] * (len(self.buckets) + 2)
+                series[key] = vals
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    vals[i] += 1
+            vals[-2] += value
+            vals[-1] += 1
+
+    def inc(self, name, labels = None, amount = 1):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def render(self, gauges = None):
+        # gauges:  {name: [(labels, value), ...]} read from the caches and limiters at scrape time
+        lines = []
+        with self.lock:
+            histograms = {name: {k: list(v) for k, v in series.items()} for name, series in self.histograms.items()}
+            counters = {name: dict(series) for name, series in self.counters.items()}
+
+        for name in sorted(histograms):
+            lines.append(f'# HELP {name} {METRIC_HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} histogram')
+            for key, vals in sorted(histograms[name].items()):
+                for bound, count in zip(self.buckets, vals):
+                    lines.append(f'{name}_bucket{_format_labels(key, [("le", _format_value(float(bound)))])} {count}')
+                lines.append(f'{name}_bucket{_format_labels(key, [("le", "+Inf")])} {vals[-1]}')
+                lines.append(f'{name}_sum{_format_labels(key)} {_format_value(float(vals[-2]))}')
+                lines.append(f'{name}_count{_format_labels(key)} {vals[-1]}')
+
+        for name in sorted(counters):
+            lines.append(f'# HELP {name} {METRIC_HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} counter')
+            for key, val in sorted(counters[name].items()):
+                lines.append(f'{name}{_format_labels(key)} {_format_value(val)}')
+
+        for name in sorted(gauges or {}):
+            lines.append(f'# TYPE {name} gauge')
+            for labels, val in gauges[name]:
+                if val is None:
+                    continue
+                lines.append(f'{name}{_format_labels(_label_key(labels))} {_format_value(val)}')
+
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from flask import Response, request
+
+# point clouds (flammable envelope, radiation transects) can be exchanged as an arrow ipc stream
+# instead of a json list of dicts.  radiation point columns are sent as float32.  flammable envelope
+# columns are sent as float64 (ENVELOPE_DTYPE):  an envelope posted back is integrated again, and a
+# point moved by rounding can fall in a different voxel or box.  any scalar fields that travel with
+# the points (envelope id, flash data, integration bounds, etc.) are carried as json in the schema
+# metadata.
+
+ARROW_MIME_TYPE = 'application/vnd.apache.arrow.stream'
+METADATA_KEY = b'cmct'
+
+POINT_DTYPE = np.float32
+ENVELOPE_DTYPE = np.float64
+
+def client_accepts_arrow():
+    return ARROW_MIME_TYPE in request.headers.get('Accept', '')
+
+def request_is_arrow():
+    return request.mimetype == ARROW_MIME_TYPE
+
+def columns_to_arrow_bytes(columns, metadata = None, dtype = POINT_DTYPE):
+    arrays = [pa.array(np.asarray(v, dtype=dtype)) for v in columns.values()]
+    schema_metadata = None
+    if metadata is not None:
+        schema_metadata = {METADATA_KEY: json.dumps(metadata, default=_to_builtin)}
+    table = pa.Table.from_arrays(arrays, names=list(columns.keys()), metadata=schema_metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def df_to_arrow_bytes(df:pd.DataFrame, metadata = None, dtype = POINT_DTYPE):
+    return columns_to_arrow_bytes({col: df[col].to_numpy() for col in df.columns}, metadata=metadata, dtype=dtype)
+
+def arrow_bytes_to_df(body):
+    table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    metadata = {}
+    if table.schema.metadata is not None and METADATA_KEY in table.schema.metadata:
+        metadata = json.loads(table.schema.metadata[METADATA_KEY])
+    df = table.to_pandas().astype(float)
+    return df, metadata
+
+def arrow_response(columns, metadata = None, status = 200, dtype = POINT_DTYPE):
+    body = columns_to_arrow_bytes(columns, metadata=metadata, dtype=dtype)
+    return Response(body, status=status, mimetype=ARROW_MIME_TYPE)
+
+def get_request_points_and_data():
+    # returns (points dataframe or None, the remaining request fields as a dict)
+    if request_is_arrow():
+        return arrow_bytes_to_df(request.get_data())
+    return None, request.get_json()
+
+def _to_builtin(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import contextvars
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# process wide cap on concurrent PWS work.  every blocking PWS call made by the server (a py_lopa model
+# run, which calls PWS in sequence, or a single jet fire / radiation calculation) holds one slot while
+# it runs, whichever thread or event loop it was started from.
+#   call        - blocks the calling thread until a slot is free.
+#   call_async  - waits for a slot on the event loop (no thread is held while waiting), then runs the
+#                 call on the limiter's own pool, which has one thread per slot.
+# a thread that already holds a slot runs nested calls straight away, so a whole model request can be
+# handed to call_async and the PWS calls inside it do not queue a second time.  never hand it a
+# single flight's do (utils.single_flight) though:  a caller joining a run in progress would hold a
+# slot while it waits, and the run it waits on may need that slot.  take the slot inside the run.
+
+MAX_CONCURRENT_PWS_CALLS = 8
+
+class Pws_Limiter:
+
+    def __init__(self, max_calls = MAX_CONCURRENT_PWS_CALLS) -> None:
+        self.max_calls = max_calls
+        self.free = max_calls
+        self.cond = threading.Condition()
+        self.async_waiters = deque()
+        self.holder = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=max_calls, thread_name_prefix='pws')
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+
+    def _holds_slot(self):
+        return getattr(self.holder, 'depth', 0) > 0
+
+    def _acquire(self):
+        with self.cond:
+            self.waiting += 1
+            while self.free == 0:
+                self.cond.wait()
+            self.waiting -= 1
+            self.free -= 1
+            self.active += 1
+
+    async def _acquire_async(self):
+        loop = asyncio.get_running_loop()
+        with self.cond:
+            if self.free > 0:
+                self.free -= 1
+                self.active += 1
+                return
+            fut = loop.create_future()
+            waiter = (loop, fut)
+            self.async_waiters.append(waiter)
+            self.waiting += 1
+        try:
+            # resolved once a finishing call hands its slot over
+            await fut
+        except asyncio.CancelledError:
+            with self.cond:
+                if waiter in self.async_waiters:
+                    self.async_waiters.remove(waiter)
+                    self.waiting -= 1
+                elif fut.done() and not fut.cancelled():
+                    self._release_locked(finished=False)
+            raise
+
+    def _release(self, finished = True):
+        with self.cond:
+            self._release_locked(finished=finished)
+
+    def _release_locked(self, finished = True):
+        self.active -= 1
+        if finished:
+            self.completed += 1
+        while self.async_waiters:
+            loop, fut = self.async_waiters.popleft()
+            self.waiting -= 1
+            try:
+                loop.call_soon_threadsafe(self._hand_over, fut)
+            except RuntimeError:
+                # that waiter's event loop has been closed
+                continue
+            self.active += 1
+            return
+        self.free += 1
+        self.cond.notify()
+
+    def _hand_over(self, fut):
+        if fut.cancelled():
+            # the waiter went away after the slot was handed to it
+            self._release(finished=False)
+            return
+        fut.set_result(None)
+
+    def _run_holding_slot(self, fn, *args, **kwargs):
+        self.holder.depth = getattr(self.holder, 'depth', 0) + 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.holder.depth -= 1
+
+    def call(self, fn, *args, **kwargs):
+        if self._holds_slot():
+            return fn(*args, **kwargs)
+        self._acquire()
+        try:
+            return self._run_holding_slot(fn, *args, **kwargs)
+        finally:
+            self._release()
+
+    async def call_async(self, fn, *args, **kwargs):
+        await self._acquire_async()
+        loop = asyncio.get_running_loop()
+        try:
+            # run_in_executor does not carry the caller's context (request timings) over by itself
+            ctx = contextvars.copy_context()
+            return await loop.run_in_executor(self.executor, ctx.run, functools.partial(self._run_holding_slot, fn, *args, **kwargs))
+        finally:
+            self._release()
+
+    def stats(self):
+        with self.cond:
+            return {
+                'max_calls': self.max_calls,
+                'active': self.active,
+                'waiting': self.waiting,
+                'completed': self.completed,
+            }
+
+pws_limiter = Pws_Limiter()
@@ -0,0 +1,217 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from pypws import calculations as pws_calculations
+from pypws import materials as pws_materials
+from pypws import utilities as pws_utilities
+
+logger = logging.getLogger(__name__)
+
+# record / replay stand-in for Plant Web Services.  pypws sends every calculation through
+# _CalculationBase.post_request, and the materials api through the post_request / get_request helpers
+# it imports from pypws.utilities.  those are patched here.
+#   record  - calls go to PWS as usual.  each request / response pair is also written to the tape.
+#   replay  - calls never leave the process.  the recorded response is returned after latency_sec plus
+#             latency_scale times the round trip measured when it was recorded.  a request that is not
+#             on the tape gets a 404, which pypws reports as a failed calculation.
+# pairs are keyed by a hash of the method, the endpoint (host, api version and clientId dropped, so a
+# tape works across accounts and platforms) and the request json with its keys sorted.
+
+MODE_OFF = 'off'
+MODE_RECORD = 'record'
+MODE_REPLAY = 'replay'
+
+def _get_data_path():
+    path = os.path.dirname(os.path.abspath(__file__))
+    parent = os.path.dirname(path)
+    data_path = os.path.join(parent, 'data')
+    return data_path
+
+PWS_TAPE_DIR = os.path.join(_get_data_path(), 'pws_tape')
+
+# only the location header is used by pypws (materials api)
+RECORDED_HEADERS = ['location']
+
+ENDPOINT_PATTERN = re.compile(r'(analytics|materials-storage)/v[^/]+/(.*)$')
+
+def get_endpoint(url):
+    parts = urlsplit(url)
+    path = f'{parts.netloc}{parts.path}' if parts.scheme == '' else parts.path
+    match = ENDPOINT_PATTERN.search(path)
+    if match is not None:
+        path = f'{match.group(1)}/{match.group(2)}'
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k != 'clientId']
+    if len(query) > 0:
+        path = f'{path}?{urlencode(query)}'
+    return path
+
+def canonical_body(data):
+    if data is None:
+        return ''
+    try:
+        return json.dumps(json.loads(data), sort_keys=True, separators=(',', ':'))
+    except ValueError:
+        return data if isinstance(data, str) else data.decode('utf-8')
+
+def get_request_key(method, url, data = None):
+    text = f'{method} {get_endpoint(url)}\n{canonical_body(data)}'
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def make_response(url, status_code, reason = '', text = '', headers = None):
+    response = Response()
+    response.url = url
+    response.status_code = status_code
+    response.reason = reason
+    response._content = text.encode('utf-8')
+    response.encoding = 'utf-8'
+    response.headers = CaseInsensitiveDict(headers or {})
+    return response
+
+class Pws_Tape:
+
+    def __init__(self, tape_dir = PWS_TAPE_DIR, mode = MODE_OFF, latency_sec = 0.0, latency_scale = 0.0) -> None:
+        self.tape_dir = tape_dir
+        self.mode = mode
+        self.latency_sec = latency_sec
+        self.latency_scale = latency_scale
+        self.lock = threading.Lock()
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self.originals = None
+
+    def _get_path(self, key):
+        return os.path.join(self.tape_dir, key[:2], f'{key}.json')
+
+    def get(self, key):
+        path = self._get_path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def put(self, key, method, url, response, elapsed_sec):
+        entry = {
+            'method': method,
+            'endpoint': get_endpoint(url),
+            'status_code': response.status_code,
+            'reason': response.reason,
+            'headers': {k: response.headers[k] for k in RECORDED_HEADERS if k in response.headers},
+            'text': response.text,
+            'elapsed_sec': elapsed_sec,
+        }
+        path = self._get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written to a temp file first so a concurrent replay never reads half an entry
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.recorded += 1
+
+    def record(self, send, method, url, data = None):
+        t0 = time.perf_counter()
+        response = send()
+        elapsed_sec = time.perf_counter() - t0
+        try:
+            self.put(get_request_key(method, url, data), method, url, response, elapsed_sec)
+        except OSError as e:
+            logger.debug(f'could not record PWS call to {get_endpoint(url)}.  error info: {e}')
+        return response
+
+    def replay(self, method, url, data = None):
+        key = get_request_key(method, url, data)
+        entry = self.get(key)
+        if entry is None:
+            with self.lock:
+                self.misses += 1
+            logger.debug(f'PWS call to {get_endpoint(url)} not on tape.  key: {key}')
+            return make_response(url, 404, reason='Not on PWS tape')
+        delay_sec = self.latency_sec + self.latency_scale * entry.get('elapsed_sec', 0)
+        if delay_sec > 0:
+            time.sleep(delay_sec)
+        with self.lock:
+            self.replayed += 1
+        return make_response(url, entry['status_code'], reason=entry['reason'], text=entry['text'], headers=entry['headers'])
+
+    def handle(self, send, method, url, data = None):
+        if self.mode == MODE_REPLAY:
+            return self.replay(method, url, data)
+        if self.mode == MODE_RECORD:
+            return self.record(send, method, url, data)
+        return send()
+
+    def install(self):
+        # patches pypws in place.  uninstall puts the originals back.
+        if self.originals is not None:
+            return
+        self.originals = {
+            'calc_post_request': pws_calculations._CalculationBase.post_request,
+            'calc_get_access_token': pws_calculations.get_access_token,
+            'utilities_get_access_token': pws_utilities.get_access_token,
+            'materials_post_request': pws_materials.post_request,
+            'materials_get_request': pws_materials.get_request,
+        }
+        originals = self.originals
+        tape = self
+
+        def calc_post_request(calc, url, data, access_token):
+            return tape.handle(lambda: originals['calc_post_request'](calc, url, data, access_token), 'POST', url, data)
+
+        def materials_post_request(url, data):
+            return tape.handle(lambda: originals['materials_post_request'](url, data), 'POST', url, data)
+
+        def materials_get_request(url):
+            return tape.handle(lambda: originals['materials_get_request'](url), 'GET', url)
+
+        pws_calculations._CalculationBase.post_request = calc_post_request
+        pws_materials.post_request = materials_post_request
+        pws_materials.get_request = materials_get_request
+        if self.mode == MODE_REPLAY:
+            # no access token is needed offline.  without one the endpoint urls lose their host, which
+            # the request key ignores.
+            pws_calculations.get_access_token = lambda: ''
+            pws_utilities.get_access_token = lambda: ''
+        logger.debug(f'PWS tape installed.  mode: {self.mode}  tape: {self.tape_dir}')
+
+    def uninstall(self):
+        if self.originals is None:
+            return
+        pws_calculations._CalculationBase.post_request = self.originals['calc_post_request']
+        pws_calculations.get_access_token = self.originals['calc_get_access_token']
+        pws_utilities.get_access_token = self.originals['utilities_get_access_token']
+        pws_materials.post_request = self.originals['materials_post_request']
+        pws_materials.get_request = self.originals['materials_get_request']
+        self.originals = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                'mode': self.mode,
+                'tape_dir': self.tape_dir,
+                'recorded': self.recorded,
+                'replayed': self.replayed,
+                'misses': self.misses,
+            }
+
+pws_tape = Pws_Tape()
+
+def use_pws_tape(mode, tape_dir = PWS_TAPE_DIR, latency_sec = 0.0, latency_scale = 0.0):
+    pws_tape.uninstall()
+    pws_tape.mode = mode
+    pws_tape.tape_dir = tape_dir
+    pws_tape.latency_sec = latency_sec
+    pws_tape.latency_scale = latency_scale
+    if mode != MODE_OFF:
+        pws_tape.install()
+    return pws_tape
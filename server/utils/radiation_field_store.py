@@ -0,0 +1,51 @@
+import threading
+from collections import OrderedDict
+
+# radiation fields (calcs.radiation_field) kept in process so transect and point queries can refer to
+# them by id.  the id is a hash of the inputs that built the field, so asking for the same field again
+# returns the stored one.  least recently used fields are dropped first.
+
+MAX_RADIATION_FIELDS = 16
+
+class Radiation_Field_Store:
+
+    def __init__(self, max_entries = MAX_RADIATION_FIELDS) -> None:
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, field_id, field):
+        with self.lock:
+            self.entries[field_id] = field
+            self.entries.move_to_end(field_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, field_id):
+        with self.lock:
+            field = self.entries.get(field_id)
+            if field is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(field_id)
+            self.hits += 1
+            return field
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'bytes': None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups > 0 else 0,
+                'evictions': self.evictions,
+            }
+
+radiation_field_store = Radiation_Field_Store()
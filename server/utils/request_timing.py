@@ -0,0 +1,109 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from pypws import calculations as pws_calculations
+
+from utils.metrics import metrics
+
+# request scoped stage timings.  a Request_Timings is set in a context variable when a request starts.
+# timed(stage) blocks add to it from wherever the request's work runs:  the job runner and pws_limiter
+# hand the request's context to their worker threads, and asyncio.to_thread does so already.
+# the totals are sent back in the Server-Timing header, and every stage is also added to the
+# process wide histograms behind /api/metrics.  work done outside a request (e.g. a submitted job
+# still running after its submit call returned) only reaches the histograms.
+
+# pypws calculation class: stage name
+PWS_STAGES = {
+    'FlashCalculation': 'flash',
+    'VesselLeakCalculation': 'discharge',
+    'DispersionCalculation': 'dispersion',
+    'DistancesAndFootprintsToConcentrationLevelsCalculation': 'footprints',
+    'JetFireCalculation': 'jet_fire',
+    'RadiationTransectCalculation': 'radiation_transect',
+}
+
+_current_timings = contextvars.ContextVar('cmct_request_timings', default=None)
+
+class Request_Timings:
+
+    def __init__(self) -> None:
+        self.t0 = time.perf_counter()
+        self.lock = threading.Lock()
+        # stage: [seconds, count].  kept in the order the stages were first seen.
+        self.stages = {}
+
+    def add(self, stage, sec):
+        with self.lock:
+            vals = self.stages.setdefault(stage, [0.0, 0])
+            vals[0] += sec
+            vals[1] += 1
+
+    def elapsed_sec(self):
+        return time.perf_counter() - self.t0
+
+    def server_timing_header(self, total_sec = None):
+        with self.lock:
+            stages = list(self.stages.items())
+        parts = [f'{stage};dur={sec * 1000:.1f}' + (f';desc="x{count}"' if count > 1 else '') for stage, (sec, count) in stages]
+        if total_sec is not None:
+            parts.append(f'total;dur={total_sec * 1000:.1f}')
+        return ', '.join(parts)
+
+def start_request_timings():
+    # returns the token for end_request_timings
+    return _current_timings.set(Request_Timings())
+
+def end_request_timings(token):
+    _current_timings.reset(token)
+
+def get_request_timings():
+    return _current_timings.get()
+
+def record_stage(stage, sec):
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, sec)
+    metrics.observe('cmct_stage_duration_seconds', sec, {'stage': stage})
+
+@contextmanager
+def timed(stage):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - t0)
+
+def observe_request(route, method, status, sec):
+    metrics.observe('cmct_http_request_duration_seconds', sec, {'route': route, 'method': method, 'status': status})
+
+def _timed_pws_run(run, calc_name):
+    stage = PWS_STAGES.get(calc_name, calc_name)
+
+    def timed_run(calc):
+        t0 = time.perf_counter()
+        result = 'error'
+        try:
+            res = run(calc)
+            result = getattr(res, 'name', str(res))
+            return res
+        finally:
+            sec = time.perf_counter() - t0
+            record_stage(stage, sec)
+            metrics.observe('cmct_pws_call_duration_seconds', sec, {'calc': calc_name})
+            metrics.inc('cmct_pws_calls_total', {'calc': calc_name, 'result': result})
+
+    timed_run.cmct_timed = True
+    return timed_run
+
+def instrument_pws_calculations():
+    # wraps run on every pypws calculation class, so each PWS call (from py_lopa or from the server)
+    # is timed and counted
+    for calc_name, cls in vars(pws_calculations).items():
+        if not isinstance(cls, type) or not issubclass(cls, pws_calculations._CalculationBase) or cls is pws_calculations._CalculationBase:
+            continue
+        run = vars(cls).get('run')
+        if run is None or getattr(run, 'cmct_timed', False):
+            continue
+        cls.run = _timed_pws_run(run, calc_name)
@@ -0,0 +1,215 @@
+import os
+import json
+import math
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from importlib import metadata
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+# persistent cache of model results, addressed by a hash of the normalized py_lopa inputs and the
+# py_lopa / pypws versions that produced them.  each entry is one arrow ipc file holding the result
+# dataframe at full precision, with the scalar results (flash data, extents, etc.) stored as json in
+# the schema metadata.  files are written to a temp name and renamed into place, and the least
+# recently used entries are deleted once the directory grows past max_bytes.
+
+METADATA_KEY = b'cmct'
+FILE_EXTENSION = '.arrow'
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+# inputs that do not change the result of a model run
+IGNORED_INPUT_KEYS = {'log_handler', 'kml_handler', 'display_diagnostic_information'}
+
+def _get_data_path():
+    path = os.path.dirname(os.path.abspath(__file__))
+    parent = os.path.dirname(path)
+    data_path = os.path.join(parent, 'data')
+    return data_path
+
+def _package_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+def get_model_versions():
+    return {
+        'py_lopa': _package_version('py_lopa'),
+        'pypws': _package_version('pypws'),
+    }
+
+def normalize_inputs(obj):
+    # numbers are compared by value (10 and 10.0 hash the same) and callables are dropped
+    if isinstance(obj, dict):
+        return {str(k): normalize_inputs(v) for k, v in obj.items() if k not in IGNORED_INPUT_KEYS and not callable(v)}
+    if isinstance(obj, (list, tuple, np.ndarray)):
+        return [normalize_inputs(v) for v in obj]
+    if isinstance(obj, (bool, np.bool_)):
+        return bool(obj)
+    if isinstance(obj, (int, float, np.integer, np.floating)):
+        val = float(obj)
+        if math.isnan(val) or math.isinf(val):
+            return repr(val)
+        return val
+    if obj is None or isinstance(obj, str):
+        return obj
+    return repr(obj)
+
+def get_inputs_key(inputs, namespace = ''):
+    doc = {
+        'namespace': namespace,
+        'versions': get_model_versions(),
+        'inputs': normalize_inputs(inputs),
+    }
+    canonical = json.dumps(doc, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def _to_builtin(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+class Result_Cache:
+
+    def __init__(self, cache_dir, max_bytes = DEFAULT_MAX_BYTES, namespace = '') -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.namespace = namespace
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def _load_index(self):
+        # existing files are picked up on first use, oldest access first
+        os.makedirs(self.cache_dir, exist_ok=True)
+        found = []
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith(FILE_EXTENSION):
+                continue
+            path = os.path.join(self.cache_dir, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found.append((stat.st_mtime, file_name[:-len(FILE_EXTENSION)], stat.st_size))
+        for _, key, n_bytes in sorted(found):
+            self.entries[key] = n_bytes
+            self.total_bytes += n_bytes
+        self.loaded = True
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + FILE_EXTENSION)
+
+    def make_key(self, inputs):
+        return get_inputs_key(inputs, namespace=self.namespace)
+
+    def get(self, key):
+        # returns (df, metadata) or None
+        with self.lock:
+            if not self.loaded:
+                self._load_index()
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            with pa.memory_map(path, 'r') as source:
+                table = pa.ipc.open_file(source).read_all()
+            os.utime(path)
+        except (OSError, pa.ArrowInvalid) as e:
+            logger.debug(f'unreadable result cache entry {key} discarded.  error info: {e}')
+            self.discard(key)
+            with self.lock:
+                self.misses += 1
+            return None
+        metadata = json.loads(table.schema.metadata[METADATA_KEY])
+        df = table.to_pandas()
+        with self.lock:
+            self.hits += 1
+        return df, metadata
+
+    def put(self, key, df, metadata = None):
+        if df is None:
+            df = pd.DataFrame()
+        if metadata is None:
+            metadata = {}
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({METADATA_KEY: json.dumps(metadata, default=_to_builtin)})
+
+        with self.lock:
+            if not self.loaded:
+                self._load_index()
+        path = self._path(key)
+        tmp_path = os.path.join(self.cache_dir, f'.{key}.{uuid.uuid4().hex}.tmp')
+        try:
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f'result cache entry {key} could not be written.  error info: {e}')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        n_bytes = os.path.getsize(path)
+
+        with self.lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+            self.entries[key] = n_bytes
+            self.total_bytes += n_bytes
+            self.stores += 1
+            evicted = self._evict()
+        for old_key in evicted:
+            self._remove_file(old_key)
+
+    def _evict(self):
+        # the entry just stored is kept even if it is larger than max_bytes on its own
+        evicted = []
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            old_key, n_bytes = self.entries.popitem(last=False)
+            self.total_bytes -= n_bytes
+            self.evictions += 1
+            evicted.append(old_key)
+        return evicted
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def discard(self, key):
+        with self.lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+        self._remove_file(key)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups > 0 else 0,
+                'stores': self.stores,
+                'evictions': self.evictions,
+            }
+
+flammable_envelope_cache = Result_Cache(cache_dir=os.path.join(_get_data_path(), 'result_cache', 'flammable_envelope'), namespace='flammable_envelope')
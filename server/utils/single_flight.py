@@ -0,0 +1,71 @@
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# coalesces identical model runs that are in progress at the same time.  the first caller for a key
+# runs the computation.  callers arriving while it runs wait for it and get the same result (or the
+# same exception).  nothing is kept once the run finishes.  results are shared between callers, so
+# they must not be modified in place.
+
+class Single_Flight:
+
+    def __init__(self, name) -> None:
+        self.name = name
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.runs = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self.lock:
+            self.calls += 1
+            future = self.in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self.in_flight[key] = future
+                self.runs += 1
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            logger.debug('%s run %s already in progress.  waiting on its result.', self.name, key)
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'calls': self.calls,
+                'runs': self.runs,
+                'runs_saved': self.coalesced,
+                'in_flight': len(self.in_flight),
+            }
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+def get_single_flight(name):
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = Single_Flight(name)
+        return _flights[name]
+
+def get_single_flight_stats():
+    with _flights_lock:
+        flights = list(_flights.values())
+    return {flight.name: flight.stats() for flight in flights}
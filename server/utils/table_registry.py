@@ -0,0 +1,116 @@
+import threading
+
+import numpy as np
+
+from py_lopa.calcs import helpers
+from py_lopa.data.tables import Tables
+
+# process-wide cache of the py_lopa reference tables (py_lopa/data/tables_csv).  py_lopa re-reads
+# and cleans these csvs on every call (dippr_consts.csv alone is 1.7 MB).  here each table is read
+# once, on first use or at warm up, and the lookups used on the request path are indexed by cas number.
+
+_read_dataframe_from_csv = helpers.get_dataframe_from_csv
+_get_mw_from_cheminfo = helpers.get_mw
+
+class Table_Registry:
+
+    def __init__(self) -> None:
+        self.tables = Tables()
+        self.encodings = {
+            self.tables.CHEM_INFO: 'cp1252',
+        }
+        self.dataframes = {}
+        self.indexes = {}
+        self.lock = threading.RLock()
+
+    def is_reference_table(self, csvname):
+        return csvname in vars(self.tables).values()
+
+    def get_dataframe(self, csvname, encoding = None):
+        # shared between requests.  callers must treat the returned dataframe as read only.
+        if encoding is None:
+            encoding = self.encodings.get(csvname, 'utf-8')
+        key = (csvname, encoding)
+        df = self.dataframes.get(key)
+        if df is not None:
+            return df
+        with self.lock:
+            if key not in self.dataframes:
+                self.dataframes[key] = _read_dataframe_from_csv(csvname, encoding=encoding)
+            return self.dataframes[key]
+
+    def _get_index(self, name, build):
+        index = self.indexes.get(name)
+        if index is not None:
+            return index
+        with self.lock:
+            if name not in self.indexes:
+                self.indexes[name] = build()
+            return self.indexes[name]
+
+    def _build_dippr_index(self):
+        # (cas_no, property_id) -> largest value, matching df[...]['value'].max() in py_lopa
+        df = self.get_dataframe(self.tables.DIPPR_CONSTANTS)
+        maxes = df.groupby(['cas_no', 'property_id'], sort=False)['value'].max()
+        return maxes.to_dict()
+
+    def _build_burning_velocity_index(self):
+        # cas -> first listed burning velocity
+        df = self.get_dataframe(self.tables.LAMINAR_BURNING_VELOCITY_DATA)
+        df = df.drop_duplicates(subset='cas', keep='first')
+        return dict(zip(df['cas'], df['burning_velocity_m_s']))
+
+    def _build_mw_index(self):
+        # cas_no -> mw, first listed row as in helpers.get_mw
+        df = self.get_dataframe(self.tables.CHEM_INFO)
+        df = df.drop_duplicates(subset='cas_no', keep='first')
+        return dict(zip(df['cas_no'], df['mw']))
+
+    def get_cheminfo(self):
+        return self.get_dataframe(self.tables.CHEM_INFO)
+
+    def get_dippr_property(self, cas_no, property_id):
+        return self._get_index('dippr', self._build_dippr_index).get((cas_no, property_id), np.nan)
+
+    def get_hcom_j_kmol(self, cas_no):
+        return self.get_dippr_property(cas_no, 'hcom')
+
+    def get_burning_velocity_m_s(self, cas_no):
+        return self._get_index('burning_velocity', self._build_burning_velocity_index).get(cas_no)
+
+    def get_mw(self, cas_no):
+        return self._get_index('mw', self._build_mw_index).get(cas_no)
+
+    def warm_up(self):
+        for csvname in [self.tables.CHEM_INFO, self.tables.DIPPR_CONSTANTS, self.tables.LAMINAR_BURNING_VELOCITY_DATA, self.tables.ENERGY_BALANCE_PHYS_PROPS, self.tables.PV_BURST_BLAST_CURVE_DATA]:
+            self.get_dataframe(csvname)
+        self._get_index('dippr', self._build_dippr_index)
+        self._get_index('burning_velocity', self._build_burning_velocity_index)
+        self._get_index('mw', self._build_mw_index)
+
+table_registry = Table_Registry()
+
+def _get_dataframe_from_csv(csvname, encoding='utf-8'):
+    # anything other than a reference table (e.g. a user supplied csv) is read as before
+    if not table_registry.is_reference_table(csvname):
+        return _read_dataframe_from_csv(csvname, encoding=encoding)
+    # py_lopa callers are free to modify what they get back, so they are handed a copy
+    return table_registry.get_dataframe(csvname, encoding=encoding).copy()
+
+def _get_cheminfo():
+    return table_registry.get_cheminfo().copy()
+
+def _get_mw(chem, cheminfo = {}):
+    # energy_balance and thermo_pio call get_mw once per component, each a scan of cheminfo.  cas numbers
+    # found in the registry's index skip the scan, anything else (chem names, unknown cas) goes to py_lopa.
+    if helpers.is_cas_no(chem):
+        mw = table_registry.get_mw(str(chem))
+        if mw is not None:
+            return mw
+    return _get_mw_from_cheminfo(chem, cheminfo=cheminfo)
+
+def use_table_registry_in_py_lopa():
+    # route py_lopa's csv reads (Tables paths, get_cheminfo) and molecular weight lookups through the registry
+    helpers.get_dataframe_from_csv = _get_dataframe_from_csv
+    helpers.get_cheminfo = _get_cheminfo
+    helpers.get_mw = _get_mw